@@ -0,0 +1,681 @@
+# BUILT-IN MODULES
+import multiprocessing as mp
+import threading as th
+import time
+
+# EXTERNAL MODULES
+import numpy as np
+
+# MEDUSA MODULES
+import exceptions
+from acquisition import lsl_utils, buffers, stream_hub
+from acquisition.recording import get_biosignal_data_class, \
+    get_event_data_class
+
+
+class LSLAcquisitionProcess(mp.Process):
+    """Process that receives the LSL streams of an app (see
+    resources.AppSkeleton.lsl_acquisition_process), so the reception does
+    not compete for the GIL with the signal processing of the manager thread
+    or the gui of the app, which may cause backlogs in the inlets and bursts
+    of samples.
+
+    It runs a resources.LSLStreamAppWorker per stream, which stores the
+    samples in a buffers.SharedSampleBuffer created by the app process.
+    Event streams (e.g., markers) are stored in the buffers.EventBuffer of
+    their worker in this process, and the app reads them through the pipe.
+    The app accesses the workers through an LSLAcquisitionClient, which
+    starts this process and forwards the calls that cannot be served from
+    shared memory through a pipe. The process keeps running after the
+    workers are stopped, until the client shuts it down, so the samples can
+    be read (e.g., to save the recording) in the meantime.
+    """
+
+    # Methods of the workers that can be called from the client
+    WORKER_METHODS = ('reset_data', 'get_gap_stats', 'get_historic_offsets',
+                      'get_telemetry', 'get_stage_latencies',
+                      'get_delivery_latencies', 'get_timestamps_stats')
+    # Methods that read the events of event streams, which are not in shared
+    # memory. They are not available for the other streams, whose samples
+    # are read from the shared buffers.
+    EVENT_WORKER_METHODS = ('get_data', 'get_lsl_timestamps',
+                            'get_n_samples', 'get_cursor',
+                            'get_data_since',
+                            'get_last_seconds', 'get_window',
+                            'get_last_timestamp', 'get_events',
+                            'get_event_times')
+
+    def __init__(self, lsl_streams_info, buffer_descriptors, conn,
+                 finished_events, app_state, run_state, medusa_interface,
+                 deadline=None, worker_kwargs=None):
+        """Class constructor. Use LSLAcquisitionClient to create and start
+        the process.
+
+        Parameters
+        ----------
+        lsl_streams_info: list of dict
+            Working LSL streams as serializable objects
+        buffer_descriptors: dict
+            Descriptor of the shared buffer of each stream (see
+            buffers.SharedSampleBuffer.get_descriptor), with the medusa_uid
+            of the streams as keys. Event streams have no shared buffer.
+        conn: multiprocessing.connection.Connection
+            End of the pipe that receives the calls of the client
+        finished_events: dict
+            mp.Event of each stream, set when its worker finishes
+        app_state: mp.Value
+            Medusa app state
+        run_state: mp.Value
+            Medusa run state
+        medusa_interface: resources.Medusa_interface
+            Interface to the main gui of medusa
+        deadline: float or None
+            Low-latency mode of the receivers (see LSLStreamReceiver)
+        worker_kwargs: dict or None
+            Arguments of LSLStreamAppWorker
+        """
+        super().__init__(name='LSLAcquisitionProcess', daemon=True)
+        self.lsl_streams_info = lsl_streams_info
+        self.buffer_descriptors = buffer_descriptors
+        self.conn = conn
+        self.finished_events = finished_events
+        self.app_state = app_state
+        self.run_state = run_state
+        self.medusa_interface = medusa_interface
+        self.deadline = deadline
+        self.worker_kwargs = worker_kwargs if worker_kwargs is not None \
+            else dict()
+
+    def handle_exception(self, ex):
+        self.medusa_interface.error(ex)
+
+    @exceptions.error_handler(def_importance='critical', scope='app')
+    def run(self):
+        workers = dict()
+        try:
+            try:
+                self.__start_workers(workers)
+            except Exception as e:
+                # The client raises the exception in the app process
+                self.__send(('error', e))
+                return
+            self.__send(('ready', None))
+            self.__serve(workers)
+        finally:
+            for worker in workers.values():
+                worker.stop = True
+            for worker in workers.values():
+                if worker.ident is not None:
+                    worker.join()
+                # The app process destroys the shared blocks
+                if isinstance(worker.buffer, buffers.SharedSampleBuffer):
+                    worker.buffer.close()
+            for event in self.finished_events.values():
+                event.set()
+
+    def __start_workers(self, workers):
+        # Imported here, since resources imports this module
+        import resources
+        for ser_info in self.lsl_streams_info:
+            use_ring = resources.use_stream_hub_ring(ser_info,
+                                                   self.deadline)
+            info = lsl_utils.LSLStreamWrapper.from_serializable_obj(
+                ser_info, connect=not use_ring)
+            if use_ring:
+                receiver = stream_hub.StreamHubReader(
+                    ser_info['stream_hub_ring'], info,
+                    deadline=self.deadline,
+                    medusa_interface=self.medusa_interface)
+            else:
+                receiver = lsl_utils.LSLStreamReceiver(
+                    info, deadline=self.deadline)
+            # Event streams are stored in the EventBuffer of the worker
+            descriptor = self.buffer_descriptors.get(info.medusa_uid, None)
+            buffer = buffers.SharedSampleBuffer.from_descriptor(
+                descriptor, writer=True) if descriptor is not None else None
+            workers[info.medusa_uid] = resources.LSLStreamAppWorker(
+                receiver, self.app_state, self.run_state,
+                self.medusa_interface, buffer=buffer, **self.worker_kwargs)
+            workers[info.medusa_uid].start()
+
+    def __serve(self, workers):
+        """Serves the calls of the client until it requests the end of the
+        process"""
+        while True:
+            for medusa_uid, worker in workers.items():
+                if not worker.is_alive():
+                    self.finished_events[medusa_uid].set()
+            try:
+                if not self.conn.poll(0.05):
+                    continue
+                request = self.conn.recv()
+            except EOFError:
+                # The app process has finished
+                return
+            if request is None:
+                return
+            medusa_uid, method, args = request
+            try:
+                reply = ('ok', self.__call_worker(workers[medusa_uid],
+                                                  method, args))
+            except Exception as e:
+                reply = ('error', e)
+            self.__send(reply)
+
+    def __call_worker(self, worker, method, args):
+        if method == 'stop':
+            worker.stop = True
+        elif method == 'get_gaps':
+            return worker.gap_detector.to_dict() \
+                if worker.gap_detector is not None else None
+        elif method == 'get_event_dict' and worker.event_store:
+            with worker.lock:
+                return worker.buffer.to_dict()
+        elif method in self.WORKER_METHODS or \
+                (method in self.EVENT_WORKER_METHODS and worker.event_store):
+            return getattr(worker, method)(*args)
+        else:
+            raise ValueError('Method %s of LSLStreamAppWorker cannot be '
+                             'called from the app process' % method)
+
+    def __send(self, reply):
+        try:
+            self.conn.send(reply)
+        except Exception as e:
+            # The reply cannot be pickled
+            self.conn.send(('error', RuntimeError(
+                'The reply of the acquisition process could not be sent: '
+                '%s' % str(e))))
+
+
+class LSLAcquisitionClient:
+    """Starts an LSLAcquisitionProcess with the working LSL streams of an
+    app and gives access to its workers from the app process through
+    LSLStreamAppWorkerProxy objects (see get_proxies), which have the same
+    API as LSLStreamAppWorker. The shared buffers are created and destroyed
+    by the client, so the samples are available until shutdown is called.
+    Event streams (e.g., markers) use LSLEventWorkerProxy objects, which
+    read the events through the pipe.
+    """
+
+    def __init__(self, lsl_streams_info, app_state, run_state,
+                 medusa_interface, deadline=None, segment_time=60,
+                 worker_kwargs=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        lsl_streams_info: list of dict
+            Working LSL streams as serializable objects. Streams shared by
+            the StreamHub of the main process (key stream_hub_ring) are read
+            from its ring buffers if deadline is None (see
+            use_stream_hub_ring).
+        app_state: mp.Value
+            Medusa app state
+        run_state: mp.Value
+            Medusa run state
+        medusa_interface: resources.Medusa_interface
+            Interface to the main gui of medusa
+        deadline: float or None
+            Low-latency mode of the receivers (see LSLStreamReceiver)
+        segment_time: float
+            Seconds of signal of each segment of the shared buffers (see
+            buffers.SharedSampleBuffer)
+        worker_kwargs: dict or None
+            Arguments of LSLStreamAppWorker (e.g., pipelined or
+            detect_gaps). They are sent to the acquisition process, so they
+            must be picklable. Parameters spill_dir, compact_timestamps and
+            buffer are not supported.
+        """
+        worker_kwargs = worker_kwargs if worker_kwargs is not None \
+            else dict()
+        for key in ('spill_dir', 'compact_timestamps', 'buffer'):
+            if worker_kwargs.get(key, None):
+                raise ValueError('Parameter %s of LSLStreamAppWorker is not '
+                                 'supported in the acquisition process' %
+                                 key)
+        self.lsl_streams = list()
+        self.buffers = dict()
+        self.finished_events = dict()
+        for ser_info in lsl_streams_info:
+            info = lsl_utils.LSLStreamWrapper.from_serializable_obj(
+                ser_info, connect=False)
+            if info.medusa_uid in self.finished_events:
+                raise ValueError('Duplicated lsl stream uid %s' %
+                                 info.medusa_uid)
+            self.lsl_streams.append(info)
+            self.finished_events[info.medusa_uid] = mp.Event()
+            # Same event_store and dtype as LSLStreamAppWorker. The events
+            # are kept in the acquisition process.
+            event_store = worker_kwargs.get('event_store', None)
+            if event_store is None:
+                event_store = info.is_marker_stream()
+            if event_store:
+                continue
+            dtype = info.get_dtype() \
+                if worker_kwargs.get('preprocessor', None) is None \
+                else np.dtype(float)
+            self.buffers[info.medusa_uid] = buffers.SharedSampleBuffer(
+                n_cha=info.n_cha, dtype=dtype,
+                segment_size=int(segment_time * info.fs)
+                if info.fs > 0 else None, writer=False)
+        self.medusa_interface = medusa_interface
+        self.lock = th.Lock()
+        self.conn, child_conn = mp.Pipe()
+        self.process = LSLAcquisitionProcess(
+            lsl_streams_info,
+            {uid: buffer.get_descriptor()
+             for uid, buffer in self.buffers.items()},
+            child_conn, self.finished_events, app_state, run_state,
+            medusa_interface, deadline=deadline,
+            worker_kwargs=worker_kwargs)
+        self.proxies = {info.medusa_uid: LSLStreamAppWorkerProxy(
+            self, info, self.buffers[info.medusa_uid])
+            if info.medusa_uid in self.buffers
+            else LSLEventWorkerProxy(self, info)
+            for info in self.lsl_streams}
+
+    def start(self):
+        """Starts the acquisition process and waits until the workers have
+        been started. The exceptions raised while creating the workers
+        (e.g., the stream is not available) are raised here."""
+        self.process.start()
+        try:
+            status, result = self.__recv()
+        except Exception:
+            self.shutdown()
+            raise
+        if status == 'error':
+            self.shutdown()
+            raise result
+
+    def get_proxies(self):
+        """Returns a dict with the LSLStreamAppWorkerProxy of each stream,
+        with the medusa_uid of the streams as keys"""
+        return dict(self.proxies)
+
+    def call(self, medusa_uid, method, *args):
+        """Calls a method of the worker of a stream in the acquisition
+        process (see LSLAcquisitionProcess.WORKER_METHODS) and returns the
+        result"""
+        with self.lock:
+            if not self.process.is_alive():
+                raise RuntimeError('The acquisition process is not running')
+            self.conn.send((medusa_uid, method, args))
+            status, result = self.__recv()
+        if status == 'error':
+            raise result
+        return result
+
+    def is_worker_alive(self, medusa_uid):
+        return self.process.is_alive() and \
+            not self.finished_events[medusa_uid].is_set()
+
+    def join_worker(self, medusa_uid, timeout=None):
+        """Waits until the worker of a stream finishes or the timeout
+        expires"""
+        t0 = time.perf_counter()
+        while self.is_worker_alive(medusa_uid):
+            wait_time = 0.1 if timeout is None else \
+                min(timeout - (time.perf_counter() - t0), 0.1)
+            if wait_time <= 0:
+                return
+            self.finished_events[medusa_uid].wait(wait_time)
+
+    def shutdown(self):
+        """Stops the workers and the acquisition process, and destroys the
+        shared buffers. The samples cannot be read afterwards."""
+        for proxy in self.proxies.values():
+            proxy.stop = True
+        for proxy in self.proxies.values():
+            proxy.join()
+        # The buffers are closed before the process finishes, since the
+        # shared blocks are released when the last process detaches from
+        # them on some platforms (e.g., Windows)
+        for buffer in self.buffers.values():
+            buffer.close()
+        if self.process.is_alive():
+            with self.lock:
+                self.conn.send(None)
+            self.process.join()
+
+    def __recv(self):
+        # Avoid blocking forever if the process has crashed
+        while not self.conn.poll(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError('The acquisition process finished '
+                                   'unexpectedly')
+        return self.conn.recv()
+
+
+class LSLStreamAppWorkerProxy:
+    """Proxy of an LSLStreamAppWorker that runs in an LSLAcquisitionProcess.
+    It implements the API of LSLStreamAppWorker, so apps can use it without
+    changes. The samples are read directly from the shared buffer of the
+    worker, and the other calls are forwarded to the acquisition process
+    through the LSLAcquisitionClient.
+
+    The differences with LSLStreamAppWorker are the following: the
+    functions that read samples always return copies, since the shared
+    segments are reused after reset_data; wait_for_data polls the shared
+    buffer every poll_interval seconds; and the subscribers are called from
+    a delivery thread of the proxy.
+    """
+
+    def __init__(self, client, lsl_stream, buffer, poll_interval=0.001):
+        """Class constructor
+
+        Parameters
+        ----------
+        client: LSLAcquisitionClient
+            Client of the acquisition process
+        lsl_stream: lsl_utils.LSLStreamWrapper
+            Medusa representation of the LSL stream, without inlet
+        buffer: buffers.SharedSampleBuffer or None
+            Shared buffer of the worker. None for event streams (see
+            LSLEventWorkerProxy).
+        poll_interval: float
+            Interval in seconds between the checks of wait_for_data
+        """
+        self.client = client
+        self.lsl_stream = lsl_stream
+        self.name = lsl_stream.medusa_uid
+        self.buffer = buffer
+        self.dtype = buffer.dtype if buffer is not None \
+            else np.dtype(object)
+        self.cha_gain, self.cha_offset = lsl_stream.get_cha_scaling()
+        self.poll_interval = poll_interval
+        self.subscribers = list()
+        self.delivery_thread = None
+        self._stop = False
+
+    @property
+    def stop(self):
+        return self._stop
+
+    @stop.setter
+    def stop(self, value):
+        self._stop = value
+        if value and self.is_alive():
+            self.client.call(self.name, 'stop')
+
+    @property
+    def data(self):
+        """See LSLStreamAppWorker.data"""
+        return lsl_utils.to_float64_physical_units(
+            self.buffer.data, self.cha_gain, self.cha_offset)
+
+    @property
+    def timestamps(self):
+        timestamps = self.buffer.timestamps
+        return timestamps if timestamps.flags.writeable \
+            else timestamps.copy()
+
+    @property
+    def lsl_timestamps(self):
+        return self.buffer.lsl_timestamps
+
+    def is_alive(self):
+        return self.client.is_worker_alive(self.name)
+
+    def join(self, timeout=None):
+        self.client.join_worker(self.name, timeout)
+
+    def get_data(self, raw=False):
+        """See LSLStreamAppWorker.get_data"""
+        timestamps, data = self.buffer.get_data()
+        if not raw:
+            data = self.to_physical(data)
+        return timestamps, data
+
+    def to_physical(self, data):
+        """See LSLStreamAppWorker.to_physical"""
+        return lsl_utils.to_physical_units(data, self.cha_gain,
+                                           self.cha_offset)
+
+    def get_lsl_timestamps(self):
+        return self.buffer.get_lsl_timestamps()
+
+    def get_n_samples(self):
+        """Returns the number of stored samples without copying them"""
+        return len(self.buffer)
+
+    def get_cursor(self):
+        """See LSLStreamAppWorker.get_cursor"""
+        return self.buffer.get_cursor()
+
+    def get_data_since(self, cursor=0):
+        """See LSLStreamAppWorker.get_data_since"""
+        while True:
+            buffer_cursor = self.buffer.get_cursor()
+            start = buffers.get_read_start(cursor, buffer_cursor)
+            timestamps, data, _ = self.buffer.get_views(start,
+                                                        buffer_cursor[1])
+            # Repeat the read if the buffer has been reset meanwhile
+            if self.buffer.get_cursor()[0] == buffer_cursor[0]:
+                return timestamps, data, buffer_cursor
+
+    def get_last_seconds(self, seconds):
+        """See LSLStreamAppWorker.get_last_seconds"""
+        n_samples = len(self.buffer)
+        if n_samples == 0:
+            timestamps, data, _ = self.buffer.get_views()
+            return timestamps, data
+        t_last = self.buffer.get_views(n_samples - 1)[0][0]
+        start = self.buffer.get_time_index(t_last - seconds)
+        timestamps, data, _ = self.buffer.get_views(start, n_samples)
+        return timestamps, data
+
+    def get_window(self, t_start, t_stop, margin=0):
+        """See LSLStreamAppWorker.get_window"""
+        n_samples = len(self.buffer)
+        start = max(self.buffer.get_time_index(t_start) - margin, 0)
+        stop = min(self.buffer.get_time_index(t_stop) + margin, n_samples)
+        timestamps, data, _ = self.buffer.get_views(start, stop)
+        return timestamps, data
+
+    def get_last_timestamp(self):
+        """See LSLStreamAppWorker.get_last_timestamp"""
+        n_samples = len(self.buffer)
+        if n_samples == 0:
+            return None
+        return float(self.buffer.get_views(n_samples - 1)[0][0])
+
+    def wait_for_data(self, cursor=0, timeout=None):
+        """See LSLStreamAppWorker.wait_for_data"""
+        t0 = time.perf_counter()
+        while not buffers.has_new_data(cursor, self.buffer.get_cursor()) \
+                and not self.stop and self.is_alive():
+            if timeout is not None and time.perf_counter() - t0 >= timeout:
+                break
+            time.sleep(self.poll_interval)
+        return self.get_data_since(cursor)
+
+    def subscribe(self, callback):
+        """See LSLStreamAppWorker.subscribe. The callbacks are called from a
+        delivery thread of the proxy, which may pass several chunks of the
+        worker at once."""
+        self.subscribers = self.subscribers + [callback]
+        if self.delivery_thread is None:
+            self.delivery_thread = th.Thread(
+                target=self.__deliver, name='%s-delivery' % self.name,
+                daemon=True)
+            self.delivery_thread.start()
+
+    def unsubscribe(self, callback):
+        """Removes a function registered with subscribe"""
+        self.subscribers = [c for c in self.subscribers if c is not callback]
+
+    @exceptions.error_handler(def_importance='important', scope='app')
+    def __deliver(self):
+        cursor = self.get_cursor()
+        while self.is_alive():
+            timestamps, data, cursor = self.wait_for_data(cursor, 0.1)
+            if len(timestamps) == 0:
+                continue
+            for callback in self.subscribers:
+                callback(timestamps, data)
+
+    def handle_exception(self, ex):
+        self.client.medusa_interface.error(ex)
+
+    def reset_data(self):
+        self.client.call(self.name, 'reset_data')
+
+    def get_gap_stats(self):
+        return self.client.call(self.name, 'get_gap_stats')
+
+    def get_historic_offsets(self):
+        return self.client.call(self.name, 'get_historic_offsets')
+
+    def get_telemetry(self):
+        return self.client.call(self.name, 'get_telemetry')
+
+    def get_stage_latencies(self):
+        return self.client.call(self.name, 'get_stage_latencies')
+
+    def get_delivery_latencies(self):
+        return self.client.call(self.name, 'get_delivery_latencies')
+
+    def get_timestamps_stats(self):
+        return self.client.call(self.name, 'get_timestamps_stats')
+
+    def get_data_class(self, copy=True):
+        """See LSLStreamAppWorker.get_data_class. The samples are always
+        read from the shared segments into new arrays (see
+        buffers.SharedSampleBuffer.get_views). If copy is True, these
+        arrays are writable, as the copies of LSLStreamAppWorker. If copy is
+        False, they are read-only, as the views of LSLStreamAppWorker."""
+        times, signal, _ = self.buffer.get_views()
+        if copy:
+            # The arrays own their memory, so they can be made writable
+            # without copying them again
+            times.flags.writeable = True
+            signal.flags.writeable = True
+        kwargs = dict()
+        gaps = self.client.call(self.name, 'get_gaps')
+        if gaps is not None:
+            kwargs['gaps'] = gaps
+        return get_biosignal_data_class(
+            self.lsl_stream, times, signal,
+            sync_telemetry=self.get_telemetry(), **kwargs)
+
+    def close(self, delete_spill_files=True):
+        """Closes the access to the shared buffer. The samples cannot be
+        read afterwards."""
+        self.buffer.close()
+
+
+class LSLEventWorkerProxy(LSLStreamAppWorkerProxy):
+    """Proxy of an LSLStreamAppWorker of an event stream (e.g., markers)
+    that runs in an LSLAcquisitionProcess. The events are stored in the
+    buffers.EventBuffer of the worker, so all the reads are forwarded to
+    the acquisition process through the LSLAcquisitionClient. Event streams
+    have low rates, so the events are sent through the pipe with little
+    overhead. wait_for_data polls the number of events every poll_interval
+    seconds.
+    """
+
+    def __init__(self, client, lsl_stream, poll_interval=0.01):
+        """Class constructor
+
+        Parameters
+        ----------
+        client: LSLAcquisitionClient
+            Client of the acquisition process
+        lsl_stream: lsl_utils.LSLStreamWrapper
+            Medusa representation of the LSL stream, without inlet
+        poll_interval: float
+            Interval in seconds between the checks of wait_for_data
+        """
+        super().__init__(client, lsl_stream, None,
+                         poll_interval=poll_interval)
+
+    @property
+    def data(self):
+        return self.get_data()[1]
+
+    @property
+    def timestamps(self):
+        return self.get_data()[0]
+
+    @property
+    def lsl_timestamps(self):
+        return self.get_lsl_timestamps()
+
+    def get_data(self, raw=False):
+        """See LSLStreamAppWorker.get_data. The labels of the events are
+        returned without changes."""
+        return self.client.call(self.name, 'get_data')
+
+    def to_physical(self, data):
+        """The labels of the events are returned without changes"""
+        return data
+
+    def get_lsl_timestamps(self):
+        return self.client.call(self.name, 'get_lsl_timestamps')
+
+    def get_n_samples(self):
+        """Returns the number of stored events"""
+        return self.client.call(self.name, 'get_n_samples')
+
+    def get_cursor(self):
+        """See LSLStreamAppWorker.get_cursor"""
+        return self.client.call(self.name, 'get_cursor')
+
+    def get_data_since(self, cursor=0):
+        """See LSLStreamAppWorker.get_data_since"""
+        return self.client.call(self.name, 'get_data_since', cursor)
+
+    def get_last_seconds(self, seconds):
+        """See LSLStreamAppWorker.get_last_seconds"""
+        return self.client.call(self.name, 'get_last_seconds', seconds)
+
+    def get_window(self, t_start, t_stop, margin=0):
+        """See LSLStreamAppWorker.get_window"""
+        return self.client.call(self.name, 'get_window', t_start, t_stop,
+                                margin)
+
+    def get_last_timestamp(self):
+        """See LSLStreamAppWorker.get_last_timestamp"""
+        return self.client.call(self.name, 'get_last_timestamp')
+
+    def get_events(self, t_start, t_stop):
+        """See LSLStreamAppWorker.get_events"""
+        return self.client.call(self.name, 'get_events', t_start, t_stop)
+
+    def get_event_times(self, label, t_start=-np.inf, t_stop=np.inf,
+                        cha=0):
+        """See LSLStreamAppWorker.get_event_times"""
+        return self.client.call(self.name, 'get_event_times', label,
+                                t_start, t_stop, cha)
+
+    def wait_for_data(self, cursor=0, timeout=None):
+        """See LSLStreamAppWorker.wait_for_data"""
+        t0 = time.perf_counter()
+        while not buffers.has_new_data(cursor, self.get_cursor()) and \
+                not self.stop and self.is_alive():
+            if timeout is not None and time.perf_counter() - t0 >= timeout:
+                break
+            time.sleep(self.poll_interval)
+        return self.get_data_since(cursor)
+
+    def get_data_class(self, copy=True):
+        """See LSLStreamAppWorker.get_data_class. The events are always
+        copied from the acquisition process. If copy is False, the arrays
+        are read-only, as the views of LSLStreamAppWorker."""
+        events = self.client.call(self.name, 'get_event_dict')
+        if not copy:
+            for key in ('timestamps', 'codes'):
+                events[key].flags.writeable = False
+        kwargs = dict()
+        gaps = self.client.call(self.name, 'get_gaps')
+        if gaps is not None:
+            kwargs['gaps'] = gaps
+        return get_event_data_class(
+            self.lsl_stream, events['timestamps'], events['codes'],
+            events['labels'], sync_telemetry=self.get_telemetry(), **kwargs)
+
+    def close(self, delete_spill_files=True):
+        """The events are released with the acquisition process"""
+        pass
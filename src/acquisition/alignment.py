@@ -0,0 +1,221 @@
+# BUILT-IN MODULES
+import math
+
+# EXTERNAL MODULES
+import numpy as np
+
+# Available methods to align the samples of a stream to the timeline
+ALIGNMENT_METHODS = ('nearest', 'linear', 'zoh')
+
+
+def align_samples(times, data, timeline, method='linear'):
+    """Resamples a stream at the times of a timeline.
+
+    Parameters
+    ----------
+    times: np.ndarray
+        Timestamps of the samples, in ascending order
+    data: np.ndarray
+        Samples with shape [n_samples x n_cha]
+    timeline: np.ndarray
+        Times at which the stream is resampled
+    method: str {'nearest', 'linear', 'zoh'}
+        Method to compute the samples at the timeline: nearest sample,
+        linear interpolation between the samples before and after, or
+        zero-order hold (i.e., last sample before or at each time)
+
+    Returns
+    -------
+    aligned_data: np.ndarray
+        Samples with shape [len(timeline) x n_cha]. Times that cannot be
+        computed with the given samples (e.g., before the first sample or,
+        except for zoh, after the last one) are NaN.
+    """
+    if method not in ALIGNMENT_METHODS:
+        raise ValueError('Parameter method must be one of %s' %
+                         str(ALIGNMENT_METHODS))
+    n_cha = data.shape[1]
+    dtype = np.result_type(data.dtype, np.float32)
+    aligned_data = np.full((len(timeline), n_cha), np.nan, dtype=dtype)
+    n = len(times)
+    if n == 0 or len(timeline) == 0:
+        return aligned_data
+    # Index of the first sample after each time
+    idx = np.searchsorted(times, timeline, side='right')
+    if method == 'zoh':
+        valid = idx > 0
+        aligned_data[valid] = data[idx[valid] - 1]
+        return aligned_data
+    # Times inside the range of the samples
+    valid = (timeline >= times[0]) & (timeline <= times[-1])
+    if method == 'nearest':
+        prev_idx = np.clip(idx - 1, 0, n - 1)
+        next_idx = np.clip(idx, 0, n - 1)
+        use_next = np.abs(times[next_idx] - timeline) < \
+            np.abs(timeline - times[prev_idx])
+        nearest_idx = np.where(use_next, next_idx, prev_idx)
+        aligned_data[valid] = data[nearest_idx[valid]]
+    else:
+        if n == 1:
+            aligned_data[valid] = data[0]
+            return aligned_data
+        next_idx = np.clip(idx, 1, n - 1)
+        prev_idx = next_idx - 1
+        t_prev, t_next = times[prev_idx], times[next_idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w = np.where(t_next > t_prev,
+                         (timeline - t_prev) / (t_next - t_prev), 0.0)
+        w = w[valid, np.newaxis]
+        aligned_data[valid] = (1 - w) * data[prev_idx[valid]] + \
+            w * data[next_idx[valid]]
+    return aligned_data
+
+
+class StreamAligner:
+    """Aligns the samples of several LSLStreamAppWorkers with different
+    sample rates to a common timeline.
+
+    The timeline is given by the timestamps of a reference stream, or by a
+    uniform grid at a given sample rate with times that are multiples of
+    the sample period, so consecutive windows share the same grid. Each
+    stream is resampled at the timeline with its own method (see
+    align_samples).
+
+    The samples of each window are read with LSLStreamAppWorker.get_window,
+    which uses binary searches over the growing buffers and returns views,
+    so the cost of each query depends on the window size rather than on
+    the recording length. Function get_next keeps a cursor to align the new
+    samples incrementally.
+    """
+
+    def __init__(self, lsl_workers, methods='linear', reference=None,
+                 fs=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        lsl_workers: dict
+            Dict with the LSLStreamAppWorker of each stream, with the names
+            of the streams as keys (e.g., AppSkeleton.lsl_workers)
+        methods: str or dict
+            Alignment method of all the streams, or dict with the method of
+            each stream (see align_samples). Streams not included in the
+            dict use linear interpolation. Use 'zoh' for marker streams.
+        reference: str or None
+            Name of the stream whose timestamps define the timeline. If
+            None, fs must be given.
+        fs: float or None
+            Sample rate of the uniform timeline if reference is None
+        """
+        if reference is None and (fs is None or fs <= 0):
+            raise ValueError('Parameter fs must be greater than 0 if no '
+                             'reference stream is given')
+        if reference is not None and reference not in lsl_workers:
+            raise ValueError('Reference stream %s not found' % reference)
+        self.lsl_workers = dict(lsl_workers)
+        if isinstance(methods, str):
+            methods = {name: methods for name in self.lsl_workers}
+        self.methods = {name: methods.get(name, 'linear')
+                        for name in self.lsl_workers}
+        for method in self.methods.values():
+            if method not in ALIGNMENT_METHODS:
+                raise ValueError('Alignment method must be one of %s' %
+                                 str(ALIGNMENT_METHODS))
+        self.reference = reference
+        self.fs = fs
+        # End of the timeline already returned by get_next
+        self.cursor = None
+
+    def get_timeline(self, t_start, t_stop):
+        """Returns the times of the timeline in [t_start, t_stop)"""
+        if self.reference is not None:
+            times, _ = self.lsl_workers[self.reference].get_window(
+                t_start, t_stop)
+            return np.array(times)
+        k_start = math.ceil(t_start * self.fs)
+        k_stop = math.ceil(t_stop * self.fs)
+        return np.arange(k_start, k_stop) / self.fs
+
+    def get_window(self, t_start, t_stop):
+        """Returns the samples of all the streams aligned to the timeline
+        in [t_start, t_stop)
+
+        Returns
+        -------
+        timeline: np.ndarray
+            Times of the timeline
+        aligned_data: dict
+            Dict with the aligned samples of each stream, with shape
+            [len(timeline) x n_cha] and in physical units (see
+            LSLStreamAppWorker.to_physical)
+        """
+        aligned_data = dict()
+        if self.reference is not None:
+            # The samples of the reference stream define the timeline
+            ref_worker = self.lsl_workers[self.reference]
+            times, data = ref_worker.get_window(t_start, t_stop)
+            timeline = np.array(times)
+            aligned_data[self.reference] = ref_worker.to_physical(
+                np.array(data))
+        else:
+            timeline = self.get_timeline(t_start, t_stop)
+        for name, lsl_worker in self.lsl_workers.items():
+            if name == self.reference:
+                continue
+            # One extra sample at each side to interpolate at the edges
+            # (for zoh, the sample held at the start of the window)
+            times, data = lsl_worker.get_window(t_start, t_stop, margin=1)
+            aligned_data[name] = align_samples(
+                times, lsl_worker.to_physical(data), timeline,
+                self.methods[name])
+        return timeline, aligned_data
+
+    def get_last_seconds(self, seconds):
+        """Returns the samples of the last seconds aligned to the timeline
+        (see get_window). The window ends at get_available_time."""
+        t_stop = self.get_available_time()
+        if t_stop is None:
+            return self.get_window(0, 0)
+        return self.get_window(t_stop - seconds, t_stop)
+
+    def get_available_time(self):
+        """Returns the time until which all the streams can be aligned,
+        i.e., the min timestamp of the last sample of the streams that are
+        not aligned with zoh, which only needs previous samples. The time
+        is slightly shifted so that the last sample is included in the
+        windows, whose end is excluded. Returns None if a stream has no
+        samples yet."""
+        t_available = None
+        for name, lsl_worker in self.lsl_workers.items():
+            if self.methods[name] == 'zoh' and name != self.reference:
+                continue
+            t_last = lsl_worker.get_last_timestamp()
+            if t_last is None:
+                return None
+            t_available = t_last if t_available is None \
+                else min(t_available, t_last)
+        if t_available is None:
+            return None
+        return float(np.nextafter(t_available, np.inf))
+
+    def get_next(self):
+        """Returns the aligned samples of the timeline since the previous
+        call until get_available_time (see get_window). The first call
+        returns the samples since the start of the streams."""
+        t_stop = self.get_available_time()
+        if t_stop is None:
+            return self.get_window(0, 0)
+        if self.cursor is None:
+            # Timestamp of the first sample of the streams (an empty window
+            # at the start with a margin of 1 sample)
+            self.cursor = min(
+                float(lsl_worker.get_window(-np.inf, -np.inf, margin=1)[0][0])
+                for lsl_worker in self.lsl_workers.values()
+                if lsl_worker.get_n_samples() > 0)
+        t_start = self.cursor
+        self.cursor = max(t_stop, t_start)
+        return self.get_window(t_start, self.cursor)
+
+    def reset(self):
+        """Restarts the cursor of get_next"""
+        self.cursor = None
@@ -0,0 +1,532 @@
+"""Benchmarks for the acquisition pipeline of MEDUSA Platform.
+
+Run this module from the src folder to print the results of the buffer and
+receiver benchmarks:
+
+    python -m acquisition.benchmarks
+
+The acquisition benchmark drives local outlets (see load_generator) through
+LSLStreamReceiver and LSLStreamAppWorker for a matrix of channel counts,
+sample rates and stream counts, and saves the results in JSON, so they can
+be compared between releases:
+
+    python -m acquisition.benchmarks --matrix --n-cha 8,64,256 \
+        --fs 250,1000,10000 --n-streams 1,4 --output results.json
+    python -m acquisition.benchmarks --compare baseline.json results.json
+"""
+
+# BUILT-IN MODULES
+import argparse, itertools, json, platform, queue, sys, tracemalloc
+import multiprocessing as mp
+import time, threading
+
+# EXTERNAL MODULES
+import numpy as np
+import pylsl
+
+# MEDUSA MODULES
+import constants
+from acquisition import buffers, lsl_utils, load_generator
+
+
+def create_benchmark_outlet(name, n_cha, fs, chunk_size,
+                            channel_format='float32'):
+    """Creates a local LSL outlet and a thread that pushes random data at
+    the nominal rate. Call stop_event.set() to finish the thread.
+
+    Returns
+    -------
+    outlet: pylsl.StreamOutlet
+        LSL outlet
+    thread: threading.Thread
+        Thread that pushes the data (already started)
+    stop_event: threading.Event
+        Event to stop the thread
+    """
+    info = pylsl.StreamInfo(name=name, type='EEG', channel_count=n_cha,
+                            nominal_srate=fs, channel_format=channel_format,
+                            source_id='%s-benchmark' % name)
+    channels = info.desc().append_child('channels')
+    for i in range(n_cha):
+        channels.append_child('channel').append_child_value('label', 'Ch%i' % i)
+    outlet = pylsl.StreamOutlet(info, chunk_size=chunk_size)
+    stop_event = threading.Event()
+    dtype = lsl_utils.get_lsl_channel_format_dtype(channel_format)
+
+    def _push():
+        chunk = np.random.randn(chunk_size, n_cha).astype(dtype)
+        next_time = time.perf_counter()
+        while not stop_event.is_set():
+            outlet.push_chunk(chunk)
+            next_time += chunk_size / fs
+            time.sleep(max(next_time - time.perf_counter(), 0))
+
+    thread = threading.Thread(target=_push, name='%sOutlet' % name,
+                              daemon=True)
+    thread.start()
+    return outlet, thread, stop_event
+
+
+def get_benchmark_stream(name, wait_time=1.0):
+    """Resolves a benchmark outlet and returns an LSLStreamWrapper with the
+    inlet and medusa parameters initialized, using all the channels"""
+    lsl_stream = lsl_utils.LSLStreamWrapper(lsl_utils.get_lsl_streams(
+        wait_time=wait_time, force_one_stream=True, name=name))
+    lsl_stream.set_inlet()
+    n_cha = lsl_stream.lsl_n_cha
+    cha_info = [{'medusa_label': 'Ch%i' % i} for i in range(n_cha)]
+    lsl_stream.update_medusa_parameters(
+        medusa_params_initialized=True,
+        medusa_uid=name,
+        medusa_type='CustomBiosignalData',
+        desc_channels_field='channels',
+        channel_label_field='label',
+        cha_info=cha_info,
+        selected_channels_idx=list(range(n_cha)),
+        n_cha=n_cha,
+        l_cha=[info['medusa_label'] for info in cha_info],
+        fs=lsl_stream.fs,
+        lsl_fs=lsl_stream.fs)
+    return lsl_stream
+
+
+def benchmark_receiver_wait_modes(n_cha=32, fs=1000, chunk_size=10,
+                                  duration=5,
+                                  wait_modes=('spin', 'block')):
+    """Measures the CPU usage and latency of LSLStreamReceiver.get_chunk for
+    each wait mode, receiving from a local outlet.
+
+    Returns
+    -------
+    results: dict
+        For each wait mode, the CPU usage of the receiver thread (% of one
+        core), the received samples per second and the median latency in ms
+        between the LSL timestamp of the last sample of each chunk and its
+        reception
+    """
+    name = 'MedusaBenchmarkWaitModes'
+    outlet, thread, stop_event = create_benchmark_outlet(
+        name, n_cha, fs, chunk_size)
+    try:
+        lsl_stream = get_benchmark_stream(name)
+        results = dict()
+        for wait_mode in wait_modes:
+            receiver = lsl_utils.LSLStreamReceiver(lsl_stream,
+                                                   wait_mode=wait_mode)
+            receiver.flush_stream()
+            latencies = list()
+            n_samples = 0
+            t0, cpu0 = time.perf_counter(), time.thread_time()
+            while time.perf_counter() - t0 < duration:
+                _, _, lsl_times = receiver.get_chunk()
+                latencies.append(pylsl.local_clock() - lsl_times[-1])
+                n_samples += len(lsl_times)
+            elapsed = time.perf_counter() - t0
+            results[wait_mode] = {
+                'cpu_percent': 100 * (time.thread_time() - cpu0) / elapsed,
+                'samples_per_second': n_samples / elapsed,
+                'median_latency_ms': 1000 * float(np.median(latencies))
+            }
+    finally:
+        stop_event.set()
+        thread.join()
+    return results
+
+
+def benchmark_sample_buffer(n_cha=64, fs=1000, chunk_size=10,
+                            duration=2400, n_checkpoints=10,
+                            compare_vstack=True):
+    """Measures the cost of appending chunks to a SampleBuffer along a long
+    session, and optionally compares it with np.vstack/np.append storage.
+
+    Parameters
+    ----------
+    n_cha: int
+        Number of channels
+    fs: float
+        Sample rate of the simulated stream
+    chunk_size: int
+        Number of samples per chunk
+    duration: float
+        Simulated session duration in seconds
+    n_checkpoints: int
+        Number of segments of the session in which the mean append time is
+        reported
+    compare_vstack: bool
+        If True, the same session is stored using np.vstack and np.append.
+        Take into account that this can take a long time for long sessions.
+
+    Returns
+    -------
+    results: dict
+        Dict with the session parameters and, for each storage method,
+        the mean append time in microseconds of each segment
+    """
+    n_chunks = int(duration * fs / chunk_size)
+    seg_len = max(n_chunks // n_checkpoints, 1)
+    chunk = np.random.randn(chunk_size, n_cha)
+    times = np.arange(chunk_size) / fs
+
+    def _run(append_fn):
+        seg_times = []
+        acc = 0
+        for i in range(n_chunks):
+            t0 = time.perf_counter()
+            append_fn(chunk, times + i * chunk_size / fs)
+            acc += time.perf_counter() - t0
+            if (i + 1) % seg_len == 0:
+                seg_times.append(acc / seg_len * 1e6)
+                acc = 0
+        return seg_times
+
+    results = {
+        'n_cha': n_cha,
+        'fs': fs,
+        'chunk_size': chunk_size,
+        'duration': duration,
+    }
+    # Sample buffer
+    buffer = buffers.SampleBuffer(n_cha=n_cha, fs=fs)
+    results['sample_buffer_us'] = _run(
+        lambda d, t: buffer.append(d, t, t))
+    # Stacking
+    if compare_vstack:
+        state = {'data': np.zeros((0, n_cha)), 'times': np.zeros((0,)),
+                 'lsl_times': np.zeros((0,))}
+
+        def _stack(d, t):
+            state['data'] = np.vstack((state['data'], d))
+            state['times'] = np.append(state['times'], t)
+            state['lsl_times'] = np.append(state['lsl_times'], t)
+
+        results['vstack_us'] = _run(_stack)
+    return results
+
+
+def get_thread_cpu_time(thread):
+    """Returns the CPU time in seconds consumed by a running thread, or None
+    if the platform does not provide per-thread CPU clocks (e.g., Windows)"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def get_buffer_bytes(buffer):
+    """Returns the bytes of the numpy arrays held in memory by a buffer,
+    including the unused capacity"""
+    return int(sum(v.nbytes for v in vars(buffer).values()
+                   if isinstance(v, np.ndarray)))
+
+
+def benchmark_acquisition(n_cha=8, fs=1000, n_streams=1, duration=10,
+                          channel_format='float32', chunk_size=None,
+                          poll_interval=0.001, trace_memory=True,
+                          **worker_kwargs):
+    """Measures the throughput, CPU usage, latency and memory growth of
+    LSLStreamAppWorkers receiving from local synthetic outlets (see
+    load_generator.LoadGenerator).
+
+    The latency of each chunk is measured as the time since its last
+    sample was generated (its timestamp) until it is available to
+    get_data, polling the workers every poll_interval seconds.
+
+    Parameters
+    ----------
+    n_cha: int
+        Number of channels of each stream
+    fs: float
+        Sample rate of each stream
+    n_streams: int
+        Number of streams
+    duration: float
+        Duration of the measurement in seconds
+    channel_format: str
+        LSL channel format of the streams
+    chunk_size: int or None
+        Samples per chunk pushed by the outlets. If None, 10 ms.
+    poll_interval: float
+        Time in seconds between polls of the workers to measure latency
+    trace_memory: bool
+        If True, the memory allocated during the measurement is traced with
+        tracemalloc, which slows down the allocations slightly
+    worker_kwargs: key-value arguments
+        Arguments of LSLStreamAppWorker (e.g., pipelined)
+
+    Returns
+    -------
+    results: dict
+        Dict with the configuration and the results: received samples per
+        second per stream and in total, CPU usage (% of one core) of each
+        worker thread (None if not available) and of the process, latency
+        percentiles in ms, memory growth in bytes per second and final
+        size of the worker buffers, and the gap counters of each stream
+    """
+    # Import here to avoid loading the GUI modules in the other benchmarks
+    import resources
+    app_state = mp.Value('i', constants.APP_STATE_ON)
+    run_state = mp.Value('i', constants.RUN_STATE_RUNNING)
+    medusa_interface = resources.MedusaInterface(queue.Queue())
+    name = 'MedusaBenchmark_%i_%i_%i' % (n_cha, int(fs), n_streams)
+    generator = load_generator.LoadGenerator(
+        n_streams=n_streams, name=name, n_cha=n_cha, fs=fs,
+        channel_format=channel_format, chunk_size=chunk_size)
+    workers = list()
+    with generator:
+        for outlet in generator.outlets:
+            lsl_stream = get_benchmark_stream(outlet.stream_name)
+            receiver = lsl_utils.LSLStreamReceiver(lsl_stream)
+            workers.append(resources.LSLStreamAppWorker(
+                receiver, app_state, run_state, medusa_interface,
+                **worker_kwargs))
+        if trace_memory:
+            tracemalloc.start()
+        for worker in workers:
+            worker.start()
+        # Measurement
+        latencies = list()
+        memory = list()
+        cursors = [0] * n_streams
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        thread_cpu0 = [get_thread_cpu_time(w) for w in workers]
+        n_start = [w.get_n_samples() for w in workers]
+        next_memory_time = t0
+        while time.perf_counter() - t0 < duration:
+            for i, worker in enumerate(workers):
+                times, _, cursors[i] = worker.get_data_since(cursors[i])
+                if len(times) > 0:
+                    latencies.append(time.time() - times[-1])
+            if trace_memory and time.perf_counter() >= next_memory_time:
+                memory.append((time.perf_counter() - t0,
+                               tracemalloc.get_traced_memory()[0]))
+                next_memory_time += 1
+            time.sleep(poll_interval)
+        elapsed = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        thread_cpu = [get_thread_cpu_time(w) for w in workers]
+        n_samples = [w.get_n_samples() - n for w, n in zip(workers, n_start)]
+        for worker in workers:
+            worker.stop = True
+        for worker in workers:
+            worker.join()
+        if trace_memory:
+            tracemalloc.stop()
+    # Results
+    thread_cpu_percent = [
+        100 * (c1 - c0) / elapsed if c0 is not None and c1 is not None
+        else None for c0, c1 in zip(thread_cpu0, thread_cpu)]
+    latencies = 1000 * np.array(latencies) if len(latencies) > 0 \
+        else np.full(1, np.nan)
+    if len(memory) > 1:
+        memory = np.array(memory)
+        memory_growth = float(np.polyfit(memory[:, 0], memory[:, 1], 1)[0])
+    else:
+        memory_growth = None
+    return {
+        'config': {
+            'n_cha': n_cha,
+            'fs': fs,
+            'n_streams': n_streams,
+            'duration': duration,
+            'channel_format': channel_format,
+            'chunk_size': generator.outlets[0].chunk_size,
+            'worker_kwargs': worker_kwargs
+        },
+        'samples_per_second': [n / elapsed for n in n_samples],
+        'total_samples_per_second': sum(n_samples) / elapsed,
+        'expected_samples_per_second': n_streams * fs,
+        'thread_cpu_percent': thread_cpu_percent,
+        'process_cpu_percent': 100 * cpu / elapsed,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)),
+            'p90': float(np.percentile(latencies, 90)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(np.max(latencies)),
+            'n_chunks': int(np.sum(np.isfinite(latencies)))
+        },
+        'memory_growth_bytes_per_second': memory_growth,
+        'buffer_bytes': [get_buffer_bytes(w.buffer) for w in workers],
+        'gaps': [w.get_gap_stats() for w in workers]
+    }
+
+
+def run_benchmark_matrix(n_chas=(8, 64, 256), fss=(250, 1000, 10000),
+                         n_streams_list=(1, 4), duration=10, verbose=True,
+                         **kwargs):
+    """Runs benchmark_acquisition for each combination of channel count,
+    sample rate and number of streams.
+
+    Returns
+    -------
+    results: dict
+        Dict with the environment (see get_environment_info) and the
+        results of each configuration in key 'results'
+    """
+    results = list()
+    for n_cha, fs, n_streams in itertools.product(n_chas, fss,
+                                                  n_streams_list):
+        if verbose:
+            print('Running %i streams, %i channels, %i Hz...' %
+                  (n_streams, n_cha, fs))
+        results.append(benchmark_acquisition(
+            n_cha=n_cha, fs=fs, n_streams=n_streams, duration=duration,
+            **kwargs))
+        if verbose:
+            print_acquisition_results(results[-1])
+    return {'environment': get_environment_info(), 'results': results}
+
+
+def get_environment_info():
+    """Returns a dict with the versions and machine used in the benchmarks,
+    to interpret the results of different releases"""
+    return {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': mp.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pylsl': pylsl.__version__,
+        'liblsl': pylsl.library_version()
+    }
+
+
+def save_results(results, path):
+    """Saves the results of run_benchmark_matrix in a JSON file"""
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """Compares the results of two runs of run_benchmark_matrix (dicts or
+    paths to JSON files) for the configurations present in both.
+
+    Returns
+    -------
+    comparison: list of dict
+        For each configuration, the ratio current / baseline of the
+        throughput, process CPU usage and latency percentiles, and the
+        list of metrics that got worse by more than tolerance (regressions)
+    """
+    if isinstance(baseline, str):
+        with open(baseline, 'r') as f:
+            baseline = json.load(f)
+    if isinstance(current, str):
+        with open(current, 'r') as f:
+            current = json.load(f)
+    # Metrics and whether higher values are better
+    metrics = {
+        'total_samples_per_second': (lambda r: r['total_samples_per_second'],
+                                     True),
+        'process_cpu_percent': (lambda r: r['process_cpu_percent'], False),
+        'latency_p50': (lambda r: r['latency_ms']['p50'], False),
+        'latency_p99': (lambda r: r['latency_ms']['p99'], False),
+    }
+
+    def key(res):
+        return json.dumps(res['config'], sort_keys=True)
+
+    baseline_results = {key(r): r for r in baseline['results']}
+    comparison = list()
+    for res in current['results']:
+        base = baseline_results.get(key(res), None)
+        if base is None:
+            continue
+        ratios = dict()
+        regressions = list()
+        for metric, (getter, higher_is_better) in metrics.items():
+            b, c = getter(base), getter(res)
+            if b is None or c is None or not b > 0:
+                continue
+            ratios[metric] = c / b
+            if (higher_is_better and c / b < 1 - tolerance) or \
+                    (not higher_is_better and c / b > 1 + tolerance):
+                regressions.append(metric)
+        comparison.append({'config': res['config'], 'ratios': ratios,
+                           'regressions': regressions})
+    return comparison
+
+
+def print_acquisition_results(res):
+    cpu = ', '.join('%.1f%%' % c if c is not None else 'n/a'
+                    for c in res['thread_cpu_percent'])
+    growth = res['memory_growth_bytes_per_second']
+    print('\t%.0f samples/s (expected %.0f), CPU: process %.1f%%, workers '
+          '[%s]\n\tlatency ms: p50 %.2f, p90 %.2f, p99 %.2f, max %.2f\n'
+          '\tmemory growth: %s' % (
+              res['total_samples_per_second'],
+              res['expected_samples_per_second'],
+              res['process_cpu_percent'], cpu,
+              res['latency_ms']['p50'], res['latency_ms']['p90'],
+              res['latency_ms']['p99'], res['latency_ms']['max'],
+              '%.1f kB/s' % (growth / 1024) if growth is not None
+              else 'n/a'))
+
+
+def print_results(results):
+    print('Session: %i channels, %i Hz, chunks of %i samples, %i s' %
+          (results['n_cha'], results['fs'], results['chunk_size'],
+           results['duration']))
+    methods = [k for k in results if k.endswith('_us')]
+    print('Segment\t' + '\t'.join(methods))
+    for i in range(len(results[methods[0]])):
+        print('%i\t' % i + '\t'.join('%.2f' % results[m][i]
+                                     for m in methods))
+
+
+def parse_args(argv=None):
+    def values(cast):
+        return lambda s: [cast(v) for v in s.split(',')]
+    parser = argparse.ArgumentParser(
+        description='Acquisition benchmarks of MEDUSA Platform')
+    parser.add_argument('--matrix', action='store_true',
+                        help='run the acquisition benchmark matrix')
+    parser.add_argument('--n-cha', type=values(int), default=[8, 64, 256])
+    parser.add_argument('--fs', type=values(float),
+                        default=[250, 1000, 10000])
+    parser.add_argument('--n-streams', type=values(int), default=[1, 4])
+    parser.add_argument('--format', dest='channel_format',
+                        default='float32')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='duration of each configuration in s')
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help='do not trace the memory allocations')
+    parser.add_argument('--output', default=None,
+                        help='path of the JSON file with the results')
+    parser.add_argument('--compare', nargs=2, default=None,
+                        metavar=('BASELINE', 'CURRENT'),
+                        help='compare two JSON files with results')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare is not None:
+        for comp in compare_results(*args.compare):
+            config = comp['config']
+            print('%i streams, %i channels, %i Hz: %s%s' % (
+                config['n_streams'], config['n_cha'], config['fs'],
+                ', '.join('%s x%.2f' % (k, v)
+                          for k, v in comp['ratios'].items()),
+                ' [REGRESSIONS: %s]' % ', '.join(comp['regressions'])
+                if comp['regressions'] else ''))
+    elif args.matrix:
+        results = run_benchmark_matrix(
+            n_chas=args.n_cha, fss=args.fs, n_streams_list=args.n_streams,
+            duration=args.duration, channel_format=args.channel_format,
+            trace_memory=not args.no_trace_memory)
+        if args.output is not None:
+            save_results(results, args.output)
+            print('Results saved in %s' % args.output)
+    else:
+        print('Mean append time per chunk (us) along the session')
+        print_results(benchmark_sample_buffer(duration=60))
+        print('\nLSLStreamReceiver wait modes')
+        for mode, res in benchmark_receiver_wait_modes().items():
+            print('%s\tCPU: %.1f%%\t%.1f samples/s\tlatency: %.2f ms' %
+                  (mode, res['cpu_percent'], res['samples_per_second'],
+                   res['median_latency_ms']))
+
+
+if __name__ == '__main__':
+    main()
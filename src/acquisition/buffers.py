@@ -0,0 +1,1520 @@
+# BUILT-IN MODULES
+import math
+import os, json, shutil
+import queue
+import threading
+from multiprocessing import shared_memory
+
+# EXTERNAL MODULES
+import numpy as np
+
+
+class SampleBuffer:
+    """Growable sample store for the signals received from an LSL stream.
+
+    The samples, local timestamps and LSL timestamps are kept in 3
+    preallocated arrays that share the same length. When the capacity is
+    exceeded, the arrays are reallocated with geometric growth, so appending
+    a chunk has an amortized cost of O(chunk size) instead of O(recording
+    length) as with np.vstack and np.append.
+
+    Take into account that the arrays returned by the properties data,
+    timestamps and lsl_timestamps are views of the internal buffers. Use
+    get_data or get_lsl_timestamps to obtain independent copies.
+    """
+
+    def __init__(self, n_cha, dtype=float, init_capacity=None, fs=None,
+                 growth_factor=2.0):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels of the stream
+        dtype: numpy.dtype or type
+            Data type of the samples
+        init_capacity: int or None
+            Initial number of samples that can be stored without
+            reallocating. If None, it is set to 60 s of signal if fs is
+            available or 4096 samples otherwise.
+        fs: float or None
+            Nominal sample rate of the stream. It is only used to estimate
+            the initial capacity.
+        growth_factor: float
+            Factor applied to the capacity each time the buffer is full. It
+            must be greater than 1.
+        """
+        if growth_factor <= 1:
+            raise ValueError('Parameter growth_factor must be greater than 1')
+        if init_capacity is None:
+            init_capacity = int(60 * fs) if fs is not None and fs > 0 \
+                else 4096
+        self.n_cha = n_cha
+        self.dtype = np.dtype(dtype)
+        self.growth_factor = growth_factor
+        self.init_capacity = max(int(init_capacity), 1)
+        self.n_samples = 0
+        self.generation = -1
+        self._data = None
+        self._timestamps = None
+        self._lsl_timestamps = None
+        self.reset()
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def capacity(self):
+        return self._timestamps.shape[0]
+
+    def get_cursor(self):
+        """Returns the cursor of the stored samples, (generation,
+        n_samples), where generation is the number of resets (see
+        get_read_start)"""
+        return self.generation, self.n_samples
+
+    @property
+    def data(self):
+        return self._data[:self.n_samples]
+
+    @property
+    def timestamps(self):
+        return self._timestamps[:self.n_samples]
+
+    @property
+    def lsl_timestamps(self):
+        return self._lsl_timestamps[:self.n_samples]
+
+    def reset(self):
+        """Discards all the samples and restores the initial capacity"""
+        self.n_samples = 0
+        self.generation += 1
+        self._data = np.empty((self.init_capacity, self.n_cha),
+                              dtype=self.dtype)
+        self._timestamps = np.empty((self.init_capacity,))
+        self._lsl_timestamps = np.empty((self.init_capacity,))
+
+    def reserve(self, capacity):
+        """Makes sure that the buffer can hold at least capacity samples
+        without reallocating"""
+        if capacity <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity = int(math.ceil(new_capacity * self.growth_factor))
+        self._data = self.__realloc(self._data, new_capacity)
+        self._timestamps = self.__realloc(self._timestamps, new_capacity)
+        self._lsl_timestamps = self.__realloc(self._lsl_timestamps,
+                                              new_capacity)
+
+    def append(self, data, timestamps, lsl_timestamps):
+        """Appends a chunk of samples, keeping the 3 arrays in step
+
+        Parameters
+        ----------
+        data: np.ndarray
+            Samples with shape [n_samples x n_cha]
+        timestamps: np.ndarray
+            Local timestamps with shape [n_samples]
+        lsl_timestamps: np.ndarray
+            LSL timestamps with shape [n_samples]
+        """
+        n = len(timestamps)
+        if len(data) != n or len(lsl_timestamps) != n:
+            raise ValueError('The chunk data and timestamps must have the '
+                             'same number of samples')
+        if n == 0:
+            return
+        end = self.n_samples + n
+        self.reserve(end)
+        self._data[self.n_samples:end] = data
+        self._timestamps[self.n_samples:end] = timestamps
+        self._lsl_timestamps[self.n_samples:end] = lsl_timestamps
+        self.n_samples = end
+
+    def get_data(self):
+        """Returns a copy of the timestamps and samples"""
+        return self.timestamps.copy(), self.data.copy()
+
+    def get_views(self, start=0, stop=None):
+        """Returns read-only views of the timestamps, samples and LSL
+        timestamps between indexes start and stop (the stored samples by
+        default) without copying them.
+
+        The views remain valid after later appends, since stored samples
+        are never modified: when the buffer grows or is reset, new arrays
+        are allocated and the views keep referencing the previous ones.
+        """
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        start = min(max(start, 0), stop)
+        views = (self._timestamps[start:stop], self._data[start:stop],
+                 self._lsl_timestamps[start:stop])
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def get_time_index(self, t):
+        """Returns the index of the first sample with timestamp greater than
+        or equal to t, using a binary search"""
+        return int(np.searchsorted(self.timestamps, t, side='left'))
+
+    def get_lsl_timestamps(self):
+        """Returns a copy of the LSL timestamps"""
+        return self.lsl_timestamps.copy()
+
+    def __realloc(self, array, capacity):
+        new_array = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        new_array[:self.n_samples] = array[:self.n_samples]
+        return new_array
+
+
+
+class CompactTimestamps:
+    """Compact store of the timestamps of a regular-rate stream.
+
+    The timestamps of regular streams are nearly affine in the sample
+    index, so they are encoded as runs (segments) that start at sample
+    index start with timestamp t0 and increase dt per sample:
+
+        t[i] = t0 + (i - start) * dt
+
+    Samples that deviate more than tolerance from their segment (e.g.,
+    jitter) are stored exactly as exceptions. If max_exception_run
+    consecutive samples deviate (e.g., after a gap or a clock adjustment), a
+    new segment is started at the first of them. With tolerance 0, the
+    decoded arrays are bit-exact, since the encoder and decoder use the
+    same floating point operations.
+
+    The segments and exceptions are kept in growable numpy arrays, and each
+    chunk is encoded with vectorized operations. If the encoded timestamps
+    take more memory than a float64 array (e.g., jittery timestamps with
+    tolerance 0), the store falls back to a raw float64 array.
+    """
+
+    # Initial number of segments, exceptions or raw timestamps that can be
+    # stored without reallocating
+    INIT_CAPACITY = 16
+    # Min number of samples before checking if the raw fallback is needed,
+    # so the initial capacity of the arrays does not trigger it
+    MIN_FALLBACK_SAMPLES = 4096
+    # Growth of the raw array, smaller than the growth of the encoded
+    # arrays to keep the unused capacity of the fallback low
+    RAW_GROWTH_FACTOR = 1.25
+
+    def __init__(self, tolerance=0, max_exception_run=4):
+        """Class constructor
+
+        Parameters
+        ----------
+        tolerance: float
+            Max absolute error in seconds of the decoded timestamps. With
+            0 (default), the exact timestamps are decoded.
+        max_exception_run: int
+            Number of consecutive exceptions after which a new segment is
+            started
+        """
+        if tolerance < 0:
+            raise ValueError('Parameter tolerance must be greater than or '
+                             'equal to 0')
+        if max_exception_run < 1:
+            raise ValueError('Parameter max_exception_run must be greater '
+                             'than 0')
+        self.tolerance = tolerance
+        self.max_exception_run = max_exception_run
+        self.reset()
+
+    def __len__(self):
+        return self.n_samples
+
+    def reset(self):
+        """Discards all the timestamps"""
+        self.n_samples = 0
+        self.n_segments = 0
+        self.seg_starts = np.empty((self.INIT_CAPACITY,), dtype=np.int64)
+        self.seg_t0s = np.empty((self.INIT_CAPACITY,), dtype=np.float64)
+        self.seg_dts = np.empty((self.INIT_CAPACITY,), dtype=np.float64)
+        self.n_exceptions = 0
+        self.exc_idx = np.empty((self.INIT_CAPACITY,), dtype=np.int64)
+        self.exc_values = np.empty((self.INIT_CAPACITY,), dtype=np.float64)
+        # Raw float64 timestamps, used instead of the segments if the
+        # encoding does not save memory
+        self.raw = None
+        # Number of samples in the last segment and last consecutive
+        # exceptions
+        self.seg_len = 0
+        self.exc_run = 0
+
+    @property
+    def is_raw(self):
+        """True if the timestamps are stored in a raw float64 array"""
+        return self.raw is not None
+
+    def append(self, timestamps):
+        """Appends the timestamps of a chunk"""
+        timestamps = np.asarray(timestamps, dtype=np.float64).ravel()
+        n = len(timestamps)
+        if n == 0:
+            return
+        if self.is_raw:
+            self.raw = self.__grow(self.raw, self.n_samples + n,
+                                   self.RAW_GROWTH_FACTOR)
+            self.raw[self.n_samples:self.n_samples + n] = timestamps
+            self.n_samples += n
+            return
+        self.__encode(self.n_samples, timestamps)
+        self.n_samples += n
+        if self.n_samples >= self.MIN_FALLBACK_SAMPLES and \
+                self.get_n_bytes() > 8 * self.n_samples:
+            self.__to_raw()
+
+    def __encode(self, start, values):
+        # The samples start, start + 1, ... are encoded segment by segment.
+        # Each iteration consumes at least one sample.
+        while len(values) > 0:
+            if self.seg_len == 0:
+                self.__start_segment(start, values[0])
+                start, values = start + 1, values[1:]
+                continue
+            j = self.n_segments - 1
+            if self.seg_len == 1:
+                # The sample that sets the step is checked below as the
+                # rest, since t0 + (t - t0) may differ from t by rounding
+                self.seg_dts[j] = values[0] - self.seg_t0s[j]
+                self.seg_len = 2
+            # Same operations as get_array, so tolerance 0 is bit-exact
+            k = np.arange(start - self.seg_starts[j],
+                          start - self.seg_starts[j] + len(values))
+            pred = self.seg_t0s[j] + k * self.seg_dts[j]
+            bad = np.abs(values - pred) > self.tolerance
+            # Length of the run of exceptions that ends at each sample,
+            # including the exceptions of the previous chunks
+            pos = np.arange(len(values))
+            last_good = np.maximum.accumulate(
+                np.where(bad, -1 - self.exc_run, pos))
+            run_len = pos - last_good
+            hits = np.flatnonzero(run_len >= self.max_exception_run)
+            if len(hits) == 0:
+                self.__add_exceptions(start + pos[bad], values[bad])
+                self.exc_run = int(run_len[-1])
+                self.seg_len += len(values)
+                return
+            # Start a new segment at the first exception of the run, which
+            # may have been stored by a previous chunk
+            r0 = int(hits[0]) - self.max_exception_run + 1
+            head = max(r0, 0)
+            self.__add_exceptions(start + pos[:head][bad[:head]],
+                                  values[:head][bad[:head]])
+            if r0 < 0:
+                self.n_exceptions += r0
+                values = np.concatenate(
+                    (self.exc_values[self.n_exceptions:
+                                     self.n_exceptions - r0],
+                     values[head:]))
+            else:
+                values = values[head:]
+            start += r0
+            self.__start_segment(start, values[0])
+            if self.max_exception_run > 1:
+                # The step is estimated from the first and last samples of
+                # the run, which is less affected by jitter than
+                # consecutive samples
+                last = self.max_exception_run - 1
+                self.seg_dts[self.n_segments - 1] = \
+                    (values[last] - values[0]) / last
+                self.seg_len = 2
+            start, values = start + 1, values[1:]
+
+    def __start_segment(self, idx, t):
+        j = self.n_segments
+        self.seg_starts = self.__grow(self.seg_starts, j + 1)
+        self.seg_t0s = self.__grow(self.seg_t0s, j + 1)
+        self.seg_dts = self.__grow(self.seg_dts, j + 1)
+        self.seg_starts[j] = idx
+        self.seg_t0s[j] = t
+        self.seg_dts[j] = 0.0
+        self.n_segments += 1
+        self.seg_len = 1
+        self.exc_run = 0
+
+    def __add_exceptions(self, idx, values):
+        n = len(idx)
+        if n == 0:
+            return
+        end = self.n_exceptions + n
+        self.exc_idx = self.__grow(self.exc_idx, end)
+        self.exc_values = self.__grow(self.exc_values, end)
+        self.exc_idx[self.n_exceptions:end] = idx
+        self.exc_values[self.n_exceptions:end] = values
+        self.n_exceptions = end
+
+    def __grow(self, array, capacity, growth_factor=2.0):
+        if capacity <= len(array):
+            return array
+        new_capacity = max(capacity, int(growth_factor * len(array)))
+        new_array = np.empty((new_capacity,), dtype=array.dtype)
+        new_array[:len(array)] = array
+        return new_array
+
+    def __to_raw(self):
+        raw = np.empty((max(self.n_samples, self.INIT_CAPACITY),),
+                       dtype=np.float64)
+        raw[:self.n_samples] = self.get_array()
+        n_samples = self.n_samples
+        self.reset()
+        self.raw = raw
+        self.n_samples = n_samples
+
+    def get_array(self, start=0, stop=None):
+        """Decodes the timestamps between indexes start and stop (all the
+        timestamps by default) into a new array"""
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        start = min(max(start, 0), stop)
+        if self.is_raw:
+            return self.raw[start:stop].copy()
+        out = np.empty((stop - start,), dtype=np.float64)
+        if stop == start:
+            return out
+        seg_starts = self.seg_starts[:self.n_segments]
+        j = int(np.searchsorted(seg_starts, start, side='right')) - 1
+        while j < self.n_segments and seg_starts[j] < stop:
+            seg_stop = seg_starts[j + 1] if j + 1 < self.n_segments \
+                else self.n_samples
+            a, b = max(start, seg_starts[j]), min(stop, seg_stop)
+            k = np.arange(a - seg_starts[j], b - seg_starts[j])
+            out[a - start:b - start] = self.seg_t0s[j] + k * self.seg_dts[j]
+            j += 1
+        exc_idx = self.exc_idx[:self.n_exceptions]
+        lo, hi = np.searchsorted(exc_idx, (start, stop))
+        if hi > lo:
+            out[exc_idx[lo:hi] - start] = self.exc_values[lo:hi]
+        return out
+
+    def get_value(self, idx):
+        """Decodes the timestamp of the sample at index idx, with the same
+        floating point operations as get_array"""
+        if self.is_raw:
+            return float(self.raw[idx])
+        k = int(np.searchsorted(self.exc_idx[:self.n_exceptions], idx))
+        if k < self.n_exceptions and self.exc_idx[k] == idx:
+            return float(self.exc_values[k])
+        j = int(np.searchsorted(self.seg_starts[:self.n_segments], idx,
+                                side='right')) - 1
+        return float(self.seg_t0s[j] +
+                     (idx - self.seg_starts[j]) * self.seg_dts[j])
+
+    def get_time_index(self, t):
+        """Returns the index of the first sample with timestamp greater than
+        or equal to t. The first sample of each segment is t0, so the
+        segment that contains the index is found with a binary search on
+        the t0 of the segments, and then the index with a binary search in
+        that segment. The cost does not depend on the number of samples."""
+        if self.is_raw:
+            return int(np.searchsorted(self.raw[:self.n_samples], t))
+        # Last segment that starts before t. The previous segments are
+        # older than t, and the next ones are not older than t.
+        j = int(np.searchsorted(self.seg_t0s[:self.n_segments], t)) - 1
+        if j < 0:
+            return 0
+        lo = int(self.seg_starts[j]) + 1
+        hi = int(self.seg_starts[j + 1]) if j + 1 < self.n_segments \
+            else self.n_samples
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_value(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get_n_bytes(self):
+        """Returns the size in bytes of the arrays that store the
+        timestamps, including their unused capacity"""
+        if self.is_raw:
+            return self.raw.nbytes
+        return self.seg_starts.nbytes + self.seg_t0s.nbytes + \
+            self.seg_dts.nbytes + self.exc_idx.nbytes + \
+            self.exc_values.nbytes
+
+    def get_compression_ratio(self):
+        """Returns the size of the timestamps as a float64 array divided by
+        the size of the stored timestamps"""
+        if self.n_samples == 0:
+            return 1.0
+        return 8 * self.n_samples / self.get_n_bytes()
+
+    def get_stats(self):
+        """Returns a dict with the number of samples, segments and
+        exceptions, the compression ratio and whether the raw fallback is
+        in use"""
+        return {
+            'n_samples': self.n_samples,
+            'n_segments': self.n_segments,
+            'n_exceptions': self.n_exceptions,
+            'raw': self.is_raw,
+            'compression_ratio': self.get_compression_ratio()
+        }
+
+
+class CompactSampleBuffer:
+    """Sample store that keeps the timestamps encoded with
+    CompactTimestamps, which saves most of the memory of the timestamps of
+    regular-rate streams (2 float64 per sample in SampleBuffer). Timestamps
+    that cannot be encoded in less memory (e.g., jittery timestamps with
+    tolerance 0) are kept as float64 arrays, as in SampleBuffer.
+
+    It implements the same interface as SampleBuffer. The samples are kept
+    in a growable array as in SampleBuffer, but the timestamps are decoded
+    on demand, so the timestamps returned by the properties and get_views
+    are new arrays instead of views.
+    """
+
+    def __init__(self, n_cha, dtype=float, init_capacity=None, fs=None,
+                 growth_factor=2.0, tolerance=0):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels of the stream
+        dtype: numpy.dtype or type
+            Data type of the samples
+        init_capacity: int or None
+            Initial number of samples that can be stored without
+            reallocating (see SampleBuffer)
+        fs: float or None
+            Nominal sample rate of the stream. It is only used to estimate
+            the initial capacity.
+        growth_factor: float
+            Factor applied to the capacity each time the buffer is full
+        tolerance: float or None
+            Max absolute error in seconds of the decoded timestamps (see
+            CompactTimestamps). With 0 (default), the exact timestamps are
+            kept. Lossy encoding must be requested explicitly: if None, it
+            is set to 1% of the sample period if fs is available, which is
+            well below the jitter of LSL timestamps, or 1 us otherwise.
+        """
+        if tolerance is None:
+            tolerance = 0.01 / fs if fs is not None and fs > 0 else 1e-6
+        if growth_factor <= 1:
+            raise ValueError('Parameter growth_factor must be greater than 1')
+        if init_capacity is None:
+            init_capacity = int(60 * fs) if fs is not None and fs > 0 \
+                else 4096
+        self.n_cha = n_cha
+        self.dtype = np.dtype(dtype)
+        self.growth_factor = growth_factor
+        self.init_capacity = max(int(init_capacity), 1)
+        self.tolerance = tolerance
+        self.n_samples = 0
+        self.generation = -1
+        self._data = None
+        self._timestamps = CompactTimestamps(tolerance=tolerance)
+        self._lsl_timestamps = CompactTimestamps(tolerance=tolerance)
+        self.reset()
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def capacity(self):
+        return self._data.shape[0]
+
+    def get_cursor(self):
+        """See SampleBuffer.get_cursor"""
+        return self.generation, self.n_samples
+
+    @property
+    def data(self):
+        return self._data[:self.n_samples]
+
+    @property
+    def timestamps(self):
+        return self._timestamps.get_array()
+
+    @property
+    def lsl_timestamps(self):
+        return self._lsl_timestamps.get_array()
+
+    def reset(self):
+        """Discards all the samples and restores the initial capacity"""
+        self.n_samples = 0
+        self.generation += 1
+        self._data = np.empty((self.init_capacity, self.n_cha),
+                              dtype=self.dtype)
+        self._timestamps.reset()
+        self._lsl_timestamps.reset()
+
+    def reserve(self, capacity):
+        """Makes sure that the buffer can hold at least capacity samples
+        without reallocating"""
+        if capacity <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity = int(math.ceil(new_capacity * self.growth_factor))
+        new_data = np.empty((new_capacity, self.n_cha), dtype=self.dtype)
+        new_data[:self.n_samples] = self._data[:self.n_samples]
+        self._data = new_data
+
+    def append(self, data, timestamps, lsl_timestamps):
+        """Appends a chunk of samples (see SampleBuffer.append)"""
+        n = len(timestamps)
+        if len(data) != n or len(lsl_timestamps) != n:
+            raise ValueError('The chunk data and timestamps must have the '
+                             'same number of samples')
+        if n == 0:
+            return
+        end = self.n_samples + n
+        self.reserve(end)
+        self._data[self.n_samples:end] = data
+        self._timestamps.append(timestamps)
+        self._lsl_timestamps.append(lsl_timestamps)
+        self.n_samples = end
+
+    def get_data(self):
+        """Returns a copy of the timestamps and samples"""
+        return self.timestamps, self.data.copy()
+
+    def get_views(self, start=0, stop=None):
+        """Returns the decoded timestamps, a read-only view of the samples
+        and the decoded LSL timestamps between indexes start and stop (see
+        SampleBuffer.get_views)"""
+        stop = self.n_samples if stop is None \
+            else min(stop, self.n_samples)
+        start = min(max(start, 0), stop)
+        views = (self._timestamps.get_array(start, stop),
+                 self._data[start:stop],
+                 self._lsl_timestamps.get_array(start, stop))
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def get_time_index(self, t):
+        """Returns the index of the first sample with timestamp greater than
+        or equal to t, using a binary search"""
+        return self._timestamps.get_time_index(t)
+
+    def get_lsl_timestamps(self):
+        """Returns a copy of the LSL timestamps"""
+        return self.lsl_timestamps
+
+    def get_compression_ratio(self):
+        """Returns the compression ratio of both timestamp arrays (see
+        CompactTimestamps.get_compression_ratio)"""
+        n_bytes = self._timestamps.get_n_bytes() + \
+            self._lsl_timestamps.get_n_bytes()
+        if n_bytes == 0:
+            return 1.0
+        return 16 * self.n_samples / n_bytes
+
+    def get_timestamps_stats(self):
+        """Returns the encoding stats of the timestamps and LSL
+        timestamps (see CompactTimestamps.get_stats)"""
+        return {'timestamps': self._timestamps.get_stats(),
+                'lsl_timestamps': self._lsl_timestamps.get_stats()}
+
+
+class EventBuffer:
+    """Compact store of the events received from a marker stream (e.g.,
+    string markers or irregular integer codes).
+
+    The timestamps are kept in growable arrays as in SampleBuffer, so the
+    events in a time window are found with binary searches (see get_events
+    and get_event_times). The labels are interned: each distinct label is
+    stored once in the list labels, and the events only keep its code
+    (int32) in a [n_events x n_cha] array.
+
+    It implements the same interface as SampleBuffer, with dtype object:
+    the samples returned by the properties and get_views are arrays with
+    the decoded labels, so they are new arrays instead of views.
+    """
+
+    def __init__(self, n_cha=1, init_capacity=1024, growth_factor=2.0):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels of the stream
+        init_capacity: int
+            Initial number of events that can be stored without
+            reallocating
+        growth_factor: float
+            Factor applied to the capacity each time the buffer is full
+        """
+        self.n_cha = n_cha
+        self.dtype = np.dtype(object)
+        self.codes = SampleBuffer(n_cha=n_cha, dtype=np.int32,
+                                  init_capacity=init_capacity,
+                                  growth_factor=growth_factor)
+        self.labels = list()
+        self.label_codes = dict()
+        self._label_array = np.empty((0,), dtype=object)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def capacity(self):
+        return self.codes.capacity
+
+    def get_cursor(self):
+        """See SampleBuffer.get_cursor"""
+        return self.codes.get_cursor()
+
+    @property
+    def data(self):
+        return self.decode(self.codes.data)
+
+    @property
+    def timestamps(self):
+        return self.codes.timestamps
+
+    @property
+    def lsl_timestamps(self):
+        return self.codes.lsl_timestamps
+
+    def reset(self):
+        """Discards all the events and labels"""
+        self.codes.reset()
+        self.labels = list()
+        self.label_codes = dict()
+        self._label_array = np.empty((0,), dtype=object)
+
+    def reserve(self, capacity):
+        self.codes.reserve(capacity)
+
+    def intern(self, label):
+        """Returns the code of a label, adding it to labels if it is new.
+        Numpy scalars are converted to Python objects, so the labels can
+        be serialized."""
+        if isinstance(label, np.generic):
+            label = label.item()
+        code = self.label_codes.get(label, None)
+        if code is None:
+            code = len(self.labels)
+            self.labels.append(label)
+            self.label_codes[label] = code
+        return code
+
+    def encode(self, data):
+        """Returns the codes of an array of labels, interning the new
+        ones"""
+        data = np.asarray(data, dtype=object)
+        return np.fromiter((self.intern(label) for label in data.ravel()),
+                           dtype=np.int32, count=data.size
+                           ).reshape(data.shape)
+
+    def decode(self, codes):
+        """Returns an array with the labels of an array of codes"""
+        if len(self._label_array) != len(self.labels):
+            self._label_array = np.empty((len(self.labels),), dtype=object)
+            self._label_array[:] = self.labels
+        return self._label_array[codes]
+
+    def append(self, data, timestamps, lsl_timestamps):
+        """Appends a chunk of events (see SampleBuffer.append)
+
+        Parameters
+        ----------
+        data: np.ndarray
+            Labels with shape [n_events x n_cha]
+        timestamps: np.ndarray
+            Local timestamps with shape [n_events]
+        lsl_timestamps: np.ndarray
+            LSL timestamps with shape [n_events]
+        """
+        if len(data) != len(timestamps):
+            raise ValueError('The chunk data and timestamps must have the '
+                             'same number of samples')
+        self.codes.append(self.encode(data), timestamps, lsl_timestamps)
+
+    def get_data(self):
+        """Returns a copy of the timestamps and the labels"""
+        timestamps, codes = self.codes.get_data()
+        return timestamps, self.decode(codes)
+
+    def get_views(self, start=0, stop=None):
+        """Returns read-only views of the timestamps and LSL timestamps, and
+        the labels of the events between indexes start and stop (see
+        SampleBuffer.get_views)"""
+        timestamps, codes, lsl_timestamps = self.codes.get_views(start, stop)
+        labels = self.decode(codes)
+        labels.flags.writeable = False
+        return timestamps, labels, lsl_timestamps
+
+    def get_time_index(self, t):
+        """Returns the index of the first event with timestamp greater than
+        or equal to t, using a binary search"""
+        return self.codes.get_time_index(t)
+
+    def get_lsl_timestamps(self):
+        """Returns a copy of the LSL timestamps"""
+        return self.codes.get_lsl_timestamps()
+
+    def get_events(self, t_start, t_stop):
+        """Returns the timestamps and labels of the events in [t_start,
+        t_stop). The cost depends on the number of events in the window
+        rather than on the number of stored events."""
+        start = self.get_time_index(t_start)
+        stop = self.get_time_index(t_stop)
+        timestamps, labels, _ = self.get_views(start, stop)
+        return timestamps, labels
+
+    def get_event_times(self, label, t_start=-np.inf, t_stop=np.inf,
+                        cha=0):
+        """Returns the timestamps of the events with a label in channel cha
+        within [t_start, t_stop), comparing codes instead of labels"""
+        code = self.label_codes.get(label.item() if isinstance(
+            label, np.generic) else label, None)
+        start = self.get_time_index(t_start)
+        stop = self.get_time_index(t_stop)
+        timestamps, codes, _ = self.codes.get_views(start, stop)
+        if code is None:
+            return timestamps[:0]
+        return timestamps[codes[:, cha] == code]
+
+    def to_dict(self):
+        """Returns the events in their compact form: timestamps, LSL
+        timestamps, codes and labels"""
+        timestamps, codes, lsl_timestamps = self.codes.get_views()
+        return {'timestamps': timestamps.copy(),
+                'lsl_timestamps': lsl_timestamps.copy(),
+                'codes': codes.copy(),
+                'labels': list(self.labels)}
+
+
+class TelemetryRing:
+    """Fixed-size ring of per-chunk synchronization telemetry of an LSL
+    receiver. The records are stored in a preallocated structured array, so
+    recording a chunk has a constant cost and the memory usage is bounded:
+    when the ring is full, the oldest records are overwritten.
+
+    Each record contains the following fields:
+
+        - time: local time (time.time()) at which the chunk was received
+        - unix_clock_offset: offset between the local and LSL clocks
+        - lsl_clock_offset: offset between the outlet and local LSL clocks
+        - chunk_size: number of samples of the chunk
+        - interval: time since the previous chunk in seconds
+        - aliasing_correction: shift in seconds of the timestamps corrected
+          due to aliasing, 0 if the chunk was not corrected
+    """
+
+    DTYPE = np.dtype([('time', np.float64),
+                      ('unix_clock_offset', np.float64),
+                      ('lsl_clock_offset', np.float64),
+                      ('chunk_size', np.int64),
+                      ('interval', np.float64),
+                      ('aliasing_correction', np.float64)])
+
+    def __init__(self, capacity=4096):
+        """Class constructor
+
+        Parameters
+        ----------
+        capacity: int
+            Maximum number of records. Older records are overwritten.
+        """
+        if capacity < 1:
+            raise ValueError('Parameter capacity must be greater than 0')
+        self.capacity = int(capacity)
+        self._records = np.zeros((self.capacity,), dtype=self.DTYPE)
+        self.n_records = 0
+        self.last_time = None
+
+    def __len__(self):
+        return min(self.n_records, self.capacity)
+
+    def reset(self):
+        """Discards all the records"""
+        self.n_records = 0
+        self.last_time = None
+
+    def append(self, time, unix_clock_offset, lsl_clock_offset, chunk_size,
+               aliasing_correction=0.0):
+        """Records a received chunk. The interval is computed from the time
+        of the previous record."""
+        interval = time - self.last_time if self.last_time is not None \
+            else np.nan
+        self._records[self.n_records % self.capacity] = (
+            time, unix_clock_offset, lsl_clock_offset, chunk_size, interval,
+            aliasing_correction)
+        self.last_time = time
+        self.n_records += 1
+
+    def get_records(self):
+        """Returns a copy of the stored records in chronological order as a
+        numpy structured array"""
+        if self.n_records <= self.capacity:
+            return self._records[:self.n_records].copy()
+        idx = self.n_records % self.capacity
+        return np.concatenate((self._records[idx:], self._records[:idx]))
+
+    def to_dict(self):
+        """Returns the stored records in chronological order as a dict of
+        lists, one per field, which can be saved in recordings"""
+        records = self.get_records()
+        telemetry = {name: records[name].tolist()
+                     for name in self.DTYPE.names}
+        telemetry['n_chunks'] = self.n_records
+        return telemetry
+
+
+class SpillingSampleBuffer:
+    """Sample store for long recordings that spills the samples to disk.
+
+    It implements the same interface as SampleBuffer, but only the last
+    tail_capacity samples are kept in memory, in a circular buffer. The
+    samples are appended in the background by a writer thread to 3
+    append-only files in spill_dir (data.bin, timestamps.bin and
+    lsl_timestamps.bin), with a header.json file that describes them. The
+    reads are transparent: samples that are no longer in memory are read
+    from the files through np.memmap.
+
+    The files are flushed after each chunk, so the samples written before
+    a crash can be recovered with load_spill_files.
+    """
+
+    HEADER_FILE = 'header.json'
+    DATA_FILE = 'data.bin'
+    TIMESTAMPS_FILE = 'timestamps.bin'
+    LSL_TIMESTAMPS_FILE = 'lsl_timestamps.bin'
+
+    def __init__(self, n_cha, spill_dir, dtype=float, tail_capacity=None,
+                 fs=None, metadata=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels of the stream
+        spill_dir: str
+            Directory of the spill files. It is created if it does not
+            exist, and the previous files are overwritten.
+        dtype: numpy.dtype or type
+            Data type of the samples
+        tail_capacity: int or None
+            Number of samples kept in memory. If None, it is set to 60 s
+            of signal if fs is available or 65536 samples otherwise. If the
+            writer thread falls behind by more than this number of samples,
+            append waits until they are written.
+        fs: float or None
+            Nominal sample rate of the stream. It is only used to estimate
+            the tail capacity.
+        metadata: dict or None
+            Serializable information saved in the header (e.g., the LSL
+            stream info), so the recording can be recovered after a crash
+        """
+        if tail_capacity is None:
+            tail_capacity = int(60 * fs) if fs is not None and fs > 0 \
+                else 65536
+        self.n_cha = n_cha
+        self.dtype = np.dtype(dtype)
+        self.spill_dir = spill_dir
+        self.tail_capacity = max(int(tail_capacity), 1)
+        self.metadata = metadata
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+        self.write_queue = queue.Queue()
+        self.writer = None
+        self.files = None
+        self.n_samples = 0
+        self.n_flushed = 0
+        self.generation = 0
+        self.writer_error = None
+        self._data = np.empty((self.tail_capacity, n_cha), dtype=self.dtype)
+        self._timestamps = np.empty((self.tail_capacity,))
+        self._lsl_timestamps = np.empty((self.tail_capacity,))
+        os.makedirs(spill_dir, exist_ok=True)
+        with open(os.path.join(spill_dir, self.HEADER_FILE), 'w') as f:
+            json.dump({'n_cha': n_cha, 'dtype': self.dtype.str,
+                       'fs': fs, 'metadata': metadata}, f)
+        self.__open()
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def capacity(self):
+        return self.tail_capacity
+
+    def get_cursor(self):
+        """See SampleBuffer.get_cursor"""
+        with self.lock:
+            return self.generation, self.n_samples
+
+    @property
+    def data(self):
+        return self.get_views()[1]
+
+    @property
+    def timestamps(self):
+        return self.get_views()[0]
+
+    @property
+    def lsl_timestamps(self):
+        return self.get_views()[2]
+
+    def reset(self):
+        """Discards all the samples, truncating the spill files"""
+        self.__close_files()
+        with self.lock:
+            self.n_samples = 0
+            self.n_flushed = 0
+            self.generation += 1
+        self.__open()
+
+    def append(self, data, timestamps, lsl_timestamps):
+        """Appends a chunk of samples. The chunk is copied to the in-memory
+        tail and written to disk in the background.
+
+        Parameters
+        ----------
+        data: np.ndarray
+            Samples with shape [n_samples x n_cha]
+        timestamps: np.ndarray
+            Local timestamps with shape [n_samples]
+        lsl_timestamps: np.ndarray
+            LSL timestamps with shape [n_samples]
+        """
+        n = len(timestamps)
+        if len(data) != n or len(lsl_timestamps) != n:
+            raise ValueError('The chunk data and timestamps must have the '
+                             'same number of samples')
+        if self.writer_error is not None:
+            raise self.writer_error
+        # Chunks larger than the tail are appended in pieces
+        for i in range(0, n, self.tail_capacity):
+            j = min(i + self.tail_capacity, n)
+            self.__append(data[i:j], timestamps[i:j], lsl_timestamps[i:j])
+
+    def get_data(self):
+        """Returns a copy of the timestamps and samples"""
+        timestamps, data, _ = self.get_views()
+        return np.array(timestamps), np.array(data)
+
+    def get_lsl_timestamps(self):
+        """Returns a copy of the LSL timestamps"""
+        return np.array(self.get_views()[2])
+
+    def get_views(self, start=0, stop=None):
+        """Returns the timestamps, samples and LSL timestamps between indexes
+        start and stop (the stored samples by default), as read-only
+        arrays. Ranges that are completely on disk are returned as views of
+        the spill files (np.memmap) without copying them. Samples that are
+        only in the tail are copied, since the tail is overwritten.
+        """
+        with self.lock:
+            stop = self.n_samples if stop is None \
+                else min(stop, self.n_samples)
+            start = min(max(start, 0), stop)
+            n_flushed = self.n_flushed
+            parts = list()
+            if start < n_flushed and \
+                    start < self.n_samples - self.tail_capacity:
+                # Samples that are only on disk
+                disk_stop = min(stop, n_flushed)
+                parts.append(self.__read_files(start, disk_stop, n_flushed))
+                start = disk_stop
+            if start < stop:
+                parts.append(self.__read_tail(start, stop))
+            if len(parts) == 0:
+                parts.append(self.__read_tail(start, stop))
+        if len(parts) == 1:
+            views = parts[0]
+        else:
+            views = tuple(np.concatenate(arrays) for arrays in zip(*parts))
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def get_time_index(self, t):
+        """Returns the index of the first sample with timestamp greater than
+        or equal to t, using a binary search on the spill file and the
+        tail"""
+        with self.lock:
+            n_flushed = self.n_flushed
+            if n_flushed > 0:
+                timestamps = self.__read_files(0, n_flushed, n_flushed)[0]
+                idx = int(np.searchsorted(timestamps, t, side='left'))
+                if idx < n_flushed:
+                    return idx
+            timestamps = self.__read_tail(n_flushed, self.n_samples)[0]
+            return n_flushed + int(np.searchsorted(timestamps, t,
+                                                   side='left'))
+
+    def wait_flushed(self, timeout=None):
+        """Waits until all the samples have been written to disk. Returns
+        False if the timeout expires."""
+        with self.lock:
+            return self.flushed.wait_for(
+                lambda: self.n_flushed == self.n_samples or
+                self.writer_error is not None, timeout)
+
+    def close(self, delete_files=False):
+        """Writes the pending samples and closes the spill files. If
+        delete_files is True, the spill directory is removed (e.g., after
+        saving the recording)"""
+        self.__close_files()
+        if delete_files:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def __open(self):
+        self.files = [open(os.path.join(self.spill_dir, name), 'wb')
+                      for name in (self.DATA_FILE, self.TIMESTAMPS_FILE,
+                                   self.LSL_TIMESTAMPS_FILE)]
+        self.writer = threading.Thread(target=self.__write_files,
+                                       name='SpillingSampleBufferWriter',
+                                       daemon=True)
+        self.writer.start()
+
+    def __close_files(self):
+        if self.writer is None:
+            return
+        self.write_queue.put(None)
+        self.writer.join()
+        self.writer = None
+        for f in self.files:
+            f.close()
+
+    def __append(self, data, timestamps, lsl_timestamps):
+        n = len(timestamps)
+        if n == 0:
+            return
+        with self.lock:
+            # Wait until the samples that will be overwritten are on disk
+            self.flushed.wait_for(
+                lambda: self.n_samples + n - self.n_flushed <=
+                self.tail_capacity or self.writer_error is not None)
+            if self.writer_error is not None:
+                raise self.writer_error
+            start = self.n_samples
+            for i, j, k in self.__tail_slices(start, start + n):
+                self._data[i:j] = data[k:k + j - i]
+                self._timestamps[i:j] = timestamps[k:k + j - i]
+                self._lsl_timestamps[i:j] = lsl_timestamps[k:k + j - i]
+            self.n_samples += n
+        self.write_queue.put((start, start + n))
+
+    def __tail_slices(self, start, stop):
+        """Returns the slices (i, j) of the circular tail for the samples
+        between start and stop, with the offset k of each one in the
+        range"""
+        slices = list()
+        k = 0
+        while start < stop:
+            i = start % self.tail_capacity
+            j = min(i + stop - start, self.tail_capacity)
+            slices.append((i, j, k))
+            k += j - i
+            start += j - i
+        return slices
+
+    def __read_tail(self, start, stop):
+        slices = self.__tail_slices(start, stop)
+        if len(slices) == 0:
+            return (np.empty((0,)), np.empty((0, self.n_cha), self.dtype),
+                    np.empty((0,)))
+        if len(slices) == 1:
+            i, j, _ = slices[0]
+            return (self._timestamps[i:j].copy(), self._data[i:j].copy(),
+                    self._lsl_timestamps[i:j].copy())
+        return (np.concatenate([self._timestamps[i:j] for i, j, _ in slices]),
+                np.concatenate([self._data[i:j] for i, j, _ in slices]),
+                np.concatenate([self._lsl_timestamps[i:j]
+                                for i, j, _ in slices]))
+
+    def __read_files(self, start, stop, n_flushed):
+        data = np.memmap(os.path.join(self.spill_dir, self.DATA_FILE),
+                         dtype=self.dtype, mode='r',
+                         shape=(n_flushed, self.n_cha))
+        timestamps = np.memmap(
+            os.path.join(self.spill_dir, self.TIMESTAMPS_FILE),
+            dtype=np.float64, mode='r', shape=(n_flushed,))
+        lsl_timestamps = np.memmap(
+            os.path.join(self.spill_dir, self.LSL_TIMESTAMPS_FILE),
+            dtype=np.float64, mode='r', shape=(n_flushed,))
+        return (timestamps[start:stop], data[start:stop],
+                lsl_timestamps[start:stop])
+
+    def __write_files(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            try:
+                for i, j, _ in self.__tail_slices(*item):
+                    self.files[0].write(self._data[i:j].tobytes())
+                    self.files[1].write(self._timestamps[i:j].tobytes())
+                    self.files[2].write(self._lsl_timestamps[i:j].tobytes())
+                for f in self.files:
+                    f.flush()
+            except Exception as e:
+                with self.lock:
+                    self.writer_error = e
+                    self.flushed.notify_all()
+                break
+            with self.lock:
+                self.n_flushed = item[1]
+                self.flushed.notify_all()
+
+
+class SharedSampleBuffer:
+    """Growable sample store in shared memory, so the samples received by an
+    LSLStreamAppWorker in one process (e.g., the acquisition process of an
+    app, see resources.LSLAcquisitionProcess) can be read from others
+    without copying them through pipes.
+
+    It implements the same interface as SampleBuffer. Shared memory blocks
+    cannot grow, so the samples are stored in segments of segment_size
+    samples, each one in its own block, which are allocated by the writer
+    as the buffer grows. The stored samples never move. The blocks are
+    organized as follows:
+        - Header: int64 values. The first one is the number of stored
+          samples, the second one the number of allocated segments and the
+          third one the generation, which is increased by reset.
+        - Segment i, named <header name>_<i>: local timestamps and LSL
+          timestamps (float64 arrays with shape [segment_size]) and samples
+          (array with shape [segment_size x n_cha])
+
+    There must be only one writer, which appends and resets the samples,
+    but any number of readers. The reads return copies, and they are
+    repeated if the buffer is reset meanwhile, so no lock is needed
+    between processes. The creator of the buffer owns the blocks and
+    destroys them in close, so it must be closed after the writer has
+    finished.
+    """
+
+    HEADER_LEN = 8
+
+    def __init__(self, n_cha, dtype=float, segment_size=None, fs=None,
+                 name=None, writer=True):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels of the stream
+        dtype: numpy.dtype or type
+            Data type of the samples
+        segment_size: int or None
+            Number of samples of each segment. If None, it is set to 60 s
+            of signal if fs is available or 65536 samples otherwise.
+        fs: float or None
+            Nominal sample rate of the stream. It is only used to estimate
+            the segment size.
+        name: str or None
+            Name of the header block. If None, a new buffer is created.
+            Otherwise, the buffer is attached to an existing one.
+        writer: bool
+            If True, this instance appends the samples and allocates the
+            segments. There must be only one writer.
+        """
+        if segment_size is None:
+            segment_size = int(60 * fs) if fs is not None and fs > 0 \
+                else 65536
+        self.n_cha = int(n_cha)
+        self.dtype = np.dtype(dtype)
+        self.segment_size = max(int(segment_size), 1)
+        self.writer = writer
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=self.HEADER_LEN * 8)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.header = np.ndarray((self.HEADER_LEN,), dtype=np.int64,
+                                 buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = 0
+        # Segments attached by this instance: (block, timestamps, lsl
+        # timestamps, samples)
+        self.segments = list()
+
+    @classmethod
+    def from_descriptor(cls, descriptor, writer=False):
+        """Attaches to an existing buffer given its descriptor, as returned
+        by get_descriptor. Use this method to access the buffer from other
+        processes.
+        """
+        return cls(n_cha=descriptor['n_cha'],
+                   dtype=descriptor['dtype'],
+                   segment_size=descriptor['segment_size'],
+                   name=descriptor['name'],
+                   writer=writer)
+
+    def get_descriptor(self):
+        """Returns a picklable dict with the information needed to attach to
+        this buffer from other processes"""
+        return {
+            'name': self.name,
+            'n_cha': self.n_cha,
+            'dtype': self.dtype.str,
+            'segment_size': self.segment_size
+        }
+
+    def __len__(self):
+        return int(self.header[0])
+
+    @property
+    def capacity(self):
+        return int(self.header[1]) * self.segment_size
+
+    @property
+    def generation(self):
+        """Number of resets of the buffer"""
+        return int(self.header[2]) // 2
+
+    def get_cursor(self):
+        """See SampleBuffer.get_cursor. It waits while the buffer is being
+        reset, so the generation and the number of samples match."""
+        while True:
+            generation = int(self.header[2])
+            n_samples = len(self)
+            if generation % 2 == 0 and int(self.header[2]) == generation:
+                return generation // 2, n_samples
+
+    @property
+    def data(self):
+        return self.get_views()[1]
+
+    @property
+    def timestamps(self):
+        return self.get_views()[0]
+
+    @property
+    def lsl_timestamps(self):
+        return self.get_views()[2]
+
+    def reset(self):
+        """Discards all the samples. The segments are kept to store the new
+        samples. Only the writer can reset the buffer."""
+        self.__check_writer()
+        # The generation is odd while the buffer is being reset
+        self.header[2] += 1
+        self.header[0] = 0
+        self.header[2] += 1
+
+    def append(self, data, timestamps, lsl_timestamps):
+        """Appends a chunk of samples, keeping the 3 arrays in step. Only
+        the writer can append samples.
+
+        Parameters
+        ----------
+        data: np.ndarray
+            Samples with shape [n_samples x n_cha]
+        timestamps: np.ndarray
+            Local timestamps with shape [n_samples]
+        lsl_timestamps: np.ndarray
+            LSL timestamps with shape [n_samples]
+        """
+        self.__check_writer()
+        n = len(timestamps)
+        if len(data) != n or len(lsl_timestamps) != n:
+            raise ValueError('The chunk data and timestamps must have the '
+                             'same number of samples')
+        start = len(self)
+        for idx, seg_start, seg_stop, i, j in self.__segment_slices(
+                start, start + n):
+            if idx >= int(self.header[1]):
+                self.__create_segment(idx)
+            _, seg_times, seg_lsl_times, seg_data = self.__get_segment(idx)
+            seg_data[seg_start:seg_stop] = data[i:j]
+            seg_times[seg_start:seg_stop] = timestamps[i:j]
+            seg_lsl_times[seg_start:seg_stop] = lsl_timestamps[i:j]
+        # Publish the new samples once they have been copied
+        self.header[0] = start + n
+
+    def get_data(self):
+        """Returns a copy of the timestamps and samples"""
+        timestamps, data, _ = self.get_views()
+        return timestamps, data
+
+    def get_lsl_timestamps(self):
+        """Returns a copy of the LSL timestamps"""
+        return self.get_views()[2]
+
+    def get_views(self, start=0, stop=None):
+        """Returns the timestamps, samples and LSL timestamps between indexes
+        start and stop (the stored samples by default), as read-only
+        arrays. Unlike SampleBuffer, they are copies of the shared
+        segments, which are reused after a reset.
+        """
+        while True:
+            generation = int(self.header[2])
+            n_samples = len(self)
+            if generation % 2 == 1:
+                continue
+            stop_ = n_samples if stop is None else min(stop, n_samples)
+            start_ = min(max(start, 0), stop_)
+            views = (np.empty((stop_ - start_,)),
+                     np.empty((stop_ - start_, self.n_cha), dtype=self.dtype),
+                     np.empty((stop_ - start_,)))
+            for idx, seg_start, seg_stop, i, j in self.__segment_slices(
+                    start_, stop_):
+                _, seg_times, seg_lsl_times, seg_data = \
+                    self.__get_segment(idx)
+                views[0][i:j] = seg_times[seg_start:seg_stop]
+                views[1][i:j] = seg_data[seg_start:seg_stop]
+                views[2][i:j] = seg_lsl_times[seg_start:seg_stop]
+            # Repeat the read if the buffer has been reset meanwhile
+            if int(self.header[2]) == generation:
+                break
+        for view in views:
+            view.flags.writeable = False
+        return views
+
+    def get_time_index(self, t):
+        """Returns the index of the first sample with timestamp greater than
+        or equal to t, using a binary search in the first segment whose
+        last sample is not older than t"""
+        n_samples = len(self)
+        for idx in range(int(math.ceil(n_samples / self.segment_size))):
+            seg_n = min(n_samples - idx * self.segment_size,
+                        self.segment_size)
+            seg_times = self.__get_segment(idx)[1][:seg_n]
+            if seg_times[-1] >= t:
+                return idx * self.segment_size + int(
+                    np.searchsorted(seg_times, t, side='left'))
+        return n_samples
+
+    def close(self):
+        """Closes the access to the shared blocks. The owner also destroys
+        them, attaching first to the segments that have not been read by
+        this instance."""
+        if self.header is None:
+            return
+        if self.owner:
+            for idx in range(int(self.header[1])):
+                self.__get_segment(idx)
+        # Release the views before closing the blocks
+        blocks = [segment[0] for segment in self.segments]
+        self.segments = list()
+        self.header = None
+        for shm in blocks:
+            if self.owner:
+                shm.unlink()
+            shm.close()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __check_writer(self):
+        if not self.writer:
+            raise ValueError('Only the writer of the shared buffer can '
+                             'modify the samples')
+
+    def __segment_slices(self, start, stop):
+        """Splits the range [start, stop) by segments. Yields the index of
+        each segment, the slice in the segment and the slice in the
+        range"""
+        i = start
+        while i < stop:
+            idx = i // self.segment_size
+            seg_start = i - idx * self.segment_size
+            seg_stop = min(seg_start + stop - i, self.segment_size)
+            yield idx, seg_start, seg_stop, i - start, \
+                i - start + seg_stop - seg_start
+            i += seg_stop - seg_start
+
+    def __get_segment_size_bytes(self):
+        return self.segment_size * (16 + self.n_cha * self.dtype.itemsize)
+
+    def __create_segment(self, idx):
+        shm = shared_memory.SharedMemory(
+            name='%s_%i' % (self.name, idx), create=True,
+            size=self.__get_segment_size_bytes())
+        self.__add_segment(shm)
+        self.header[1] = idx + 1
+
+    def __get_segment(self, idx):
+        # Attach to the segments allocated by the writer
+        while len(self.segments) <= idx:
+            self.__add_segment(shared_memory.SharedMemory(
+                name='%s_%i' % (self.name, len(self.segments))))
+        return self.segments[idx]
+
+    def __add_segment(self, shm):
+        times_size = self.segment_size * 8
+        self.segments.append((
+            shm,
+            np.ndarray((self.segment_size,), dtype=np.float64,
+                       buffer=shm.buf, offset=0),
+            np.ndarray((self.segment_size,), dtype=np.float64,
+                       buffer=shm.buf, offset=times_size),
+            np.ndarray((self.segment_size, self.n_cha), dtype=self.dtype,
+                       buffer=shm.buf, offset=2 * times_size)))
+
+
+def load_spill_files(spill_dir):
+    """Loads the samples written by a SpillingSampleBuffer, e.g., to recover
+    a recording after a crash. Incomplete samples at the end of the files
+    are discarded.
+
+    Returns
+    -------
+    header: dict
+        Header of the spill files, with keys n_cha, dtype, fs and metadata
+    timestamps: np.ndarray
+        Local timestamps with shape [n_samples]
+    data: np.ndarray
+        Samples with shape [n_samples x n_cha]
+    lsl_timestamps: np.ndarray
+        LSL timestamps with shape [n_samples]
+    """
+    with open(os.path.join(spill_dir,
+                           SpillingSampleBuffer.HEADER_FILE), 'r') as f:
+        header = json.load(f)
+    dtype = np.dtype(header['dtype'])
+    n_cha = header['n_cha']
+    paths = [os.path.join(spill_dir, name) for name in (
+        SpillingSampleBuffer.DATA_FILE, SpillingSampleBuffer.TIMESTAMPS_FILE,
+        SpillingSampleBuffer.LSL_TIMESTAMPS_FILE)]
+    sample_sizes = [n_cha * dtype.itemsize, 8, 8]
+    n_samples = min(os.path.getsize(path) // size
+                    for path, size in zip(paths, sample_sizes))
+    data = np.fromfile(paths[0], dtype=dtype, count=n_samples * n_cha)
+    timestamps = np.fromfile(paths[1], dtype=np.float64, count=n_samples)
+    lsl_timestamps = np.fromfile(paths[2], dtype=np.float64, count=n_samples)
+    return header, timestamps, data.reshape((n_samples, n_cha)), \
+        lsl_timestamps
+
+
+def get_read_start(cursor, buffer_cursor):
+    """Returns the index of the first sample to read after a cursor held by
+    a reader (see resources.LSLStreamAppWorker.get_data_since).
+
+    Parameters
+    ----------
+    cursor: tuple or int
+        Cursor returned by the previous read, (generation, n_samples), or 0
+        to read from the start. For backward compatibility, the number of
+        samples already read is also accepted, but then a reset can only be
+        detected if the buffer holds fewer samples than the cursor.
+    buffer_cursor: tuple
+        Current cursor of the buffer (see SampleBuffer.get_cursor)
+
+    Returns
+    -------
+    start: int
+        Index of the first sample to read. It is 0 if the buffer has been
+        reset after the cursor was returned.
+    """
+    generation, n_samples = buffer_cursor
+    if isinstance(cursor, (tuple, list)):
+        cursor_generation, start = cursor
+        if cursor_generation != generation:
+            return 0
+    else:
+        start = cursor
+    return start if start <= n_samples else 0
+
+
+def has_new_data(cursor, buffer_cursor):
+    """Returns True if there are samples after a cursor held by a reader or
+    the buffer has been reset since it was returned (see get_read_start)"""
+    if isinstance(cursor, (tuple, list)):
+        return tuple(cursor) != tuple(buffer_cursor)
+    return cursor != buffer_cursor[1]
@@ -0,0 +1,261 @@
+# BUILT-IN MODULES
+import collections
+import math
+import time
+
+# Targets of ChunkController
+CHUNK_CONTROL_TARGETS = ('latency', 'cpu', 'rate')
+
+
+class ChunkController:
+    """Feedback controller that tunes the min_chunk_size, max_chunk_size and
+    timeout of an LSLStreamReceiver at runtime. It is updated after each
+    received chunk (see LSLStreamReceiver.get_chunk) and adapts the
+    parameters every adaptation_interval seconds according to a target:
+
+        - latency: min_chunk_size of 1 sample, so each chunk is returned as
+          soon as it arrives
+        - cpu: the smallest min_chunk_size that keeps the CPU usage of the
+          receiver thread (reception plus processing of each chunk, measured
+          with time.thread_time) below cpu_budget
+        - rate: min_chunk_size that gives a fixed update rate
+
+    A cpu_budget can also be given with the other targets, and then it
+    limits the update rate. The max_chunk_size follows the backlog of the
+    inlet (samples available after each pull): it grows immediately to
+    drain bursts and shrinks back gradually when the backlog disappears.
+    The timeout is sized from the longest waits for the chunks, so it adapts
+    to the arrival pattern of the outlet.
+
+    The decisions are kept in a history with the measurements that
+    motivated them (see get_decisions).
+    """
+
+    def __init__(self, target='latency', cpu_budget=None, update_rate=None,
+                 adaptation_interval=0.5, timeout_factor=3.0,
+                 min_timeout=0.5, max_chunk_time=1.0, history_size=256):
+        """Class constructor
+
+        Parameters
+        ----------
+        target: str {'latency', 'cpu', 'rate'}
+            Target of the controller
+        cpu_budget: float or None
+            Max fraction of a CPU core used by the receiver thread (e.g.,
+            0.05 for 5%). Required for target 'cpu'.
+        update_rate: float or None
+            Chunks per second. Required for target 'rate'.
+        adaptation_interval: float
+            Min time in seconds between adaptations of min_chunk_size,
+            which need measurements of several chunks
+        timeout_factor: float
+            The timeout is timeout_factor times the longest wait for a
+            chunk in the last adaptation interval
+        min_timeout: float
+            Min timeout in seconds, to avoid false timeouts with jittery
+            outlets
+        max_chunk_time: float
+            Max min_chunk_size in seconds of signal
+        history_size: int
+            Number of decisions kept in the history
+        """
+        if target not in CHUNK_CONTROL_TARGETS:
+            raise ValueError('Parameter target must be one of %s' %
+                             str(CHUNK_CONTROL_TARGETS))
+        if target == 'cpu' and (cpu_budget is None or cpu_budget <= 0):
+            raise ValueError('Target cpu requires a cpu_budget greater '
+                             'than 0')
+        if target == 'rate' and (update_rate is None or update_rate <= 0):
+            raise ValueError('Target rate requires an update_rate greater '
+                             'than 0')
+        self.target = target
+        self.cpu_budget = cpu_budget
+        self.update_rate = update_rate
+        self.adaptation_interval = adaptation_interval
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_chunk_time = max_chunk_time
+        self.decisions = collections.deque(maxlen=history_size)
+        self.fs = None
+        self.min_chunk_size = None
+        self.max_chunk_size = None
+        self.timeout = None
+
+    def reset(self, fs, min_chunk_size, max_chunk_size, timeout):
+        """Initializes the controller with the sample rate and the initial
+        parameters of the receiver.
+
+        Returns
+        -------
+        params: tuple
+            Initial min_chunk_size, max_chunk_size and timeout
+        """
+        self.fs = fs
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.timeout = timeout
+        self.decisions.clear()
+        self.__reset_window()
+        self.last_thread_time = None
+        self.last_adaptation = time.perf_counter()
+        if fs is not None and fs > 0:
+            if self.target == 'latency':
+                self.min_chunk_size = 1
+            elif self.target == 'rate':
+                self.min_chunk_size = self.__get_rate_chunk_size()
+            self.max_chunk_size = max(self.max_chunk_size,
+                                      2 * self.min_chunk_size)
+            self.__log_decision('init', None, None)
+        return self.min_chunk_size, self.max_chunk_size, self.timeout
+
+    def __reset_window(self):
+        self.n_chunks = 0
+        self.n_samples = 0
+        self.cpu_time = 0.0
+        self.max_backlog = 0
+        self.max_wait = 0.0
+
+    def __get_rate_chunk_size(self):
+        return max(int(round(self.fs / self.update_rate)), 1)
+
+    def update(self, n_samples, backlog, wait_time):
+        """Updates the controller with a received chunk. It must be called
+        from the receiver thread, since the CPU time is measured with
+        time.thread_time.
+
+        Parameters
+        ----------
+        n_samples: int
+            Number of samples of the chunk
+        backlog: int
+            Samples available in the inlet after the chunk was pulled
+        wait_time: float
+            Time in seconds spent in receiving the chunk
+
+        Returns
+        -------
+        params: tuple or None
+            New min_chunk_size, max_chunk_size and timeout, or None if they
+            have not changed
+        """
+        if self.fs is None or self.fs <= 0:
+            return None
+        # CPU time of the thread since the previous chunk, including the
+        # processing of the previous chunk by the caller
+        thread_time = time.thread_time()
+        if self.last_thread_time is not None:
+            self.cpu_time += thread_time - self.last_thread_time
+        self.last_thread_time = thread_time
+        self.n_chunks += 1
+        self.n_samples += n_samples
+        self.max_backlog = max(self.max_backlog, backlog)
+        self.max_wait = max(self.max_wait, wait_time)
+        # Drain bursts immediately
+        if backlog > self.max_chunk_size:
+            self.max_chunk_size = int(backlog)
+            self.timeout = max(self.timeout,
+                               1.5 * self.max_chunk_size / self.fs)
+            self.__log_decision('backlog', None, None)
+            return self.min_chunk_size, self.max_chunk_size, self.timeout
+        now = time.perf_counter()
+        elapsed = now - self.last_adaptation
+        if elapsed < self.adaptation_interval or self.n_chunks < 2:
+            return None
+        params = self.__adapt(elapsed)
+        self.last_adaptation = now
+        self.__reset_window()
+        return params
+
+    def __adapt(self, elapsed):
+        old_params = (self.min_chunk_size, self.max_chunk_size, self.timeout)
+        cpu_usage = self.cpu_time / elapsed
+        reasons = list()
+        # Min chunk size given by the target
+        if self.target == 'rate':
+            min_chunk_size = self.__get_rate_chunk_size()
+        else:
+            min_chunk_size = 1
+        if self.cpu_budget is not None:
+            # The cost of each chunk is mostly fixed, so the CPU usage is
+            # proportional to the update rate. The chunk size is scaled to
+            # use 80% of the budget, at most x2 smaller or x4 larger per
+            # adaptation. Within the budget, it is kept unless the usage is
+            # well below the budget.
+            scaled_chunk_size = min(max(
+                self.min_chunk_size * cpu_usage / (0.8 * self.cpu_budget),
+                self.min_chunk_size / 2), self.min_chunk_size * 4)
+            if cpu_usage > self.cpu_budget or \
+                    scaled_chunk_size < 0.8 * self.min_chunk_size:
+                budget_chunk_size = int(math.ceil(scaled_chunk_size))
+            else:
+                budget_chunk_size = self.min_chunk_size
+            if budget_chunk_size > min_chunk_size:
+                min_chunk_size = budget_chunk_size
+                reasons.append('cpu')
+        min_chunk_size = int(min(max(min_chunk_size, 1),
+                                 max(self.max_chunk_time * self.fs, 1)))
+        if min_chunk_size != self.min_chunk_size and 'cpu' not in reasons:
+            reasons.append('target')
+        # Max chunk size: enough to drain the backlog of the last interval
+        # in one pull, shrinking at most by half per adaptation
+        max_chunk_size = max(2 * min_chunk_size,
+                             int(1.5 * self.max_backlog) + min_chunk_size,
+                             self.max_chunk_size // 2)
+        if max_chunk_size < self.max_chunk_size:
+            reasons.append('shrink')
+        elif max_chunk_size > self.max_chunk_size:
+            reasons.append('backlog')
+        # Timeout: margin over the longest wait for a chunk and over the
+        # time needed to receive the chunks
+        timeout = max(self.min_timeout,
+                      self.timeout_factor * self.max_wait,
+                      1.5 * max_chunk_size / self.fs)
+        if abs(timeout - self.timeout) < 0.25 * self.timeout and \
+                timeout >= 1.5 * max_chunk_size / self.fs:
+            # Ignore small variations of the waits
+            timeout = self.timeout
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.timeout = timeout
+        params = (self.min_chunk_size, self.max_chunk_size, self.timeout)
+        if params == old_params:
+            return None
+        self.__log_decision(','.join(reasons) if reasons else 'timeout',
+                            cpu_usage, elapsed)
+        return params
+
+    def __log_decision(self, reason, cpu_usage, elapsed):
+        self.decisions.append({
+            'time': time.time(),
+            'reason': reason,
+            'min_chunk_size': self.min_chunk_size,
+            'max_chunk_size': self.max_chunk_size,
+            'timeout': self.timeout,
+            'cpu_usage': cpu_usage,
+            'chunk_rate': self.n_chunks / elapsed
+            if elapsed is not None else None,
+            'mean_chunk_size': self.n_samples / self.n_chunks
+            if self.n_chunks > 0 else None,
+            'max_backlog': self.max_backlog,
+            'max_wait': self.max_wait
+        })
+
+    def get_decisions(self):
+        """Returns the history of decisions, in chronological order. Each
+        decision is a dict with its time, the reasons (init, backlog, cpu,
+        target, shrink or timeout), the new parameters and the
+        measurements of the adaptation interval: CPU usage of the thread,
+        chunks per second, mean chunk size, max backlog and longest wait"""
+        return list(self.decisions)
+
+    def get_state(self):
+        """Returns a dict with the target and the current parameters"""
+        return {
+            'target': self.target,
+            'cpu_budget': self.cpu_budget,
+            'update_rate': self.update_rate,
+            'min_chunk_size': self.min_chunk_size,
+            'max_chunk_size': self.max_chunk_size,
+            'timeout': self.timeout,
+            'n_decisions': len(self.decisions)
+        }
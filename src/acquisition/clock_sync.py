@@ -0,0 +1,212 @@
+# BUILT-IN MODULES
+import threading as th
+import weakref
+
+# EXTERNAL MODULES
+import numpy as np
+import pylsl
+
+
+class ClockDriftModel:
+    """Online model of the offset between the clock of a remote LSL outlet
+    and the local LSL clock:
+
+        offset(t) = offset_0 + drift * (t - t_ref)
+
+    where t is the local LSL time. The parameters are fitted with recursive
+    least squares (RLS) with exponential forgetting, so the model can follow
+    slow changes of the drift. Measurements with residuals that are much
+    larger than the typical residual (e.g., due to network delays) are
+    discarded.
+    """
+
+    def __init__(self, forgetting_factor=0.995, outlier_threshold=4.0,
+                 min_residual_std=5e-5, n_warmup=5,
+                 max_consecutive_outliers=10):
+        """Class constructor
+
+        Parameters
+        ----------
+        forgetting_factor: float
+            RLS forgetting factor in (0, 1]. The effective memory of the
+            model is approximately 1 / (1 - forgetting_factor) measurements.
+        outlier_threshold: float
+            Measurements whose residual exceeds outlier_threshold times the
+            residual standard deviation are discarded.
+        min_residual_std: float
+            Lower bound in seconds of the residual standard deviation used to
+            detect outliers, to avoid discarding valid measurements when the
+            clocks are very stable.
+        n_warmup: int
+            Number of measurements used to estimate the initial residual
+            standard deviation. The outlier detection is enabled afterwards.
+        max_consecutive_outliers: int
+            If this number of consecutive measurements is discarded, the
+            next one is accepted anyway, so the model can follow abrupt
+            changes of the offset (e.g., clock resets).
+        """
+        self.forgetting_factor = forgetting_factor
+        self.outlier_threshold = outlier_threshold
+        self.min_residual_std = min_residual_std
+        self.n_warmup = n_warmup
+        self.max_consecutive_outliers = max_consecutive_outliers
+        self.t_ref = None
+        self.theta = np.zeros(2)
+        self.P = np.eye(2)
+        self.residual_std = None
+        self.warmup_residuals = list()
+        self.n_updates = 0
+        self.n_outliers = 0
+        self.n_consecutive_outliers = 0
+        self.last_measurement = None
+        self.last_residual = None
+
+    def update(self, t, offset):
+        """Updates the model with a new measurement.
+
+        Parameters
+        ----------
+        t: float
+            Local LSL time of the measurement
+        offset: float
+            Measured clock offset (e.g., StreamInlet.time_correction())
+
+        Returns
+        -------
+        accepted: bool
+            False if the measurement was discarded as an outlier
+        """
+        self.last_measurement = (t, offset)
+        if self.t_ref is None:
+            self.t_ref = t
+            self.theta = np.array([offset, 0.0])
+            self.P = np.diag([1.0, 1e-2])
+            self.n_updates = 1
+            self.last_residual = 0.0
+            return True
+        x = np.array([1.0, t - self.t_ref])
+        residual = float(offset - x @ self.theta)
+        self.last_residual = residual
+        # Outlier detection. The residual standard deviation is estimated
+        # robustly from the median of the first residuals, and then updated
+        # only with accepted measurements
+        if self.residual_std is None:
+            self.warmup_residuals.append(abs(residual))
+            if len(self.warmup_residuals) >= self.n_warmup:
+                self.residual_std = \
+                    1.4826 * float(np.median(self.warmup_residuals))
+        else:
+            res_std = max(self.residual_std, self.min_residual_std)
+            if abs(residual) > self.outlier_threshold * res_std and \
+                    self.n_consecutive_outliers < \
+                    self.max_consecutive_outliers:
+                self.n_outliers += 1
+                self.n_consecutive_outliers += 1
+                return False
+            self.residual_std = float(np.sqrt(
+                0.95 * self.residual_std ** 2 + 0.05 * residual ** 2))
+        self.n_consecutive_outliers = 0
+        # RLS update
+        lam = self.forgetting_factor
+        Px = self.P @ x
+        k = Px / (lam + x @ Px)
+        self.theta = self.theta + k * residual
+        self.P = (self.P - np.outer(k, Px)) / lam
+        self.n_updates += 1
+        return True
+
+    def predict(self, t):
+        """Returns the clock offset at local LSL time t"""
+        if self.t_ref is None:
+            return 0.0
+        return self.theta[0] + self.theta[1] * (t - self.t_ref)
+
+    def get_state(self):
+        """Returns a dict with the current state of the model"""
+        return {
+            't_ref': self.t_ref,
+            'offset': float(self.theta[0]),
+            'drift': float(self.theta[1]),
+            'residual_std': self.residual_std,
+            'n_updates': self.n_updates,
+            'n_outliers': self.n_outliers,
+            'last_measurement': self.last_measurement,
+            'last_residual': self.last_residual
+        }
+
+
+class ClockSynchronizer(th.Thread):
+    """Thread that measures the clock offset of an LSL inlet at a low rate
+    and keeps a ClockDriftModel updated. This avoids calling
+    StreamInlet.time_correction, which requires network round-trips,
+    on each received chunk: get_offset is a cheap evaluation of the model.
+
+    The thread holds a weak reference to the inlet and finishes when the
+    inlet is destroyed or stop is called.
+    """
+
+    def __init__(self, lsl_stream_inlet, interval=1.0, n_init=3,
+                 timeout=2.0, **model_kwargs):
+        """Class constructor. It takes n_init measurements synchronously,
+        so the model is ready to be used once the object is created.
+
+        Parameters
+        ----------
+        lsl_stream_inlet: pylsl.StreamInlet
+            LSL inlet
+        interval: float
+            Time in seconds between measurements in the background
+        n_init: int
+            Number of measurements taken in the constructor
+        timeout: float
+            Timeout in seconds of each measurement
+        model_kwargs: key-value arguments
+            Arguments passed to the constructor of ClockDriftModel
+        """
+        super().__init__(name='ClockSynchronizer', daemon=True)
+        self.inlet_ref = weakref.ref(lsl_stream_inlet)
+        self.interval = interval
+        self.timeout = timeout
+        self.model = ClockDriftModel(**model_kwargs)
+        self.lock = th.Lock()
+        self.stop_event = th.Event()
+        for _ in range(n_init):
+            self.measure()
+
+    def measure(self):
+        """Takes a measurement of the clock offset and updates the model.
+        Returns False if the measurement could not be taken or was
+        discarded."""
+        inlet = self.inlet_ref()
+        if inlet is None:
+            return False
+        try:
+            offset = inlet.time_correction(timeout=self.timeout)
+        except (TimeoutError, RuntimeError):
+            return False
+        t = pylsl.local_clock()
+        with self.lock:
+            return self.model.update(t, offset)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if self.inlet_ref() is None:
+                break
+            self.measure()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_offset(self, t=None):
+        """Returns the estimated clock offset at local LSL time t. If t is
+        None, the current time is used."""
+        if t is None:
+            t = pylsl.local_clock()
+        with self.lock:
+            return self.model.predict(t)
+
+    def get_state(self):
+        """Returns the state of the drift model to audit the synchronization
+        quality"""
+        with self.lock:
+            return self.model.get_state()
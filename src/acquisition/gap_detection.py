@@ -0,0 +1,210 @@
+# BUILT-IN MODULES
+import time
+
+# EXTERNAL MODULES
+import numpy as np
+
+
+class GapDetector:
+    """Detects sample loss and timestamp gaps in the chunks received from a
+    regular-rate stream, comparing the observed timestamps with the nominal
+    sample rate. The detection is vectorized over each chunk, including the
+    interval since the last sample of the previous chunk.
+
+    Timing jitter (e.g., outlets that timestamp the samples when they are
+    pushed) produces intervals longer than the sample period, which are
+    compensated by shorter ones since no samples are missing. Thus, the
+    lost samples are estimated from the expected and received samples
+    instead of adding up the long intervals, and an interval is only
+    considered a gap if it exceeds gap_factor periods plus the jitter,
+    estimated as the largest shortfall of an interval below the period.
+
+    It keeps the following counters:
+
+        - n_samples: number of received samples
+        - lost_samples: estimated number of lost samples, i.e., the
+          expected samples since the first one minus the received ones,
+          (t_last - t_first) * fs + 1 - n_samples, which is never negative
+        - n_gaps: number of gaps, i.e., intervals between consecutive
+          samples longer than gap_factor sample periods plus the jitter
+        - jitter: largest shortfall of an interval below the sample period
+          in seconds
+        - largest_gap: longest interval between consecutive samples in
+          seconds
+        - n_bursts: number of bursts, i.e., chunks with more than
+          burst_factor times the nominal chunk size, which are received
+          when the samples pile up (e.g., the network or the receiver
+          thread stalled)
+        - max_burst: number of samples of the largest burst
+
+    The gaps are also kept as annotations (onset, duration and number of
+    lost samples), which can be saved in the recordings.
+    """
+
+    def __init__(self, fs, chunk_size=1, gap_factor=1.5, burst_factor=4.0,
+                 warn_gap_time=0.1, warn_lost_ratio=0.01,
+                 warning_interval=5.0):
+        """Class constructor
+
+        Parameters
+        ----------
+        fs: float
+            Nominal sample rate of the stream. If it is 0 (irregular
+            stream), the detection is disabled.
+        chunk_size: int
+            Nominal number of samples of each chunk (e.g., min_chunk_size
+            of the receiver)
+        gap_factor: float
+            Intervals between consecutive samples longer than gap_factor
+            sample periods plus the jitter are considered gaps
+        burst_factor: float
+            Chunks with more than burst_factor times chunk_size samples are
+            considered bursts
+        warn_gap_time: float or None
+            A warning is raised for gaps longer than this time in seconds.
+            If None, these warnings are disabled.
+        warn_lost_ratio: float or None
+            A warning is raised if the ratio of lost samples exceeds this
+            value, once 1 s of signal has been received (the ratio is not
+            meaningful with few samples). If None, these warnings are
+            disabled.
+        warning_interval: float
+            Min time in seconds between warnings, to avoid flooding the log
+            when the machine is overloaded
+        """
+        self.fs = fs
+        self.enabled = fs is not None and fs > 0
+        self.chunk_size = max(chunk_size, 1)
+        self.gap_factor = gap_factor
+        self.burst_factor = burst_factor
+        self.warn_gap_time = warn_gap_time
+        self.warn_lost_ratio = warn_lost_ratio
+        self.warning_interval = warning_interval
+        self.reset()
+
+    def reset(self):
+        """Resets the counters and annotations"""
+        self.n_samples = 0
+        self.lost_samples = 0
+        self.n_gaps = 0
+        self.largest_gap = 0.0
+        self.n_bursts = 0
+        self.max_burst = 0
+        self.gap_onsets = list()
+        self.gap_durations = list()
+        self.gap_lost_samples = list()
+        self.first_lsl_time = None
+        self.last_lsl_time = None
+        self.last_time = None
+        self.jitter = 0.0
+        self.last_warning_time = None
+
+    def update(self, chunk_lsl_times, chunk_times=None):
+        """Analyzes the timestamps of a new chunk.
+
+        Parameters
+        ----------
+        chunk_lsl_times: np.ndarray
+            LSL timestamps of the chunk, used to detect the gaps
+        chunk_times: np.ndarray or None
+            Timestamps of the chunk in the time base of the recording (e.g.,
+            local timestamps), used for the onsets of the annotations. If
+            None, the LSL timestamps are used.
+
+        Returns
+        -------
+        warnings: list of str
+            Warning messages raised by this chunk, according to the
+            thresholds. Messages are discarded if the previous warning was
+            raised less than warning_interval seconds ago.
+        """
+        n = len(chunk_lsl_times)
+        if not self.enabled or n == 0:
+            return []
+        chunk_lsl_times = np.asarray(chunk_lsl_times, dtype=np.float64)
+        chunk_times = chunk_lsl_times if chunk_times is None \
+            else np.asarray(chunk_times, dtype=np.float64)
+        period = 1 / self.fs
+        warnings = list()
+        # Bursts
+        if n > self.burst_factor * self.chunk_size:
+            self.n_bursts += 1
+            self.max_burst = max(self.max_burst, n)
+        # Gaps
+        if self.first_lsl_time is None:
+            self.first_lsl_time = chunk_lsl_times[0]
+        if self.last_lsl_time is not None:
+            lsl_times = np.concatenate(([self.last_lsl_time],
+                                        chunk_lsl_times))
+            times = np.concatenate(([self.last_time], chunk_times))
+        else:
+            lsl_times, times = chunk_lsl_times, chunk_times
+        self.last_lsl_time = chunk_lsl_times[-1]
+        self.last_time = chunk_times[-1]
+        self.n_samples += n
+        # Expected minus received samples. The jitter of the first and last
+        # samples is averaged out as the recording grows.
+        self.lost_samples = max(int(round(
+            (self.last_lsl_time - self.first_lsl_time) * self.fs)) + 1 -
+            self.n_samples, 0)
+        if len(lsl_times) < 2:
+            return warnings
+        intervals = np.diff(lsl_times)
+        self.largest_gap = max(self.largest_gap, float(intervals.max()))
+        self.jitter = max(self.jitter, float(period - intervals.min()))
+        gap_idx = np.flatnonzero(
+            intervals > self.gap_factor * period + self.jitter)
+        if len(gap_idx) == 0:
+            return warnings
+        durations = intervals[gap_idx]
+        lost = np.maximum(np.round(durations * self.fs).astype(int) - 1, 0)
+        self.n_gaps += len(gap_idx)
+        self.gap_onsets += times[gap_idx].tolist()
+        self.gap_durations += durations.tolist()
+        self.gap_lost_samples += lost.tolist()
+        # Warnings
+        if self.warn_gap_time is not None and \
+                durations.max() > self.warn_gap_time:
+            warnings.append('Gap of %.1f ms (%i lost samples)' %
+                            (1000 * durations.max(), lost[durations.argmax()]))
+        lost_ratio = self.get_lost_ratio()
+        if self.warn_lost_ratio is not None and \
+                self.n_samples >= self.fs and \
+                lost_ratio > self.warn_lost_ratio:
+            warnings.append('%.2f%% of the samples lost (%i samples in %i '
+                            'gaps)' % (100 * lost_ratio, self.lost_samples,
+                                       self.n_gaps))
+        if len(warnings) > 0:
+            now = time.perf_counter()
+            if self.last_warning_time is not None and \
+                    now - self.last_warning_time < self.warning_interval:
+                return []
+            self.last_warning_time = now
+        return warnings
+
+    def get_lost_ratio(self):
+        """Returns the ratio of lost samples over the expected samples"""
+        n_expected = self.n_samples + self.lost_samples
+        return self.lost_samples / n_expected if n_expected > 0 else 0.0
+
+    def get_stats(self):
+        """Returns a dict with the counters of the detector"""
+        return {
+            'n_samples': self.n_samples,
+            'lost_samples': self.lost_samples,
+            'lost_ratio': self.get_lost_ratio(),
+            'n_gaps': self.n_gaps,
+            'largest_gap': self.largest_gap,
+            'jitter': self.jitter,
+            'n_bursts': self.n_bursts,
+            'max_burst': self.max_burst
+        }
+
+    def to_dict(self):
+        """Returns the counters and the gap annotations as a dict of
+        serializable values, which can be saved in recordings"""
+        gaps = self.get_stats()
+        gaps['onset'] = list(self.gap_onsets)
+        gaps['duration'] = list(self.gap_durations)
+        gaps['n_lost'] = list(self.gap_lost_samples)
+        return gaps
@@ -0,0 +1,186 @@
+# BUILT-IN MODULES
+import json
+import time
+
+# EXTERNAL MODULES
+import numpy as np
+
+# Stages of the real time plots pipeline, in order. The latency of each
+# stage is measured from the timestamp of the newest sample of the chunk:
+#   - pull: the chunk is returned by the receiver
+#   - preprocess: the chunk is filtered, re-referenced and downsampled
+#   - emit: the chunk reaches the gui thread
+#   - data_update: the buffers and the artists of the plot are updated
+#   - blit: the plot is blitted, so it is painted in the next refresh of
+#     the screen. This is the "glass-to-glass" latency.
+PLOT_LATENCY_STAGES = ('pull', 'preprocess', 'emit', 'data_update', 'blit')
+
+
+class LatencyHistogram:
+    """Histogram of latencies with log-spaced bins. The memory and the cost
+    of each update are constant, so it can be updated for every chunk during
+    long sessions, and the percentiles are estimated from the cumulative
+    counts with a relative error below the bin width (~5% with the default
+    resolution). Latencies out of [min_latency, max_latency] are counted in
+    the first and last bins, but the exact min and max are also kept.
+    """
+
+    def __init__(self, min_latency=1e-4, max_latency=10.0,
+                 bins_per_decade=50):
+        """Class constructor
+
+        Parameters
+        ----------
+        min_latency: float
+            Lower edge of the first bin in seconds
+        max_latency: float
+            Upper edge of the last bin in seconds
+        bins_per_decade: int
+            Number of bins per decade, which sets the resolution
+        """
+        if min_latency <= 0 or max_latency <= min_latency:
+            raise ValueError('The limits of the histogram must satisfy '
+                             '0 < min_latency < max_latency')
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.bins_per_decade = bins_per_decade
+        n_bins = int(np.ceil(
+            np.log10(max_latency / min_latency) * bins_per_decade))
+        self.edges = np.geomspace(min_latency, max_latency, n_bins + 1)
+        self.centers = np.sqrt(self.edges[:-1] * self.edges[1:])
+        self.reset()
+
+    def reset(self):
+        """Resets the counts"""
+        self.counts = np.zeros(len(self.centers), dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def update(self, latencies):
+        """Adds one latency or an array of latencies in seconds"""
+        latencies = np.atleast_1d(np.asarray(latencies, dtype=np.float64))
+        if len(latencies) == 0:
+            return
+        idx = np.searchsorted(self.edges, latencies, side='right') - 1
+        idx = np.clip(idx, 0, len(self.counts) - 1)
+        np.add.at(self.counts, idx, 1)
+        self.n += len(latencies)
+        self.total += float(latencies.sum())
+        l_min, l_max = float(latencies.min()), float(latencies.max())
+        self.min = l_min if self.min is None else min(self.min, l_min)
+        self.max = l_max if self.max is None else max(self.max, l_max)
+        self.last = float(latencies[-1])
+
+    def get_percentile(self, q):
+        """Returns the estimated percentile q (0-100) in seconds, or None
+        if the histogram is empty"""
+        if self.n == 0:
+            return None
+        cum_counts = np.cumsum(self.counts)
+        idx = int(np.searchsorted(cum_counts, q / 100 * self.n))
+        idx = min(idx, len(self.centers) - 1)
+        # Bin center, limited by the exact extremes
+        return float(min(max(self.centers[idx], self.min), self.max))
+
+    def get_stats(self, percentiles=(50, 95, 99)):
+        """Returns a dict with the number of latencies, the mean, min, max
+        and the percentiles (keys p50, p95, etc.) in seconds"""
+        stats = {
+            'n': self.n,
+            'mean': self.total / self.n if self.n > 0 else None,
+            'min': self.min,
+            'max': self.max,
+            'last': self.last
+        }
+        for q in percentiles:
+            stats['p%g' % q] = self.get_percentile(q)
+        return stats
+
+    def to_dict(self):
+        """Returns the stats and the non-empty bins (lower edge, upper edge
+        and count) as a dict of serializable values"""
+        hist = self.get_stats()
+        nonzero = np.flatnonzero(self.counts)
+        hist['bins'] = {
+            'lower_edge': self.edges[nonzero].tolist(),
+            'upper_edge': self.edges[nonzero + 1].tolist(),
+            'count': self.counts[nonzero].tolist()
+        }
+        return hist
+
+
+class PipelineLatency:
+    """Keeps a LatencyHistogram per stage of a processing pipeline (e.g.,
+    PLOT_LATENCY_STAGES). For each chunk, the pipeline records the time at
+    which it leaves each stage (time.time()), and the latency of the stage
+    is measured from the timestamp of the newest sample of the chunk, which
+    must be in the same time base (i.e., local timestamps of
+    LSLStreamReceiver). Thus, the latency of the last stage is the total
+    delay from the acquisition of the sample.
+    """
+
+    def __init__(self, stages=PLOT_LATENCY_STAGES, **kwargs):
+        """Class constructor
+
+        Parameters
+        ----------
+        stages: list of str
+            Names of the stages, in order
+        kwargs:
+            Parameters of the LatencyHistogram of each stage
+        """
+        self.stages = list(stages)
+        self.histograms = {stage: LatencyHistogram(**kwargs)
+                           for stage in self.stages}
+        self.start_time = None
+
+    def reset(self):
+        """Resets the histograms"""
+        for hist in self.histograms.values():
+            hist.reset()
+        self.start_time = None
+
+    def update(self, sample_time, stamps):
+        """Adds the latencies of a chunk.
+
+        Parameters
+        ----------
+        sample_time: float
+            Timestamp of the newest sample of the chunk
+        stamps: dict
+            Time at which the chunk left each stage. Missing stages (e.g.,
+            the plot was not visible, so it was not drawn) are skipped.
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        for stage, stamp in stamps.items():
+            if stamp is not None and stage in self.histograms:
+                self.histograms[stage].update(stamp - sample_time)
+
+    def get_glass_to_glass(self):
+        """Returns the LatencyHistogram of the last stage"""
+        return self.histograms[self.stages[-1]]
+
+    def get_stats(self, percentiles=(50, 95, 99)):
+        """Returns a dict with the stats of each stage (see
+        LatencyHistogram.get_stats)"""
+        return {stage: self.histograms[stage].get_stats(percentiles)
+                for stage in self.stages}
+
+    def to_dict(self):
+        """Returns the histograms of all stages as a dict of serializable
+        values"""
+        return {
+            'start_time': self.start_time,
+            'stages': self.stages,
+            'histograms': {stage: self.histograms[stage].to_dict()
+                           for stage in self.stages}
+        }
+
+    def save(self, path):
+        """Saves the histograms in a json file"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -0,0 +1,410 @@
+"""Synthetic LSL load generator for benchmarks and soak tests of MEDUSA
+Platform. It runs several local LSL outlets with realistic signals and
+configurable channel counts, sample rates, formats, chunk sizes, jitter,
+drops and bursts.
+
+Run this module from the src folder to start the outlets from the command
+line (use -h to see all the options):
+
+    python -m acquisition.load_generator --n-streams 4 --n-cha 256 --fs 10000
+
+Numeric options accept comma separated lists with the value of each stream
+(the last value is used for the remaining streams), e.g., --n-cha 256,8.
+"""
+
+# BUILT-IN MODULES
+import argparse
+import threading as th
+import time
+
+# EXTERNAL MODULES
+import numpy as np
+import pylsl
+
+# MEDUSA MODULES
+from acquisition import lsl_utils
+
+
+class SyntheticSignal:
+    """Generator of realistic synthetic signals. Each channel is the sum of:
+
+        - Gaussian noise
+        - A sinusoid with a random frequency in freq_range and random phase
+          (e.g., alpha rhythm)
+        - Line noise at line_freq
+        - An event related potential (ERP) every erp_interval seconds,
+          modeled as a gamma-like waveform that peaks erp_latency seconds
+          after each event
+
+    The samples are generated from their absolute index, so consecutive
+    chunks are continuous. Integer formats are scaled by 1/gain and
+    clipped to the range of the dtype.
+    """
+
+    def __init__(self, n_cha, fs, dtype=np.float32, noise_std=1.0,
+                 amplitude=10.0, freq_range=(8, 12), line_amplitude=2.0,
+                 line_freq=50.0, erp_amplitude=5.0, erp_interval=1.0,
+                 erp_latency=0.3, gain=0.1, seed=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels
+        fs: float
+            Sample rate
+        dtype: numpy.dtype or type
+            Data type of the samples
+        noise_std: float
+            Standard deviation of the Gaussian noise
+        amplitude: float
+            Amplitude of the sinusoid of each channel
+        freq_range: tuple
+            Range of the frequencies of the sinusoids
+        line_amplitude: float
+            Amplitude of the line noise. Use 0 to disable it.
+        line_freq: float
+            Frequency of the line noise
+        erp_amplitude: float
+            Amplitude of the ERPs. Use 0 to disable them.
+        erp_interval: float
+            Time in seconds between events
+        erp_latency: float
+            Latency in seconds of the peak of the ERPs
+        gain: float
+            Physical units per count of integer formats
+        seed: int or None
+            Seed of the random generator
+        """
+        self.n_cha = n_cha
+        self.fs = fs
+        self.dtype = np.dtype(dtype)
+        self.noise_std = noise_std
+        self.amplitude = amplitude
+        self.line_amplitude = line_amplitude
+        self.line_freq = line_freq
+        self.erp_amplitude = erp_amplitude
+        self.erp_interval = erp_interval
+        self.erp_latency = erp_latency
+        self.gain = gain
+        self.rng = np.random.default_rng(seed)
+        self.freqs = self.rng.uniform(freq_range[0], freq_range[1], n_cha)
+        self.phases = self.rng.uniform(0, 2 * np.pi, n_cha)
+        # ERP waveform of one event, and topography (weight per channel)
+        erp_t = np.arange(int(erp_interval * fs)) / fs
+        self.erp_waveform = erp_amplitude * \
+            (erp_t / erp_latency) ** 2 * np.exp(2 * (1 - erp_t / erp_latency))
+        self.erp_weights = self.rng.uniform(0.5, 1.0, n_cha)
+
+    def get_chunk(self, start, n_samples):
+        """Returns the samples with absolute indexes [start, start +
+        n_samples) as an array with shape [n_samples x n_cha] and the
+        dtype of the generator"""
+        k = np.arange(start, start + n_samples)
+        t = k / self.fs
+        chunk = self.rng.standard_normal((n_samples, self.n_cha))
+        if self.noise_std != 1:
+            chunk *= self.noise_std
+        chunk += self.amplitude * np.sin(
+            2 * np.pi * t[:, np.newaxis] * self.freqs + self.phases)
+        if self.line_amplitude != 0:
+            chunk += (self.line_amplitude *
+                      np.sin(2 * np.pi * self.line_freq * t))[:, np.newaxis]
+        if self.erp_amplitude != 0 and len(self.erp_waveform) > 0:
+            erp = self.erp_waveform[k % len(self.erp_waveform)]
+            chunk += erp[:, np.newaxis] * self.erp_weights
+        if np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            chunk = np.clip(np.round(chunk / self.gain), info.min, info.max)
+        return chunk.astype(self.dtype)
+
+
+class SyntheticOutlet(th.Thread):
+    """Thread that pushes a synthetic signal (see SyntheticSignal) through a
+    local LSL outlet at the nominal sample rate.
+
+    The chunks are generated as numpy arrays in the format of the stream and
+    pushed with push_chunk without list conversions. The timestamps follow
+    an ideal clock that starts with the outlet, as in devices with hardware
+    clocks, so the timing of the pushes does not affect them. To reproduce
+    problematic streams, the following patterns can be configured:
+
+        - push_jitter: random delay of each push
+        - timestamp_jitter: random error of each timestamp (the timestamps
+          are then passed per sample, which is slower)
+        - drop_rate: probability of dropping each chunk, which produces a
+          gap in the timestamps
+        - burst_rate and burst_size: probability of holding burst_size
+          chunks and pushing them at once
+    """
+
+    def __init__(self, name, n_cha=8, fs=256, channel_format='float32',
+                 chunk_size=None, stream_type='EEG', push_jitter=0.0,
+                 timestamp_jitter=0.0, drop_rate=0.0, burst_rate=0.0,
+                 burst_size=10, max_buffered=360, seed=None,
+                 **signal_kwargs):
+        """Class constructor
+
+        Parameters
+        ----------
+        name: str
+            Name of the LSL stream. The source id is derived from it.
+        n_cha: int
+            Number of channels
+        fs: float
+            Sample rate
+        channel_format: str
+            LSL channel format (e.g., float32, double64, int16, int32)
+        chunk_size: int or None
+            Samples per chunk. If None, chunks of 10 ms.
+        stream_type: str
+            Type of the LSL stream
+        push_jitter: float
+            Max random delay in seconds of each push
+        timestamp_jitter: float
+            Standard deviation in seconds of the error of each timestamp
+        drop_rate: float
+            Probability of dropping each chunk
+        burst_rate: float
+            Probability of starting a burst at each chunk
+        burst_size: int
+            Number of chunks pushed at once in each burst
+        max_buffered: float
+            Max seconds of data buffered by the outlet for each inlet
+        seed: int or None
+            Seed of the random generators
+        signal_kwargs: key-value arguments
+            Arguments of SyntheticSignal (e.g., line_freq)
+        """
+        super().__init__(name='%sOutlet' % name, daemon=True)
+        dtype = lsl_utils.get_lsl_channel_format_dtype(channel_format)
+        if dtype is None:
+            raise ValueError('Channel format %s is not numeric' %
+                             channel_format)
+        if fs <= 0:
+            raise ValueError('Parameter fs must be greater than 0')
+        self.stream_name = name
+        self.n_cha = n_cha
+        self.fs = fs
+        self.channel_format = channel_format
+        self.chunk_size = chunk_size if chunk_size is not None \
+            else max(int(0.01 * fs), 1)
+        self.push_jitter = push_jitter
+        self.timestamp_jitter = timestamp_jitter
+        self.drop_rate = drop_rate
+        self.burst_rate = burst_rate
+        self.burst_size = burst_size
+        self.rng = np.random.default_rng(seed)
+        self.signal = SyntheticSignal(n_cha, fs, dtype=dtype, seed=seed,
+                                      **signal_kwargs)
+        # LSL outlet
+        info = pylsl.StreamInfo(name=name, type=stream_type,
+                                channel_count=n_cha, nominal_srate=fs,
+                                channel_format=channel_format,
+                                source_id='%s-load-generator' % name)
+        info.desc().append_child_value('manufacturer', 'MEDUSA')
+        channels = info.desc().append_child('channels')
+        for i in range(n_cha):
+            channel = channels.append_child('channel')
+            channel.append_child_value('label', 'Ch%i' % i)
+            channel.append_child_value('units', 'uV')
+            channel.append_child_value('type', stream_type)
+            if np.issubdtype(np.dtype(dtype), np.integer):
+                channel.append_child_value('gain', str(self.signal.gain))
+        self.outlet = pylsl.StreamOutlet(info, chunk_size=self.chunk_size,
+                                         max_buffered=max_buffered)
+        # Stats
+        self.n_pushed = 0
+        self.n_dropped = 0
+        self.n_bursts = 0
+        self.max_lag = 0.0
+        self.stop_event = th.Event()
+
+    def run(self):
+        n_generated = 0
+        t_start = pylsl.local_clock()
+        held = list()
+        burst_left = 0
+        while not self.stop_event.is_set():
+            # Wait until the last sample of the next chunk is due
+            t_due = t_start + (n_generated + self.chunk_size) / self.fs
+            if self.push_jitter > 0:
+                t_due += self.rng.uniform(0, self.push_jitter)
+            wait_time = t_due - pylsl.local_clock()
+            if wait_time > 0:
+                self.stop_event.wait(wait_time)
+            else:
+                self.max_lag = max(self.max_lag, -wait_time)
+            chunk = self.signal.get_chunk(n_generated, self.chunk_size)
+            timestamp = t_start + (n_generated + self.chunk_size - 1) / \
+                self.fs
+            n_generated += self.chunk_size
+            # Drops
+            if self.drop_rate > 0 and self.rng.random() < self.drop_rate:
+                self.n_dropped += self.chunk_size
+                continue
+            # Bursts
+            if burst_left == 0 and self.burst_rate > 0 and \
+                    self.rng.random() < self.burst_rate:
+                burst_left = self.burst_size
+                self.n_bursts += 1
+            if burst_left > 0:
+                held.append((chunk, timestamp))
+                burst_left -= 1
+                if burst_left > 0:
+                    continue
+                for held_chunk, held_timestamp in held:
+                    self.__push(held_chunk, held_timestamp)
+                held = list()
+                continue
+            self.__push(chunk, timestamp)
+
+    def __push(self, chunk, timestamp):
+        if self.timestamp_jitter > 0:
+            timestamps = timestamp - \
+                np.arange(len(chunk) - 1, -1, -1) / self.fs + \
+                self.rng.normal(0, self.timestamp_jitter, len(chunk))
+            self.outlet.push_chunk(chunk, timestamps.tolist())
+        else:
+            self.outlet.push_chunk(chunk, timestamp)
+        self.n_pushed += len(chunk)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        """Returns a dict with the number of pushed and dropped samples, the
+        number of bursts and the max delay of the pushes in seconds"""
+        return {
+            'name': self.stream_name,
+            'n_pushed': self.n_pushed,
+            'n_dropped': self.n_dropped,
+            'n_bursts': self.n_bursts,
+            'max_lag': self.max_lag
+        }
+
+
+class LoadGenerator:
+    """Runs several SyntheticOutlets. Use it as a context manager to stop
+    the outlets automatically::
+
+        with LoadGenerator(n_streams=4, n_cha=256, fs=10000) as generator:
+            ...
+    """
+
+    def __init__(self, n_streams=1, name='MedusaLoad', **outlet_kwargs):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_streams: int
+            Number of outlets. Their names are name_0, name_1, etc.
+        name: str
+            Prefix of the names of the outlets
+        outlet_kwargs: key-value arguments
+            Arguments of SyntheticOutlet. Values given as lists are
+            assigned to the outlets in order, repeating the last value if
+            the list is shorter than n_streams. If a seed is given, the
+            seed of each outlet is seed + its index.
+        """
+        self.outlets = list()
+        for i in range(n_streams):
+            kwargs = {key: value[min(i, len(value) - 1)]
+                      if isinstance(value, list) else value
+                      for key, value in outlet_kwargs.items()}
+            if kwargs.get('seed', None) is not None:
+                kwargs['seed'] += i
+            self.outlets.append(SyntheticOutlet('%s_%i' % (name, i),
+                                                **kwargs))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        for outlet in self.outlets:
+            outlet.start()
+
+    def stop(self):
+        for outlet in self.outlets:
+            outlet.stop()
+        for outlet in self.outlets:
+            if outlet.is_alive():
+                outlet.join()
+
+    def get_stats(self):
+        """Returns the stats of each outlet (see SyntheticOutlet.get_stats)"""
+        return [outlet.get_stats() for outlet in self.outlets]
+
+
+def parse_args(argv=None):
+    def values(cast):
+        return lambda s: [cast(v) for v in s.split(',')]
+    parser = argparse.ArgumentParser(
+        description='Synthetic LSL load generator of MEDUSA Platform')
+    parser.add_argument('--n-streams', type=int, default=1)
+    parser.add_argument('--name', default='MedusaLoad',
+                        help='prefix of the stream names')
+    parser.add_argument('--type', dest='stream_type', default='EEG')
+    parser.add_argument('--n-cha', type=values(int), default=[8])
+    parser.add_argument('--fs', type=values(float), default=[256])
+    parser.add_argument('--format', dest='channel_format',
+                        type=values(str), default=['float32'],
+                        help='float32, double64, int8, int16, int32 or '
+                             'int64')
+    parser.add_argument('--chunk-size', type=values(int), default=None,
+                        help='samples per chunk (10 ms by default)')
+    parser.add_argument('--push-jitter', type=values(float), default=[0.0],
+                        help='max random delay of each push in s')
+    parser.add_argument('--timestamp-jitter', type=values(float),
+                        default=[0.0],
+                        help='std of the error of each timestamp in s')
+    parser.add_argument('--drop-rate', type=values(float), default=[0.0],
+                        help='probability of dropping each chunk')
+    parser.add_argument('--burst-rate', type=values(float), default=[0.0],
+                        help='probability of starting a burst at each chunk')
+    parser.add_argument('--burst-size', type=values(int), default=[10],
+                        help='chunks pushed at once in each burst')
+    parser.add_argument('--line-freq', type=values(float), default=[50.0])
+    parser.add_argument('--erp-interval', type=values(float), default=[1.0],
+                        help='time between ERPs in s')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--duration', type=float, default=0,
+                        help='duration in s (0 to run until Ctrl+C)')
+    parser.add_argument('--stats-interval', type=float, default=5,
+                        help='time between stats prints in s')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = vars(parse_args(argv))
+    n_streams = args.pop('n_streams')
+    name = args.pop('name')
+    duration = args.pop('duration')
+    stats_interval = args.pop('stats_interval')
+    if args['chunk_size'] is None:
+        args.pop('chunk_size')
+    generator = LoadGenerator(n_streams=n_streams, name=name, **args)
+    print('Streaming %i outlets. Press Ctrl+C to finish...' % n_streams)
+    t_start = time.time()
+    try:
+        with generator:
+            while duration <= 0 or time.time() - t_start < duration:
+                time.sleep(stats_interval if duration <= 0 else max(min(
+                    stats_interval, duration - (time.time() - t_start)), 0))
+                for stats in generator.get_stats():
+                    print('%s: %i samples pushed, %i dropped, %i bursts, '
+                          'max lag %.1f ms' % (
+                              stats['name'], stats['n_pushed'],
+                              stats['n_dropped'], stats['n_bursts'],
+                              1000 * stats['max_lag']))
+    except KeyboardInterrupt:
+        pass
+    print('Load generator finished')
+
+
+if __name__ == '__main__':
+    main()
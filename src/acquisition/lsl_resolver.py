@@ -0,0 +1,225 @@
+# BUILT-IN MODULES
+import threading as th
+import time
+
+# EXTERNAL MODULES
+import pylsl
+
+# Getters of the properties that can be used to find pylsl.StreamInfo objects
+STREAM_INFO_PROPERTIES = {
+    'name': lambda s: s.name(),
+    'type': lambda s: s.type(),
+    'source_id': lambda s: s.source_id(),
+    'uid': lambda s: s.uid(),
+    'channel_count': lambda s: s.channel_count(),
+    'nominal_srate': lambda s: s.nominal_srate(),
+    'hostname': lambda s: s.hostname(),
+}
+
+# Getters of the properties that can be used to find LSLStreamWrapper objects
+LSL_STREAM_WRAPPER_PROPERTIES = {
+    'medusa_uid': lambda s: s.medusa_uid,
+    'name': lambda s: s.lsl_name,
+    'type': lambda s: s.lsl_type,
+    'source_id': lambda s: s.lsl_source_id,
+    'uid': lambda s: s.lsl_uid,
+    'channel_count': lambda s: s.lsl_n_cha,
+    'nominal_srate': lambda s: s.fs,
+    'hostname': lambda s: s.hostname,
+}
+
+
+class StreamIndex:
+    """Index of LSL streams for fast lookups by property.
+
+    The streams are indexed by each single property and by the composite
+    key (name, type, hostname). Queries take the candidates of the most
+    selective key given in the query (uid, source_id, (name, type,
+    hostname), or any other property) with a dict lookup, and check the
+    rest of the properties only on these candidates.
+    """
+
+    # Keys used to select the candidates of a query, in order of preference
+    COMPOSITE_KEYS = [('uid',), ('source_id',), ('name', 'type', 'hostname')]
+
+    def __init__(self, streams, properties=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        streams: list
+            Streams to index (e.g., pylsl.StreamInfo or LSLStreamWrapper)
+        properties: dict
+            Dict with the getters of each property of the streams. By
+            default, STREAM_INFO_PROPERTIES.
+        """
+        self.properties = properties if properties is not None \
+            else STREAM_INFO_PROPERTIES
+        self.streams = list(streams)
+        self.index = dict()
+        keys = [k for k in self.COMPOSITE_KEYS
+                if all(p in self.properties for p in k)]
+        keys += [(p,) for p in self.properties if (p,) not in keys]
+        self.keys = keys
+        for key in keys:
+            self.index[key] = dict()
+        for stream in self.streams:
+            values = {p: getter(stream)
+                      for p, getter in self.properties.items()}
+            for key in keys:
+                self.index[key].setdefault(
+                    tuple(values[p] for p in key), list()).append(stream)
+
+    def __len__(self):
+        return len(self.streams)
+
+    def query(self, **kwargs):
+        """Returns the list of streams that match all the given properties
+
+        Parameters
+        ----------
+        kwargs: key-value arguments
+            Key-value arguments specifying the name and value of the
+            properties that the streams must match
+        """
+        for key in kwargs:
+            if key not in self.properties:
+                raise ValueError('Property %s not available.' % key)
+        if len(kwargs) == 0:
+            return list(self.streams)
+        # Candidates from the most selective key
+        for key in self.keys:
+            if all(p in kwargs for p in key):
+                candidates = self.index[key].get(
+                    tuple(kwargs[p] for p in key), list())
+                break
+        # Check the rest of properties
+        return [s for s in candidates
+                if all(self.properties[p](s) == v for p, v in kwargs.items())]
+
+
+class LSLStreamResolver(th.Thread):
+    """Resolves the available LSL streams continuously in the background
+    using pylsl.ContinuousResolver, keeping a StreamIndex of the results.
+    Queries are answered from the last index without waiting for the
+    network. Use get_resolver to get the shared instance.
+
+    The resolver is started by the process that owns it (i.e., the main
+    window). Other processes, such as the apps, do not start their own
+    resolver, since a cold resolver would delay their queries instead of
+    speeding them up (see lsl_utils.get_lsl_streams).
+    """
+
+    def __init__(self, interval=0.5, forget_after=5.0, warmup_time=1.0):
+        """Class constructor
+
+        Parameters
+        ----------
+        interval: float
+            Time in seconds between updates of the index
+        forget_after: float
+            Streams that have not been seen for this time in seconds are
+            removed from the results
+        warmup_time: float
+            Time in seconds since the start of the resolver after which the
+            results are considered complete. Before, queries are not
+            answered from the index, since some streams may be missing.
+        """
+        super().__init__(name='LSLStreamResolver', daemon=True)
+        self.interval = interval
+        self.warmup_time = warmup_time
+        self.resolver = pylsl.ContinuousResolver(forget_after=forget_after)
+        self.stream_index = StreamIndex([])
+        self.ready_event = th.Event()
+        self.stop_event = th.Event()
+
+    def run(self):
+        start = time.time()
+        while not self.stop_event.is_set():
+            self.update()
+            if time.time() - start >= self.warmup_time:
+                self.ready_event.set()
+            self.stop_event.wait(min(self.interval, self.warmup_time)
+                                 if not self.ready_event.is_set()
+                                 else self.interval)
+
+    def update(self):
+        """Updates the index with the current results of the resolver"""
+        # The index is replaced atomically, so queries from other threads
+        # always see a consistent index
+        self.stream_index = StreamIndex(self.resolver.results())
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_streams(self, wait_time=0.1, **kwargs):
+        """Returns the indexed streams that match the given properties, or
+        None if the resolver has not finished the warmup.
+
+        Parameters
+        ----------
+        wait_time: float
+            Max time to wait for the end of the warmup
+        kwargs: key-value arguments
+            Properties that the streams must match (see
+            STREAM_INFO_PROPERTIES)
+        """
+        if not self.ready_event.wait(wait_time):
+            return None
+        return self.stream_index.query(**kwargs)
+
+
+_resolver = None
+_resolver_lock = th.Lock()
+
+
+def get_resolver(start=True):
+    """Returns the shared LSLStreamResolver of this process.
+
+    Parameters
+    ----------
+    start: bool
+        If True, the resolver is created and started if it is not running.
+        If False, None is returned if it is not running.
+    """
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None or not _resolver.is_alive():
+            if not start:
+                return None
+            _resolver = LSLStreamResolver()
+            _resolver.start()
+        return _resolver
+
+
+def is_stream_available(stream_info, timeout=0.2):
+    """Checks that the outlet of a resolved stream is still available by
+    opening an inlet and requesting its info. The results of the resolver
+    can include outlets that have disappeared in the last seconds (see
+    parameter forget_after of LSLStreamResolver).
+
+    Parameters
+    ----------
+    stream_info: pylsl.StreamInfo
+        Resolved stream
+    timeout: float
+        Max time in seconds to wait for the outlet
+    """
+    inlet = pylsl.StreamInlet(stream_info)
+    try:
+        inlet.info(timeout)
+        return True
+    except (pylsl.util.TimeoutError, pylsl.util.LostError):
+        return False
+    finally:
+        inlet.close_stream()
+
+
+def stop_resolver():
+    """Stops the shared LSLStreamResolver, if it is running"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is not None:
+            _resolver.stop()
+            _resolver = None
+
@@ -1,6 +1,10 @@
 # BUILT-IN MODULES
 import time, socket
 import warnings
+import hashlib
+import threading
+import types
+import xml.etree.ElementTree as et
 
 import numpy as np
 
@@ -12,9 +16,34 @@ from medusa import meeg
 # MEDUSA MODULES
 import exceptions
 import utils
+from acquisition import clock_sync, buffers, lsl_resolver
 
+# Numpy equivalents of the numeric LSL channel formats
+LSL_CHANNEL_FORMAT_DTYPES = {
+    pylsl.cf_float32: np.float32,
+    pylsl.cf_double64: np.float64,
+    pylsl.cf_int8: np.int8,
+    pylsl.cf_int16: np.int16,
+    pylsl.cf_int32: np.int32,
+    pylsl.cf_int64: np.int64,
+}
+LSL_CHANNEL_FORMAT_NAMES_DTYPES = {
+    'float32': np.float32,
+    'double64': np.float64,
+    'int8': np.int8,
+    'int16': np.int16,
+    'int32': np.int32,
+    'int64': np.int64,
+}
 
-def get_lsl_streams(wait_time=0.1, force_one_stream=False, **kwargs):
+# Cache of parsed LSL stream descriptions (see parse_lsl_stream_description)
+LSL_DESCRIPTION_CACHE_SIZE = 64
+_lsl_description_cache = dict()
+_lsl_description_cache_lock = threading.Lock()
+
+
+def get_lsl_streams(wait_time=0.1, force_one_stream=False, use_cache=True,
+                    **kwargs):
     """
     This function resolves the LSL streams matching the parameter
     stream_property given a property.
@@ -26,47 +55,32 @@ def get_lsl_streams(wait_time=0.1, force_one_stream=False, **kwargs):
     force_one_stream: bool
         Only returns one stream. If more streams are found for the given
         properties, an error is triggered.
+    use_cache: bool
+        If True and the background resolver is running in this process
+        (see lsl_resolver.get_resolver), the streams are looked up in its
+        index, which answers without waiting for the network. The matches
+        are checked with lsl_resolver.is_stream_available, since the index
+        can include outlets that have just disappeared. The streams are
+        resolved again if there are no valid matches (e.g., an outlet that
+        has just been created) or the resolver has just been started.
+        Processes that do not run the resolver (e.g., the apps) always
+        resolve the streams.
     kwargs: key-value arguments
         Key-value arguments specifying  the name and value of the property
         that the selected streams must match. Available LSL properties: name,
         type, source_id, uid, channel_count, nominal_srate, hostname
     """
-    # Resolve EEG LSL streams
-    streams = pylsl.resolve_streams(wait_time)
-    match_streams = []
-    if kwargs is None:
-        match_streams = streams
-    else:
-        for stream in streams:
-            check_all_properties = []
-            for key, value in kwargs.items():
-                check = False
-                if key == 'name':
-                    if value == stream.name():
-                        check = True
-                elif key == 'type':
-                    if value == stream.type():
-                        check = True
-                elif key == 'source_id':
-                    if value == stream.source_id():
-                        check = True
-                elif key == 'uid':
-                    if value == stream.uid():
-                        check = True
-                elif key == 'channel_count':
-                    if value == stream.channel_count():
-                        check = True
-                elif key == 'nominal_srate':
-                    if value == stream.nominal_srate():
-                        check = True
-                elif key == 'hostname':
-                    if value == stream.hostname():
-                        check = True
-                else:
-                    raise ValueError('Property %s not available.' % key)
-                check_all_properties.append(check)
-            if all(check_all_properties):
-                match_streams.append(stream)
+    match_streams = None
+    resolver = lsl_resolver.get_resolver(start=False) if use_cache else None
+    if resolver is not None:
+        match_streams = resolver.get_streams(wait_time, **kwargs)
+        if match_streams and not all(
+                lsl_resolver.is_stream_available(s) for s in match_streams):
+            match_streams = None
+    if not match_streams:
+        # Resolve LSL streams
+        streams = pylsl.resolve_streams(wait_time)
+        match_streams = lsl_resolver.StreamIndex(streams).query(**kwargs)
     # Check that at least one stream has been found
     if len(match_streams) == 0:
         raise exceptions.LSLStreamNotFound(kwargs)
@@ -94,55 +108,30 @@ def find_lsl_stream(lsl_streams, force_one_stream, **kwargs):
 
     Parameters
     ----------
-    lsl_streams: list of LSLStreamWrapper
-        List of LSLStreamWrapper. For instance, the working_lsl_streams list
+    lsl_streams: list of LSLStreamWrapper or lsl_resolver.StreamIndex
+        List of LSLStreamWrapper. For instance, the working_lsl_streams list.
+        To find several streams in the same list, pass an index created with
+        lsl_resolver.StreamIndex(lsl_streams,
+        lsl_resolver.LSL_STREAM_WRAPPER_PROPERTIES), so each query is a
+        dict lookup.
     force_one_stream: bool
         Only returns one stream. If more streams are found for the given
         properties, an error is triggered.
     kwargs: key-value arguments
         Key-value arguments specifying  the name and value of the property
-        that the selected streams must match. Available LSL properties: name,
-        type, source_id, uid, channel_count, nominal_srate, hostname
+        that the selected streams must match. Available LSL properties:
+        medusa_uid, name, type, source_id, uid, channel_count,
+        nominal_srate, hostname
 
     """
-    match_streams = []
-    for stream in lsl_streams:
-        check_all_properties = []
-        for key, value in kwargs.items():
-            check = False
-            if key == 'medusa_uid':
-                if value == stream.medusa_uid:
-                    check = True
-            elif key == 'name':
-                if value == stream.lsl_name:
-                    check = True
-            elif key == 'type':
-                if value == stream.lsl_type:
-                    check = True
-            elif key == 'source_id':
-                if value == stream.lsl_source_id:
-                    check = True
-            elif key == 'uid':
-                if value == stream.lsl_uid:
-                    check = True
-            elif key == 'channel_count':
-                if value == stream.lsl_n_cha:
-                    check = True
-            elif key == 'nominal_srate':
-                if value == stream.fs:
-                    check = True
-            elif key == 'hostname':
-                if value == stream.hostname:
-                    check = True
-            else:
-                raise ValueError('Property %s not available.' % key)
-            check_all_properties.append(check)
-        if all(check_all_properties):
-            match_streams.append(stream)
+    if not isinstance(lsl_streams, lsl_resolver.StreamIndex):
+        lsl_streams = lsl_resolver.StreamIndex(
+            lsl_streams, lsl_resolver.LSL_STREAM_WRAPPER_PROPERTIES)
+    match_streams = lsl_streams.query(**kwargs)
     # Check that at least one stream has been found
     if len(match_streams) == 0:
         raise exceptions.LSLStreamNotFound(kwargs)
-        # Return
+    # Return
     if force_one_stream:
         if len(match_streams) > 1:
             raise exceptions.UnspecificLSLStreamInfo(kwargs)
@@ -151,6 +140,205 @@ def find_lsl_stream(lsl_streams, force_one_stream, **kwargs):
         return match_streams
 
 
+def parse_lsl_stream_description(xml_str, n_cha):
+    """Parses the XML description of an LSL stream (StreamInfo.as_xml),
+    applying the corrections for manufacturers that do not follow the
+    standard structure. The results are cached using a hash of the XML, so
+    each description is parsed only once.
+
+    Parameters
+    ----------
+    xml_str: str
+        XML description of the stream
+    n_cha: int
+        Number of channels of the stream. It is used if the description
+        does not contain the channels.
+
+    Returns
+    -------
+    xml_str: str
+        Corrected XML description
+    json_format: types.MappingProxyType
+        Description in json format (see utils.xml_string_to_json). It is
+        read-only, since it is shared: dicts are returned as
+        types.MappingProxyType and lists as tuples. Use thaw_json to get a
+        mutable copy.
+    """
+    key = (hashlib.sha1(xml_str.encode('utf-8')).hexdigest(), n_cha)
+    with _lsl_description_cache_lock:
+        if key in _lsl_description_cache:
+            return _lsl_description_cache[key]
+    # Parse the description
+    root = et.fromstring(xml_str)
+    desc = root.find('desc')
+    # Custom corrections for different manufacturers
+    if desc is not None and xml_str.find('NeuroElectrics') > 0 and \
+            desc.find('channels') is None:
+        """Neuroelectrics uses the following structure:
+
+        <desc>
+            <manufacturer>NeuroElectrics</manufacturer>
+            <channel>
+                <name>Ch1</name>
+                <unit>microvolts</unit>
+                <type>EEG</type>
+            </channel>
+            .
+            .
+            .
+            <channel>
+                <name>Ch32</name>
+                <unit>microvolts</unit>
+                <type>EEG</type>
+            </channel>
+        </desc>
+        """
+        channel_elements = desc.findall('channel')
+        channels = et.Element('channels')
+        if len(channel_elements) > 0:
+            # Correct structure introducing channels element to wrap the
+            # channels. The children of desc are rebuilt in one pass, with
+            # channels at the position of the first channel.
+            channels.extend(channel_elements)
+            children = list()
+            for child in desc:
+                if child.tag != 'channel':
+                    children.append(child)
+                elif child is channel_elements[0]:
+                    children.append(channels)
+            desc[:] = children
+        else:
+            # Some NeuroElectrics streams do not have channels in LSL desc
+            desc.append(channels)
+            for i in range(n_cha):
+                channel = et.SubElement(channels, 'channel')
+                et.SubElement(channel, 'name').text = 'Ch%i' % i
+                et.SubElement(channel, 'unit').text = 'None'
+                et.SubElement(channel, 'type').text = 'None'
+        et.indent(root, space='\t')
+        xml_str = et.tostring(root, encoding='unicode')
+    json_format = utils.xml_element_to_json(root)
+    # Check json description
+    if 'desc' not in json_format or json_format['desc'] == '':
+        # This field desc must be a dict
+        json_format['desc'] = dict()
+    if 'channels' not in json_format['desc']:
+        json_format['desc']['channels'] = list()
+        for i in range(n_cha):
+            json_format['desc']['channels'].append({'name': 'Ch%i' % i})
+    channels = json_format['desc']['channels']
+    if not isinstance(channels, list):
+        # If there is only one channel, it has to be converted to list
+        json_format['desc']['channels'] = list(channels.values())
+    result = (xml_str, freeze_json(json_format))
+    with _lsl_description_cache_lock:
+        if len(_lsl_description_cache) >= LSL_DESCRIPTION_CACHE_SIZE:
+            # Discard the oldest description
+            _lsl_description_cache.pop(next(iter(_lsl_description_cache)))
+        _lsl_description_cache[key] = result
+    return result
+
+
+def freeze_json(obj):
+    """Returns a read-only copy of a json object: dicts are converted to
+    types.MappingProxyType and lists to tuples"""
+    if isinstance(obj, dict):
+        return types.MappingProxyType(
+            {k: freeze_json(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze_json(v) for v in obj)
+    return obj
+
+
+def thaw_json(obj):
+    """Returns a mutable copy of a json object frozen with freeze_json"""
+    if isinstance(obj, (dict, types.MappingProxyType)):
+        return {k: thaw_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw_json(v) for v in obj]
+    return obj
+
+
+def get_lsl_channel_format_dtype(channel_format):
+    """Returns the numpy dtype that matches an LSL channel format, or None if
+    the format has no numeric equivalent (i.e., string streams).
+
+    Parameters
+    ----------
+    channel_format: int or str
+        LSL channel format as returned by pylsl.StreamInfo.channel_format
+        (e.g., pylsl.cf_float32) or its string name (e.g., 'float32')
+    """
+    if isinstance(channel_format, str):
+        return LSL_CHANNEL_FORMAT_NAMES_DTYPES.get(channel_format, None)
+    return LSL_CHANNEL_FORMAT_DTYPES.get(channel_format, None)
+
+
+def to_physical_units(data, gain=None, offset=None):
+    """Converts the raw samples of an integer stream to float, applying the
+    gain and offset of each channel: data * gain + offset. Samples of float
+    streams are returned without changes, so this function can be called
+    on any chunk and only converts when needed.
+
+    Parameters
+    ----------
+    data: np.ndarray
+        Samples [n_samples x n_cha]
+    gain: np.ndarray or None
+        Gain of each channel. If None, the gain is 1.
+    offset: np.ndarray or None
+        Offset of each channel. If None, the offset is 0.
+    """
+    if not np.issubdtype(data.dtype, np.integer):
+        return data
+    data = data.astype(np.float64)
+    if gain is not None:
+        data *= gain
+    if offset is not None:
+        data += offset
+    return data
+
+
+def to_float64_physical_units(data, gain=None, offset=None):
+    """Converts the samples of a stream to a writable float64 array in
+    physical units (see to_physical_units). Float64 samples that can be
+    written are returned without copying them.
+
+    Parameters
+    ----------
+    data: np.ndarray
+        Samples [n_samples x n_cha]
+    gain: np.ndarray or None
+        Gain of each channel. If None, the gain is 1.
+    offset: np.ndarray or None
+        Offset of each channel. If None, the offset is 0.
+    """
+    data = to_physical_units(data, gain, offset)
+    if data.dtype != np.float64:
+        return data.astype(np.float64)
+    if not data.flags.writeable:
+        return data.copy()
+    return data
+
+
+def get_channel_selector(idx_cha):
+    """Returns an object to select channels from a [n_samples x n_cha] array
+    with the lowest possible cost. If the indexes are contiguous, a slice is
+    returned, so the selection is a view. Otherwise, the indexes are
+    returned as a numpy array to avoid converting them on each selection.
+
+    Parameters
+    ----------
+    idx_cha: list of int
+        Indexes of the selected channels
+    """
+    idx_cha = np.asarray(idx_cha, dtype=int)
+    if len(idx_cha) > 0 and \
+            np.array_equal(idx_cha, np.arange(idx_cha[0], idx_cha[-1] + 1)):
+        return slice(int(idx_cha[0]), int(idx_cha[-1]) + 1)
+    return idx_cha
+
+
 class LSLStreamWrapper(components.SerializableComponent):
     """LSL stream wrapper class for medusa. It includes the stream_info and
     stream_inlet objects for easier use.
@@ -161,13 +349,16 @@ class LSLStreamWrapper(components.SerializableComponent):
 
         Parameters
         ----------
-        lsl_stream: pylsl.StreamInfo
+        lsl_stream: pylsl.StreamInfo or None
             LSL Stream info object. This info can be directly passed from
             function get_lsl_streams, since the LSL inlet will be initialized
-            here.
+            here. If None, the wrapper only describes the stream and the
+            inlet cannot be initialized (e.g., streams received through a
+            StreamHub in other process).
         """
         # LSL stream
-        if not isinstance(lsl_stream, pylsl.StreamInfo):
+        if lsl_stream is not None and \
+                not isinstance(lsl_stream, pylsl.StreamInfo):
             raise TypeError('Parameter lsl_stream must be '
                             'of type pylsl.StreamInfo')
         self.lsl_stream = lsl_stream
@@ -187,6 +378,7 @@ class LSLStreamWrapper(components.SerializableComponent):
         self.lsl_source_id = None
         self.lsl_fs = None
         self.time_correction = None
+        self.clock_synchronizer = None
         self.hostname = None
         self.local_stream = None
         self.lsl_stream_info_xml = None
@@ -204,7 +396,15 @@ class LSLStreamWrapper(components.SerializableComponent):
         self.fs = None
 
     def set_inlet(self, proc_clocksync=False, proc_dejitter=False,
-                  proc_monotonize=False, proc_threadsafe=True):
+                  proc_monotonize=False, proc_threadsafe=True, timeout=None):
+        """Initializes the LSL inlet and reads the stream parameters.
+
+        The processing flags are passed to pylsl.StreamInlet. The timeout
+        limits, in seconds, the time spent waiting for the stream info
+        and the first clock correction. If it is None, the stream info has
+        a timeout of 1 s and the clock correction waits indefinitely.
+        pylsl.util.TimeoutError is raised if a timeout expires.
+        """
         # Possible LSL flags {proc_none, proc_clocksync , proc_dejitter, proc_monotonize proc_threadsafe}
         processing_flags = 0
         # Conditionally add each flag based on the variables
@@ -223,7 +423,8 @@ class LSLStreamWrapper(components.SerializableComponent):
         self.processing_flags = processing_flags
         self.lsl_stream_inlet = pylsl.StreamInlet(
             self.lsl_stream, processing_flags=processing_flags)
-        self.lsl_stream_info = self.lsl_stream_inlet.info(timeout=1)
+        self.lsl_stream_info = self.lsl_stream_inlet.info(
+            timeout=timeout if timeout is not None else 1)
         # LSL parameters
         self.lsl_name = self.lsl_stream_info.name()
         self.lsl_type = self.lsl_stream_info.type()
@@ -232,7 +433,8 @@ class LSLStreamWrapper(components.SerializableComponent):
         self.lsl_uid = self.lsl_stream_info.uid()
         self.lsl_source_id = self.lsl_stream_info.source_id()
         self.fs = self.lsl_stream_info.nominal_srate()
-        self.time_correction = self.lsl_stream_inlet.time_correction()
+        self.time_correction = self.lsl_stream_inlet.time_correction(
+            timeout=timeout if timeout is not None else pylsl.FOREVER)
         self.hostname = self.lsl_stream_info.hostname()
         self.local_stream = socket.gethostname() == self.hostname
         self.lsl_stream_info_xml = self.lsl_stream_info.as_xml()
@@ -240,83 +442,34 @@ class LSLStreamWrapper(components.SerializableComponent):
         # Check lsl stream info format
         self.lsl_stream_info_to_json()
 
+    def get_clock_synchronizer(self):
+        """Returns the ClockSynchronizer of the inlet, which estimates the
+        offset between the clock of the outlet and the local LSL clock. It
+        is created on the first call and shared by all the receivers of
+        this inlet. Returns None for local streams, which share the clock.
+        """
+        if self.local_stream:
+            return None
+        if self.lsl_stream_inlet is None:
+            raise ValueError('The inlet has not been initialized')
+        if self.clock_synchronizer is None or \
+                self.clock_synchronizer.inlet_ref() is not \
+                self.lsl_stream_inlet:
+            if self.clock_synchronizer is not None:
+                self.clock_synchronizer.stop()
+            self.clock_synchronizer = clock_sync.ClockSynchronizer(
+                self.lsl_stream_inlet)
+            self.clock_synchronizer.start()
+        return self.clock_synchronizer
+
     def lsl_stream_info_to_json(self):
-        # Custom corrections for different manufacturers
-        if self.lsl_stream_info_xml.find('NeuroElectrics') > 0:
-            """Neuroelectrics uses the following structure:
-            
-            <desc>
-                <manufacturer>NeuroElectrics</manufacturer>
-                <channel>
-                    <name>Ch1</name>
-                    <unit>microvolts</unit>
-                    <type>EEG</type>
-                </channel>
-                .
-                .
-                .
-                <channel>
-                    <name>Ch32</name>
-                    <unit>microvolts</unit>
-                    <type>EEG</type>
-                </channel>
-            </desc>
-            """
-            if self.lsl_stream_info_xml.find('<channel>') > 0:
-                # Correct structure introducing channels element to wrap the
-                # channels
-                idx1 = self.lsl_stream_info_xml.find('<channel>')
-                self.lsl_stream_info_xml = \
-                    self.lsl_stream_info_xml[:idx1] + '<channels>\n\t\t' + \
-                    self.lsl_stream_info_xml[idx1:]
-                idx2 = self.lsl_stream_info_xml.rfind('</channel>') + \
-                       len('</channel>')
-                self.lsl_stream_info_xml = \
-                    self.lsl_stream_info_xml[:idx2] + \
-                    '\n\t\t</channels>' + self.lsl_stream_info_xml[idx2:]
-                # Correct indentations
-                idx1 = self.lsl_stream_info_xml.find('<channels>\n\t\t') + \
-                       len('<channels>\n\t\t')
-                idx2 = self.lsl_stream_info_xml.find('\n\t\t</channels>')
-                lines = self.lsl_stream_info_xml[idx1:idx2].splitlines(True)
-                self.lsl_stream_info_xml = \
-                    self.lsl_stream_info_xml[:idx1] + \
-                    ''.join('\t' + line for line in lines) + \
-                    self.lsl_stream_info_xml[idx2:]
-            else:
-                # Some NeuroElectrics streams do not have channels in LSL desc
-                idx = self.lsl_stream_info_xml.rfind('</manufacturer>') + \
-                      len('</manufacturer>')
-                for i in range(self.lsl_n_cha):
-                    self.lsl_stream_info_xml = \
-                        self.lsl_stream_info_xml[:idx] + \
-                        '\n\t\t<channels>\n\t\t\t<channel>' \
-                        '\n\t\t\t\t<name>Ch%i</name>' \
-                        '\n\t\t\t\t<unit>None</unit>' \
-                        '\n\t\t\t\t<type>None</type>' \
-                        '\n\t\t\t</channel>\n\t\t</channels>' % i + \
-                        self.lsl_stream_info_xml[idx:]
-                    idx = self.lsl_stream_info_xml.rfind('</channels>') + \
-                          len('</channels>')
-        # Update json description
-        self.lsl_stream_info_json_format = \
-            utils.xml_string_to_json(self.lsl_stream_info_xml)
-        # Check json description
-        if 'desc' not in self.lsl_stream_info_json_format or \
-                self.lsl_stream_info_json_format['desc'] == '':
-            # This field desc must be a dict
-            self.lsl_stream_info_json_format['desc'] = dict()
-        if 'channels' not in self.lsl_stream_info_json_format['desc']:
-            self.lsl_stream_info_json_format['desc']['channels'] = list()
-            for i in range(self.lsl_n_cha):
-                self.lsl_stream_info_json_format['desc']['channels'].append(
-                    {'name': 'Ch%i' % i}
-                )
-        channels = self.lsl_stream_info_json_format['desc']['channels']
-        if not isinstance(channels, list):
-            # If there is only one channel, it has to be converted to list
-            self.lsl_stream_info_json_format['desc']['channels'] = \
-                list(channels.values())
+        """Parses the XML description of the stream. The result is shared by
+        all the wrappers of streams with the same description (see
+        parse_lsl_stream_description), so the parsing runs only once per
+        stream in config search, plot setup and app start."""
+        self.lsl_stream_info_xml, self.lsl_stream_info_json_format = \
+            parse_lsl_stream_description(self.lsl_stream_info_xml,
+                                         self.lsl_n_cha)
 
     def get_easy_description(self):
         if self.medusa_params_initialized:
@@ -334,9 +487,10 @@ class LSLStreamWrapper(components.SerializableComponent):
 
     def get_desc_field_value(self, desc_field):
         """Returns a field of the description in the lsl inlet. Usually used to
-        retrieve channel information"""
+        retrieve channel information. The returned value is a mutable copy,
+        since the parsed description is shared between wrappers."""
         # Get all channels
-        return self.lsl_stream_info_json_format['desc'][desc_field]
+        return thaw_json(self.lsl_stream_info_json_format['desc'][desc_field])
 
     def set_medusa_parameters(self, medusa_uid, medusa_type,
                               desc_channels_field, channel_label_field,
@@ -424,6 +578,56 @@ class LSLStreamWrapper(components.SerializableComponent):
         self.fs = fs
         self.lsl_fs = lsl_fs
 
+    def get_dtype(self):
+        """Returns the numpy dtype of the raw samples of the stream. String
+        streams, which have no numeric dtype, are stored as float."""
+        dtype = get_lsl_channel_format_dtype(self.lsl_cha_format)
+        return np.dtype(dtype) if dtype is not None else np.dtype(float)
+
+    def is_marker_stream(self):
+        """Returns True if the stream carries events instead of a signal,
+        i.e., string streams. LSLStreamAppWorker stores their samples as
+        events (see buffers.EventBuffer). Irregular numeric streams (e.g.,
+        trigger codes) are stored as signals by default, so their
+        recordings keep the original codes."""
+        return get_lsl_channel_format_dtype(self.lsl_cha_format) is None
+
+    def get_physical_dtype(self):
+        """Returns the numpy dtype of the samples in physical units (see
+        to_physical_units): float64 for integer streams, and the raw dtype
+        otherwise"""
+        dtype = self.get_dtype()
+        return np.dtype(np.float64) \
+            if np.issubdtype(dtype, np.integer) else dtype
+
+    def get_cha_scaling(self, gain_field='gain', offset_field='offset'):
+        """Returns the gain and offset of the selected channels to convert
+        the raw samples of integer streams to physical units (see
+        to_physical_units). They are read from the fields gain_field and
+        offset_field of the channel description. Channels without these
+        fields have gain 1 and offset 0.
+
+        Returns
+        -------
+        gain: np.ndarray or None
+            Gain of each selected channel, or None if no channel has gain
+        offset: np.ndarray or None
+            Offset of each selected channel, or None if no channel has
+            offset
+        """
+        if not np.issubdtype(self.get_dtype(), np.integer) or \
+                self.cha_info is None:
+            return None, None
+        sel_cha_info = [self.cha_info[i] for i in self.selected_channels_idx]
+        scaling = list()
+        for field, default in ((gain_field, 1.0), (offset_field, 0.0)):
+            if not any(field in info for info in sel_cha_info):
+                scaling.append(None)
+                continue
+            scaling.append(np.array([float(info.get(field, default))
+                                     for info in sel_cha_info]))
+        return tuple(scaling)
+
     def to_serializable_obj(self):
         # TODO: The dictionary is copied by hand due to problems with
         #  lsl_stream_info and lsl_stream_inlet. There has to be a
@@ -458,7 +662,23 @@ class LSLStreamWrapper(components.SerializableComponent):
         return class_dict
 
     @classmethod
-    def from_serializable_obj(cls, dict_data, weak_search=False):
+    def from_serializable_obj(cls, dict_data, weak_search=False,
+                              connect=True):
+        """Creates the wrapper from a serializable dict.
+
+        Parameters
+        ----------
+        dict_data: dict
+            Dict returned by to_serializable_obj
+        weak_search: bool
+            If True, the LSL uid is not used to find the stream
+        connect: bool
+            If True, the stream is resolved and the inlet is initialized. If
+            False, the wrapper is only restored from dict_data, without
+            network access (e.g., to read the stream from a StreamHub).
+        """
+        if not connect:
+            return cls.__from_serializable_obj_offline(dict_data)
         if weak_search:
             lsl_stream = get_lsl_streams(
                 force_one_stream=True,
@@ -503,6 +723,37 @@ class LSLStreamWrapper(components.SerializableComponent):
             lsl_fs=dict_data['lsl_fs'])
         return instance
 
+    @classmethod
+    def __from_serializable_obj_offline(cls, dict_data):
+        instance = cls(None)
+        instance.lsl_proc_clocksync = dict_data['lsl_proc_clocksync']
+        instance.lsl_proc_dejitter = dict_data['lsl_proc_dejitter']
+        instance.lsl_proc_monotonize = dict_data['lsl_proc_monotonize']
+        instance.lsl_proc_threadsafe = dict_data['lsl_proc_threadsafe']
+        instance.lsl_name = dict_data['lsl_name']
+        instance.lsl_type = dict_data['lsl_type']
+        instance.lsl_n_cha = dict_data['lsl_n_cha']
+        instance.lsl_cha_format = dict_data['lsl_cha_format']
+        instance.lsl_uid = dict_data['lsl_uid']
+        instance.lsl_source_id = dict_data['lsl_source_id']
+        instance.hostname = dict_data['hostname']
+        instance.local_stream = socket.gethostname() == instance.hostname
+        instance.lsl_stream_info_xml = dict_data['lsl_stream_info_xml']
+        instance.lsl_stream_info_to_json()
+        instance.update_medusa_parameters(
+            medusa_params_initialized=dict_data['medusa_params_initialized'],
+            medusa_uid=dict_data['medusa_uid'],
+            medusa_type=dict_data['medusa_type'],
+            desc_channels_field=dict_data['desc_channels_field'],
+            channel_label_field=dict_data['channel_label_field'],
+            cha_info=dict_data['cha_info'],
+            selected_channels_idx=dict_data['selected_channels_idx'],
+            n_cha=dict_data['n_cha'],
+            l_cha=dict_data['l_cha'],
+            fs=dict_data['fs'],
+            lsl_fs=dict_data['lsl_fs'])
+        return instance
+
 
 class LSLStreamReceiver:
     """ This class calculates the difference between the LSL clock and the
@@ -511,7 +762,10 @@ class LSLStreamReceiver:
      """
 
     def __init__(self, lsl_stream_mds, min_chunk_size=None, max_chunk_size=None,
-                 timeout=None, auto_mode=True):
+                 timeout=None, auto_mode=True, pull_mode='numpy',
+                 wait_mode='block', block_margin=0.002,
+                 telemetry_capacity=4096, chunk_controller=None,
+                 deadline=None, event_poll_time=0.1):
         """Class constructor
 
         Parameters
@@ -528,7 +782,49 @@ class LSLStreamReceiver:
         auto_mode: bool
             If True, the max_chunk_size and timeout variables are
             automatically adjusted to avoid problems with strange
-            configurations on the transmitter side.
+            configurations on the transmitter side. It is ignored if a
+            chunk_controller is given.
+        pull_mode: str {'numpy', 'list'}
+            If 'numpy', the samples are pulled directly into a preallocated
+            buffer with the native data type of the stream, and the selected
+            channels are returned as views of this buffer whenever possible.
+            Take into account that these views are overwritten on the next
+            call of get_chunk, so they must be copied if they have to be
+            kept. If 'list', the samples are pulled as Python lists and
+            converted to numpy arrays (legacy behaviour). String streams
+            always use mode 'list'.
+        wait_mode: str {'block', 'spin'}
+            Strategy to wait for min_chunk_size samples. If 'block',
+            pull_chunk blocks for the expected arrival time of the missing
+            samples, so the thread does not consume CPU while waiting. The
+            samples are always pulled with max_samples=max_chunk_size,
+            since pylsl caches a pair of buffers for each distinct value. If 'spin', pull_chunk is
+            called continuously without waiting, which may reduce the
+            latency slightly at the cost of using a full CPU core.
+        block_margin: float
+            Extra time in seconds added to the expected arrival time of the
+            missing samples in mode 'block'.
+        telemetry_capacity: int
+            Number of chunks kept in the synchronization telemetry ring (see
+            buffers.TelemetryRing). The oldest chunks are overwritten.
+        chunk_controller: chunk_control.ChunkController or None
+            Controller that tunes min_chunk_size, max_chunk_size and
+            timeout at runtime according to a target (e.g., latency or CPU
+            usage). The initial values of these parameters are given to the
+            controller, which may change them.
+        deadline: float or None
+            Low-latency mode for closed-loop applications. If not None, max
+            time in seconds that the received samples wait for the rest of
+            min_chunk_size: once the first samples of a chunk have waited
+            this time, the chunk is returned even if it is smaller. Use 0 to
+            return the samples as soon as they arrive. In mode 'block', the
+            waits are also limited to the deadline.
+        event_poll_time: float
+            Max time in seconds that get_chunk waits for the samples of
+            irregular streams (nominal rate 0), such as marker streams.
+            Once it expires, the samples received so far are returned,
+            which may be none, so the caller is not blocked until the next
+            event arrives.
         """
         # LSL info
         self.TAG = '[LSLStreamReceiver] '
@@ -541,6 +837,23 @@ class LSLStreamReceiver:
         self.info_cha = self.lsl_stream.cha_info
         self.idx_cha = self.lsl_stream.selected_channels_idx
         self.auto_mode = auto_mode
+        # Pull mode
+        if pull_mode not in ('numpy', 'list'):
+            raise ValueError('Parameter pull_mode must be one of {numpy, '
+                             'list}')
+        self.dtype = get_lsl_channel_format_dtype(
+            self.lsl_stream.lsl_cha_format)
+        self.pull_mode = pull_mode if self.dtype is not None else 'list'
+        self.cha_selector = get_channel_selector(self.idx_cha)
+        self.pull_buffer = None
+        # Wait mode
+        if wait_mode not in ('block', 'spin'):
+            raise ValueError('Parameter wait_mode must be one of {block, '
+                             'spin}')
+        self.wait_mode = wait_mode
+        self.block_margin = block_margin
+        self.deadline = deadline
+        self.event_poll_time = event_poll_time
         # Min chunk size cannot be None. By default, sets the minimum update
         # rate to 10 ms to avoid excessive computing load
         if min_chunk_size is None:
@@ -556,6 +869,12 @@ class LSLStreamReceiver:
             timeout = 1.5 * self.max_chunk_size / self.fs \
                 if self.fs > 0 else np.inf
         self.timeout = timeout
+        # Chunk controller
+        self.chunk_controller = chunk_controller
+        if self.chunk_controller is not None:
+            self.min_chunk_size, self.max_chunk_size, self.timeout = \
+                self.chunk_controller.reset(self.fs, self.min_chunk_size,
+                                            self.max_chunk_size, self.timeout)
         # print('LSL stream: %s\nmin_chunk_size: %i\nmax_chunk_size: '
         #       '%i\ntimeout: %.2f' % (self.lsl_stream.lsl_name,
         #                              self.min_chunk_size,
@@ -563,10 +882,12 @@ class LSLStreamReceiver:
         # Calculate Unix clock offset
         self.unix_clock_offset = \
             np.mean([time.time() - pylsl.local_clock() for _ in range(10)])
-        # Calculate LSL clock offset
-        self.lsl_clock_offset = \
-            np.mean([self.lsl_stream.lsl_stream_inlet.time_correction()
-                     for _ in range(10)])
+        # Calculate LSL clock offset. For remote streams, the offset is
+        # estimated by a drift model that is updated in the background, so
+        # time_correction is not called in the reception loop
+        self.clock_synchronizer = self.lsl_stream.get_clock_synchronizer()
+        self.lsl_clock_offset = self.clock_synchronizer.get_offset() \
+            if self.clock_synchronizer is not None else 0
         # Aliasing correction
         self.aliasing_correction = False
 
@@ -577,89 +898,248 @@ class LSLStreamReceiver:
         self.last_t_lsl = -1
         self.init_time = None
         self.last_time = None
-        self.hist_unix_clock_offsets = list()
-        self.hist_lsl_clock_offsets = list()
-        self.hist_local_timestamps = list()
-        self.hist_lsl_timestamps = list()
+        self.telemetry = buffers.TelemetryRing(telemetry_capacity)
 
     def get_chunk(self):
         """Get signal chunk. Throws an error if the reception time exceeds
         the timeout
         """
-        timer = self.Timer()
-        samples = list()
-        times = list()
-
         if self.init_time is None:
             self.init_time = time.time()
 
         # Estimate the current clock offset between LSL and UNIX local time
         unix_clock_offset = time.time() - pylsl.local_clock()
-        lsl_clock_offset = 0
-        if not self.lsl_stream.local_stream:
-            lsl_clock_offset = self.lsl_stream.lsl_stream_inlet.time_correction()
 
         # Get data
+        t_pull = time.perf_counter()
+        if self.pull_mode == 'numpy':
+            samples, times = self.__pull_chunk_numpy()
+        else:
+            samples, times = self.__pull_chunk_list()
+        if self.chunk_controller is not None:
+            self.__update_chunk_controller(len(times),
+                                           time.perf_counter() - t_pull)
+
+        # Clock offset between the outlet and the local LSL clock
+        lsl_clock_offset = 0
+        if self.clock_synchronizer is not None:
+            lsl_clock_offset = self.clock_synchronizer.get_offset()
+        self.lsl_clock_offset = lsl_clock_offset
+
+        # Increment chunk counter
+        self.chunk_counter += 1
+        self.sample_counter += len(times)
+        # LSL time to local time
+        lsl_times = times + lsl_clock_offset
+        local_times = lsl_times + unix_clock_offset
+        # Irregular streams may return empty chunks (see event_poll_time)
+        if len(times) == 0:
+            return samples, local_times, lsl_times
+        # Aliasing detection and correction
+        aliasing_correction = 0.0
+        if self.aliasing_correction:
+            dt_aliasing = local_times[0] - self.last_t_local
+            if dt_aliasing < 0 and self.last_t_local != -1:
+                aliasing_correction = -dt_aliasing
+                print('%sCorrecting an aliasing of %.4f ms...' %
+                      (self.TAG, dt_aliasing * 1000))
+                corrected_times = np.linspace(
+                    self.last_t_local, local_times[-1], len(local_times) + 1)
+                local_times = corrected_times[1:]
+
+            dt_aliasing = lsl_times[0] - self.last_t_lsl
+            if dt_aliasing < 0 and self.last_t_lsl != -1:
+                corrected_times = np.linspace(
+                    self.last_t_lsl, lsl_times[-1], len(lsl_times) + 1)
+                lsl_times = corrected_times[1:]
+        self.last_t_local = local_times[-1]
+        self.last_t_lsl = lsl_times[-1]
+
+        # Synchronization telemetry
+        self.telemetry.append(time.time(), unix_clock_offset,
+                              lsl_clock_offset, len(times),
+                              aliasing_correction)
+        return samples, local_times, lsl_times
+
+    def __update_auto_mode(self):
+        """Checks if we need to update the max_chunk_size and timeout"""
+        s_avlbl = self.lsl_stream.lsl_stream_inlet.samples_available()
+        if s_avlbl > self.max_chunk_size:
+            self.max_chunk_size = s_avlbl
+            self.timeout = 1.5 * self.max_chunk_size / self.fs \
+                if self.fs > 0 else np.inf
+
+    def __update_chunk_controller(self, n_samples, wait_time):
+        """Updates the chunk controller with the received chunk and the
+        backlog of the inlet, and applies its decisions"""
+        params = self.chunk_controller.update(
+            n_samples, self.lsl_stream.lsl_stream_inlet.samples_available(),
+            wait_time)
+        if params is not None:
+            self.min_chunk_size, self.max_chunk_size, self.timeout = params
+
+    def get_chunk_control_decisions(self):
+        """Returns the history of decisions of the chunk controller (see
+        chunk_control.ChunkController.get_decisions), or None if the
+        receiver has no controller"""
+        if self.chunk_controller is None:
+            return None
+        return self.chunk_controller.get_decisions()
+
+    def __get_wait_time(self, n_samples, timer, t_first):
+        """Returns the timeout for the next call to pull_chunk. In mode
+        'spin' it is always 0. In mode 'block', it is the expected arrival
+        time of the samples needed to complete min_chunk_size, limited by
+        the remaining time until the deadline of the received samples (if
+        any) and until the receiver timeout.
+        """
+        if self.wait_mode == 'spin':
+            return 0.0
+        if self.fs > 0:
+            wait = (self.min_chunk_size - n_samples) / self.fs + \
+                   self.block_margin
+        else:
+            # Irregular streams: pull_chunk returns as soon as the samples
+            # arrive, so this value only limits the duration of each call
+            wait = self.event_poll_time - timer.get_s()
+        if self.deadline is not None:
+            wait = min(wait, self.deadline if t_first is None
+                       else self.deadline - (timer.get_s() - t_first))
+        return max(min(wait, self.timeout - timer.get_s()), 0.0)
+
+    def __get_wait_max_samples(self):
+        """Returns max_samples for the blocking pull of mode 'block'. It
+        must not depend on the missing samples, since pylsl allocates new
+        buffers for each distinct value. pull_chunk blocks until
+        max_samples are received or the timeout expires, so irregular
+        streams use 1 to return as soon as a sample arrives."""
+        return self.max_chunk_size if self.fs > 0 else 1
+
+    def __is_chunk_ready(self, n_samples, timer, t_first):
+        """Checks if the chunk has min_chunk_size samples or, in
+        low-latency mode, if its first samples have reached the deadline.
+        t_first is the start of the pull that received the first samples,
+        since they may have arrived at any time during the pull."""
+        if n_samples >= self.min_chunk_size:
+            return True
+        if self.fs == 0 and timer.get_s() >= self.event_poll_time:
+            return True
+        return self.deadline is not None and t_first is not None and \
+            timer.get_s() - t_first >= self.deadline
+
+    def __pull_chunk_list(self):
+        """Pulls samples as Python lists until min_chunk_size samples are
+        received. Returns the selected channels and the LSL timestamps.
+        """
+        inlet = self.lsl_stream.lsl_stream_inlet
+        timer = self.Timer()
+        samples = list()
+        times = list()
+        t_first = None
         while True:
-            # Check if we need to update the max_chunk_size and timeout
-            if self.auto_mode:
-                s_avlbl = self.lsl_stream.lsl_stream_inlet.samples_available()
-                if s_avlbl > self.max_chunk_size:
-                    self.max_chunk_size = s_avlbl
-                    self.timeout = 1.5 * self.max_chunk_size / self.fs \
-                        if self.fs > 0 else np.inf
-                    # print('LSL stream parameters updated: '
-                    #       '%s\nmin_chunk_size: '
-                    #       '%i\nmax_chunk_size: '
-                    #       '%i\ntimeout: %.2f' %
-                    #       (self.lsl_stream.lsl_name, self.min_chunk_size,
-                    #        self.max_chunk_size, self.timeout))
+            if self.auto_mode and self.chunk_controller is None:
+                self.__update_auto_mode()
             # Get chunk
-            chunk, timestamps = self.lsl_stream.lsl_stream_inlet.pull_chunk(
-                max_samples=self.max_chunk_size)
+            t_pull = timer.get_s()
+            if self.wait_mode == 'block':
+                # Wait for the expected arrival time of the missing samples,
+                # and then get the samples that are already available
+                # without waiting. The number of missing samples is not used
+                # as max_samples, since pylsl allocates new buffers for each
+                # distinct value.
+                chunk, timestamps = inlet.pull_chunk(
+                    timeout=self.__get_wait_time(len(times), timer, t_first),
+                    max_samples=self.__get_wait_max_samples())
+                samples += chunk
+                times += timestamps
+                if t_first is None and len(times) > 0:
+                    t_first = t_pull
+                chunk, timestamps = list(), list()
+                if self.__is_chunk_ready(len(times), timer, t_first):
+                    chunk, timestamps = inlet.pull_chunk(
+                        max_samples=self.max_chunk_size)
+            else:
+                chunk, timestamps = inlet.pull_chunk(
+                    max_samples=self.max_chunk_size)
             samples += chunk
             times += timestamps
-            if len(times) >= self.min_chunk_size:
-                # Increment chunk counter
-                self.chunk_counter += 1
-                self.sample_counter += len(times)
-                # LSL time to local time
-                lsl_times = np.array(times) + lsl_clock_offset
-                local_times = lsl_times + unix_clock_offset
-                samples = np.array(samples)
-                # Aliasing detection and correction
-                if self.aliasing_correction:
-                    dt_aliasing = local_times[0] - self.last_t_local
-                    if dt_aliasing < 0 and self.last_t_local != -1:
-                        print('%sCorrecting an aliasing of %.4f ms...' %
-                              (self.TAG, dt_aliasing * 1000))
-                        corrected_times = np.linspace(
-                            self.last_t_local, local_times[-1], len(local_times) + 1)
-                        local_times = corrected_times[1:]
-
-                    dt_aliasing = lsl_times[0] - self.last_t_lsl
-                    if dt_aliasing < 0 and self.last_t_lsl != -1:
-                        corrected_times = np.linspace(
-                            self.last_t_lsl, lsl_times[-1], len(lsl_times) + 1)
-                        lsl_times = corrected_times[1:]
-                self.last_t_local = local_times[-1]
-                self.last_t_lsl = lsl_times[-1]
-
-                # ============================================================ #
-                # Debugging synchronization
-                # ============================================================ #
-                # self.hist_unix_clock_offsets.append(unix_clock_offset)
-                # self.hist_lsl_clock_offsets.append(lsl_clock_offset)
-                # self.hist_local_timestamps += local_times.tolist()
-                # self.hist_lsl_timestamps += lsl_times.tolist()
-                # ============================================================ #
-                return samples[:, self.idx_cha], local_times, lsl_times
-
+            if t_first is None and len(times) > 0:
+                t_first = t_pull
+            if self.__is_chunk_ready(len(times), timer, t_first):
+                # The samples of string streams are kept as Python strings.
+                # Irregular streams may return empty chunks.
+                samples = np.array(
+                    samples, dtype=object if self.dtype is None else None
+                ).reshape(-1, self.lsl_stream.lsl_n_cha)
+                return samples[:, self.cha_selector], np.array(times)
             if timer.get_s() > self.timeout:
                 # Update timeout because it can be inadequate for the LSL
                 # stream configuration of the outlet (transmitter)
                 raise exceptions.LSLStreamTimeout()
 
+    def __pull_chunk_numpy(self):
+        """Pulls samples directly into the preallocated pull buffer until
+        min_chunk_size samples are received. Returns a view (or a single
+        copy if the selected channels are not contiguous) of the selected
+        channels and the LSL timestamps.
+        """
+        inlet = self.lsl_stream.lsl_stream_inlet
+        timer = self.Timer()
+        n_samples = 0
+        times = list()
+        t_first = None
+        while True:
+            if self.auto_mode and self.chunk_controller is None:
+                self.__update_auto_mode()
+            # The buffer must hold the samples received so far (always less
+            # than min_chunk_size) plus the 2 pulls of mode 'block'
+            capacity = self.min_chunk_size + 2 * self.max_chunk_size
+            if self.pull_buffer is None or \
+                    self.pull_buffer.shape[0] < capacity:
+                pull_buffer = np.empty(
+                    (capacity, self.lsl_stream.lsl_n_cha), dtype=self.dtype)
+                if self.pull_buffer is not None:
+                    pull_buffer[:n_samples] = self.pull_buffer[:n_samples]
+                self.pull_buffer = pull_buffer
+            # Get chunk
+            t_pull = timer.get_s()
+            if self.wait_mode == 'block':
+                # Wait for the expected arrival time of the missing samples,
+                # and then get the samples that are already available
+                # without waiting. As in __pull_chunk_list, max_samples is
+                # constant.
+                max_samples = self.__get_wait_max_samples()
+                _, timestamps = inlet.pull_chunk(
+                    timeout=self.__get_wait_time(n_samples, timer, t_first),
+                    max_samples=max_samples,
+                    dest_obj=self.pull_buffer[
+                             n_samples:n_samples + max_samples])
+                n_samples += len(timestamps)
+                times += timestamps
+                if t_first is None and n_samples > 0:
+                    t_first = t_pull
+                if self.__is_chunk_ready(n_samples, timer, t_first):
+                    _, timestamps = inlet.pull_chunk(
+                        max_samples=self.max_chunk_size,
+                        dest_obj=self.pull_buffer[
+                                 n_samples:n_samples + self.max_chunk_size])
+                else:
+                    timestamps = []
+            else:
+                _, timestamps = inlet.pull_chunk(
+                    max_samples=self.max_chunk_size,
+                    dest_obj=self.pull_buffer[
+                             n_samples:n_samples + self.max_chunk_size])
+            n_samples += len(timestamps)
+            times += timestamps
+            if t_first is None and n_samples > 0:
+                t_first = t_pull
+            if self.__is_chunk_ready(n_samples, timer, t_first):
+                samples = self.pull_buffer[:n_samples, self.cha_selector]
+                return samples, np.array(times)
+            if timer.get_s() > self.timeout:
+                raise exceptions.LSLStreamTimeout()
+
     def flush_stream(self):
         """Call this function to stop queueing input data, but preserve the
         StreamInlet. Calling pull_chunk will open the stream again
@@ -696,8 +1176,23 @@ class LSLStreamReceiver:
                     if l_cha.lower() == cha_label.lower():
                         return idx
 
+    def get_clock_sync_state(self):
+        """Returns the state of the clock drift model of the stream (see
+        clock_sync.ClockDriftModel.get_state), or None for local streams"""
+        if self.clock_synchronizer is None:
+            return None
+        return self.clock_synchronizer.get_state()
+
     def get_historic_offsets(self):
-        return self.hist_unix_clock_offsets, self.hist_lsl_clock_offsets
+        """Returns the Unix and LSL clock offsets applied to the last
+        received chunks (see telemetry_capacity), in chronological order"""
+        records = self.telemetry.get_records()
+        return records['unix_clock_offset'], records['lsl_clock_offset']
+
+    def get_telemetry(self):
+        """Returns the synchronization telemetry of the last received
+        chunks as a dict of lists (see buffers.TelemetryRing)"""
+        return self.telemetry.to_dict()
 
     class Timer(object):
         """ Represents a watchdog timer. The watchdog timer is used to detect
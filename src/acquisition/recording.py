@@ -0,0 +1,397 @@
+# BUILT-IN MODULES
+import copy
+import json
+import os
+import struct
+import threading as th
+import time
+
+# EXTERNAL MODULES
+import bson
+import numpy as np
+from medusa import components
+from medusa import meeg, emg, nirs, ecg
+
+# MEDUSA MODULES
+import exceptions
+from acquisition import lsl_utils, buffers
+
+
+def get_biosignal_data_class(lsl_stream, times, signal, **kwargs):
+    """
+    Constructs the data class corresponding to the biosignal type of an LSL
+    stream in MEDUSA Kernel.
+
+    Parameters
+    ----------
+    lsl_stream: lsl_utils.LSLStreamWrapper
+        LSL stream with the medusa parameters initialized
+    times: np.ndarray
+        Timestamps of the samples
+    signal: np.ndarray
+        Samples with shape [n_samples x n_cha]. Raw samples of integer
+        streams are converted to physical units with the channel scaling of
+        the stream (see lsl_utils.LSLStreamWrapper.get_cha_scaling). Labels
+        of event streams (dtype object) are interned and saved with
+        get_event_data_class.
+    kwargs: key-value arguments
+        Additional attributes of the data class
+
+    Returns
+    -------
+    object
+        An instance of the corresponding data class:
+        - `medusa.meeg.EEG` for EEG signals
+        - `medusa.ecg.ECG` for ECG signals
+        - `medusa.emg.EMG` for EMG signals
+        - `medusa.nirs.NIRS` for NIRS signals
+        - `medusa.components.CustomBiosignalData` for custom biosignal data
+
+    Raises
+    ------
+    ValueError
+        If the type of the LSL stream is unknown
+    """
+    if signal.dtype == object:
+        events = buffers.EventBuffer(n_cha=lsl_stream.n_cha)
+        codes = events.encode(signal)
+        return get_event_data_class(lsl_stream, times, codes, events.labels,
+                                    **kwargs)
+    signal = lsl_utils.to_physical_units(signal, *lsl_stream.get_cha_scaling())
+    # Create data class
+    if lsl_stream.medusa_type == 'EEG':
+        channel_set = (
+            lsl_utils.lsl_channel_info_to_eeg_channel_set(
+            lsl_stream.cha_info))
+        stream_data = meeg.EEG(
+            times=times,
+            signal=signal,
+            fs=lsl_stream.fs,
+            channel_set=channel_set,
+            lsl_stream_info=lsl_stream.to_serializable_obj(),
+            **kwargs)
+    elif lsl_stream.medusa_type == 'ECG':
+        channel_set = ecg.ECGChannelSet()
+        [channel_set.add_channel(label=l) for l in lsl_stream.l_cha]
+        stream_data = ecg.ECG(
+            times=times,
+            signal=signal,
+            fs=lsl_stream.fs,
+            channel_set=channel_set,
+            lsl_stream_info=lsl_stream.to_serializable_obj(),
+            **kwargs)
+    elif lsl_stream.medusa_type == 'EMG':
+        channel_set = lsl_stream.cha_info
+        stream_data = emg.EMG(
+            times=times,
+            signal=signal,
+            fs=lsl_stream.fs,
+            channel_set=channel_set,
+            lsl_stream_info=lsl_stream.to_serializable_obj(),
+            **kwargs)
+    elif lsl_stream.medusa_type == 'NIRS':
+        channel_set = lsl_stream.cha_info
+        stream_data = nirs.NIRS(
+            times=times,
+            signal=signal,
+            fs=lsl_stream.fs,
+            channel_set=channel_set,
+            lsl_stream_info=lsl_stream.to_serializable_obj(),
+            **kwargs)
+    elif lsl_stream.medusa_type == 'CustomBiosignalData':
+        channel_set = lsl_stream.cha_info
+        stream_data = components.CustomBiosignalData(
+            times=times,
+            signal=signal,
+            fs=lsl_stream.fs,
+            channel_set=channel_set,
+            lsl_stream_info=lsl_stream.to_serializable_obj(),
+            **kwargs)
+    else:
+        raise ValueError('Unknown stream type %s!' %
+                         lsl_stream.medusa_type)
+    return stream_data
+
+
+def get_event_data_class(lsl_stream, times, codes, labels, **kwargs):
+    """
+    Constructs the data class of an event stream (see
+    buffers.EventBuffer) in MEDUSA Kernel. The events of string streams are
+    kept in their compact form: the codes of the events are saved as the
+    signal, and the list of labels in attribute event_labels, so the label
+    of event i in channel j is event_labels[signal[i, j]]. The events of
+    numeric streams (e.g., trigger codes) are saved with their original
+    values as the signal (see get_biosignal_data_class), so the recordings
+    are the same as if they were not stored as events. The timestamps are
+    sorted, so the events in a time window can be found with
+    np.searchsorted.
+
+    Parameters
+    ----------
+    lsl_stream: lsl_utils.LSLStreamWrapper
+        LSL stream with the medusa parameters initialized
+    times: np.ndarray
+        Timestamps of the events
+    codes: np.ndarray
+        Codes of the events with shape [n_events x n_cha]
+    labels: list
+        Label of each code
+    kwargs: key-value arguments
+        Additional attributes of the data class
+
+    Returns
+    -------
+    object
+        Data class of the events: medusa.components.CustomBiosignalData
+        for string streams, or the class given by get_biosignal_data_class
+        for numeric streams
+    """
+    dtype = lsl_utils.get_lsl_channel_format_dtype(lsl_stream.lsl_cha_format)
+    if dtype is not None:
+        signal = np.array(labels, dtype=dtype)[codes]
+        return get_biosignal_data_class(lsl_stream, times, signal, **kwargs)
+    return components.CustomBiosignalData(
+        times=times,
+        signal=codes,
+        fs=lsl_stream.fs,
+        channel_set=lsl_stream.cha_info,
+        lsl_stream_info=lsl_stream.to_serializable_obj(),
+        event_labels=list(labels),
+        **kwargs)
+
+
+def recover_recording(spill_dir, file_path=None, **rec_info):
+    """Recovers the streams recorded by LSLStreamAppWorkers with spill files
+    (e.g., after a crash of the app) into a MEDUSA recording.
+
+    Parameters
+    ----------
+    spill_dir: str
+        Spill directory of the app (see
+        resources.AppSkeleton.recording_spill_dir).
+        It contains a directory with the spill files of each stream.
+    file_path: str or None
+        If not None, the recording is saved in this path
+    rec_info: key-value arguments
+        Arguments of components.Recording (e.g., subject_id). By default,
+        subject_id is 'unknown' and recording_id is the name of spill_dir.
+
+    Returns
+    -------
+    rec: components.Recording
+        Recording with a biosignal for each stream, with the medusa uid of
+        the stream as attribute key
+    """
+    rec_info.setdefault('subject_id', 'unknown')
+    rec_info.setdefault('recording_id', os.path.basename(
+        os.path.normpath(spill_dir)))
+    rec_info.setdefault('date', time.strftime("%d-%m-%Y %H:%M",
+                                              time.localtime()))
+    rec = components.Recording(**rec_info)
+    for stream_dir in sorted(os.listdir(spill_dir)):
+        stream_path = os.path.join(spill_dir, stream_dir)
+        if not os.path.isfile(os.path.join(
+                stream_path, buffers.SpillingSampleBuffer.HEADER_FILE)):
+            continue
+        header, times, signal, _ = buffers.load_spill_files(stream_path)
+        lsl_stream = lsl_utils.LSLStreamWrapper.from_serializable_obj(
+            header['metadata']['lsl_stream_info'], connect=False)
+        rec.add_biosignal(get_biosignal_data_class(lsl_stream, times, signal),
+                          lsl_stream.medusa_uid)
+    if file_path is not None:
+        rec.save(file_path)
+    return rec
+
+
+class RecordingWriter(th.Thread):
+    """Thread that saves a recording in the background, reporting the
+    progress through the medusa interface.
+
+    The data classes of the streams are built from read-only views of the
+    worker buffers. For bson and json formats, the recording document is
+    written by this class instead of Recording.save: the attributes of the
+    recording and the data classes are serialized as usual, but their numpy
+    arrays (e.g., times and signal) are encoded in blocks of about
+    chunk_size bytes of samples, taken from the views, and each block is
+    written to the file as soon as it is encoded. Thus, the streams are
+    never converted to Python lists or serialized as a whole, and the
+    progress is reported per block. Other formats are saved with
+    Recording.save.
+    """
+
+    def __init__(self, rec, file_path, rec_streams, medusa_interface,
+                 chunk_size=4 * 2 ** 20):
+        """Class constructor
+
+        Parameters
+        ----------
+        rec: components.Recording
+            Recording with the experiment data, without the streams
+        file_path: str
+            Path of the file. The format is decoded from the extension.
+        rec_streams: dict
+            Dict with the attribute key of each stream in the recording as
+            keys and the stopped resources.LSLStreamAppWorker as values
+        medusa_interface: resources.MedusaInterface
+            Interface to the main gui of medusa
+        chunk_size: int
+            Approximate number of bytes of samples encoded and written at
+            once
+        """
+        super().__init__(name='RecordingWriter')
+        self.rec = rec
+        self.file_path = file_path
+        self.rec_streams = rec_streams
+        self.medusa_interface = medusa_interface
+        self.chunk_size = chunk_size
+        self.success = False
+        # Progress of the file being written, in rows of the arrays
+        self.n_rows = 0
+        self.n_written_rows = 0
+        self.progress = -1
+
+    def handle_exception(self, ex):
+        self.medusa_interface.error(ex)
+
+    @exceptions.error_handler(def_importance='important', scope='app')
+    def run(self):
+        file_name = os.path.basename(self.file_path)
+        # Streams
+        n_streams = len(self.rec_streams)
+        for i, (att_key, lsl_worker) in enumerate(self.rec_streams.items()):
+            self.medusa_interface.log(
+                'Saving %s: preparing stream %s (%i/%i)...' %
+                (file_name, att_key, i + 1, n_streams), mode='replace'
+                if i > 0 else 'append')
+            self.rec.add_biosignal(lsl_worker.get_data_class(copy=False),
+                                   att_key)
+        # Write file
+        data_format = self.file_path.split('.')[-1]
+        if data_format in ('bson', 'json'):
+            doc = self.__get_document()
+            self.n_rows = self.__count_rows(doc)
+            self.n_written_rows = 0
+            self.progress = -1
+            if data_format == 'bson':
+                with open(self.file_path, 'wb') as f:
+                    self.__write_bson_document(f, doc)
+            else:
+                with open(self.file_path, 'w', encoding='utf-8') as f:
+                    self.__write_json_value(f, doc)
+        else:
+            self.medusa_interface.log('Saving %s...' % file_name,
+                                      mode='replace')
+            self.rec.save(self.file_path)
+        self.success = True
+        self.medusa_interface.log('Recording saved successfully')
+
+    def __get_document(self):
+        """Returns the document of the recording as a dict, with the same
+        content as Recording.to_serializable_obj, but keeping the arrays of
+        the biosignals as numpy arrays"""
+        doc = dict()
+        for key, value in self.rec.__dict__.items():
+            if key in self.rec.biosignals:
+                doc[key] = self.__get_biosignal_document(value)
+            elif key in self.rec.experiments:
+                doc[key] = value.to_serializable_obj()
+            else:
+                doc[key] = value
+        return doc
+
+    @staticmethod
+    def __get_biosignal_document(biosignal):
+        # The data class is serialized without its arrays, which are
+        # converted to lists in to_serializable_obj. A shallow copy is
+        # used, since to_serializable_obj modifies the attributes.
+        arrays = {key: value for key, value in biosignal.__dict__.items()
+                  if isinstance(value, np.ndarray) and value.ndim > 0}
+        biosignal_copy = copy.copy(biosignal)
+        for key in arrays:
+            del biosignal_copy.__dict__[key]
+        ser_obj = biosignal_copy.to_serializable_obj()
+        doc = dict()
+        for key in biosignal.__dict__:
+            doc[key] = arrays[key] if key in arrays else ser_obj[key]
+        return doc
+
+    def __count_rows(self, value):
+        if isinstance(value, dict):
+            return sum(self.__count_rows(v) for v in value.values())
+        if isinstance(value, np.ndarray):
+            return len(value)
+        return 0
+
+    def __iter_blocks(self, array):
+        """Yields the index of the first row and the rows of each block of
+        the array as lists, reporting the progress of the previous block"""
+        n_rows = max(self.chunk_size // max(array[:1].nbytes, 1), 1)
+        for start in range(0, len(array), n_rows):
+            yield start, array[start:start + n_rows].tolist()
+            self.n_written_rows += min(n_rows, len(array) - start)
+            self.__log_progress()
+
+    def __log_progress(self):
+        progress = int(100 * self.n_written_rows / max(self.n_rows, 1))
+        if progress != self.progress:
+            self.progress = progress
+            self.medusa_interface.log(
+                'Saving %s: %i%%' % (os.path.basename(self.file_path),
+                                     progress), mode='replace')
+
+    def __write_json_value(self, f, value):
+        if isinstance(value, dict):
+            f.write('{')
+            for i, (key, v) in enumerate(value.items()):
+                f.write('%s%s: ' % (', ' if i > 0 else '',
+                                    json.dumps(str(key))))
+                self.__write_json_value(f, v)
+            f.write('}')
+        elif isinstance(value, np.ndarray):
+            f.write('[')
+            for start, rows in self.__iter_blocks(value):
+                if start > 0:
+                    f.write(', ')
+                f.write(json.dumps(rows)[1:-1])
+            f.write(']')
+        else:
+            f.write(json.dumps(value))
+
+    @staticmethod
+    def __begin_bson_container(f, element_type, key):
+        """Writes the header of an embedded document or array, with a
+        placeholder for its length. Returns the position of the length"""
+        if key is not None:
+            f.write(element_type + str(key).encode('utf-8') + b'\x00')
+        pos = f.tell()
+        f.write(struct.pack('<i', 0))
+        return pos
+
+    @staticmethod
+    def __end_bson_container(f, pos):
+        f.write(b'\x00')
+        end = f.tell()
+        f.seek(pos)
+        f.write(struct.pack('<i', end - pos))
+        f.seek(end)
+
+    def __write_bson_document(self, f, doc, key=None):
+        pos = self.__begin_bson_container(f, b'\x03', key)
+        for k, value in doc.items():
+            if isinstance(value, dict):
+                self.__write_bson_document(f, value, k)
+            elif isinstance(value, np.ndarray):
+                self.__write_bson_array(f, value, k)
+            else:
+                # Encoded element without the header and trailer of the
+                # document
+                f.write(bson.dumps({str(k): value})[4:-1])
+        self.__end_bson_container(f, pos)
+
+    def __write_bson_array(self, f, array, key):
+        # BSON arrays are documents with the indexes as keys
+        pos = self.__begin_bson_container(f, b'\x04', key)
+        for start, rows in self.__iter_blocks(array):
+            f.write(bson.dumps({str(start + i): row for i, row in
+                                enumerate(rows)})[4:-1])
+        self.__end_bson_container(f, pos)
@@ -0,0 +1,723 @@
+"""Replay engine that republishes the biosignals of MEDUSA recordings (bson,
+json or mat files saved by the apps) as LSL outlets, to test the plots and
+apps with real data.
+
+Each biosignal is published with the name, type, source id, channel format,
+sample rate and XML description of the original stream, which are saved in
+its lsl_stream_info, so LSLStreamWrapper parses the replayed stream
+identically. The samples can be replayed at the original pace, accelerated
+or as fast as possible, in a loop, and several files can be replayed
+simultaneously.
+
+The signals are converted once to .npy files that are memory-mapped during
+the replay, so only the chunks being pushed are loaded. BSON files are also
+converted in blocks, without decoding the whole file, and mat files are read
+biosignal by biosignal. JSON files have to be parsed completely.
+
+Run this module from the src folder to replay files from the command line
+(use -h to see all the options):
+
+    python -m acquisition.replay rec_1.bson rec_2.mat --speed 2 --loop
+"""
+
+# BUILT-IN MODULES
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading as th
+import time
+import xml.etree.ElementTree as et
+
+# EXTERNAL MODULES
+import bson
+import numpy as np
+import pylsl
+import scipy.io
+
+# MEDUSA MODULES
+from acquisition import lsl_utils
+
+# Formats of the recordings that can be replayed
+RECORDING_FORMATS = ('bson', 'json', 'mat')
+
+# Sizes of the fixed-size BSON values by element type
+BSON_FIXED_SIZES = {
+    0x01: 8,    # double
+    0x07: 12,   # object id
+    0x08: 1,    # boolean
+    0x09: 8,    # datetime
+    0x0A: 0,    # null
+    0x10: 4,    # int32
+    0x11: 8,    # timestamp
+    0x12: 8,    # int64
+    0x13: 16,   # decimal128
+    0x7F: 0,    # max key
+    0xFF: 0,    # min key
+}
+BSON_NUMBER_FORMATS = {0x01: '<d', 0x10: '<i', 0x12: '<q'}
+
+
+def iter_bson_elements(buf, start):
+    """Iterates over the elements of a BSON document without decoding them.
+
+    Parameters
+    ----------
+    buf: mmap.mmap or bytes
+        Buffer with the BSON data
+    start: int
+        Position of the document in buf
+
+    Yields
+    ------
+    el_type: int
+        BSON type of the element
+    name: str
+        Name of the element (index for arrays)
+    value_start: int
+        Position of the value of the element in buf
+    value_end: int
+        End of the value of the element in buf
+    """
+    end = start + struct.unpack_from('<i', buf, start)[0] - 1
+    pos = start + 4
+    while pos < end:
+        el_type = buf[pos]
+        name_end = buf.find(b'\x00', pos + 1)
+        name = bytes(buf[pos + 1:name_end]).decode('utf-8')
+        pos = name_end + 1
+        if el_type in BSON_FIXED_SIZES:
+            size = BSON_FIXED_SIZES[el_type]
+        elif el_type in (0x02, 0x0D, 0x0E):
+            # String, javascript code and symbol
+            size = 4 + struct.unpack_from('<i', buf, pos)[0]
+        elif el_type in (0x03, 0x04, 0x0F):
+            # Document, array and code with scope
+            size = struct.unpack_from('<i', buf, pos)[0]
+        elif el_type == 0x05:
+            # Binary data
+            size = 5 + struct.unpack_from('<i', buf, pos)[0]
+        else:
+            raise ValueError('Unsupported BSON element type %i' % el_type)
+        yield el_type, name, pos, pos + size
+        pos += size
+
+
+def decode_bson_element(buf, el_type, name, value_start, value_end):
+    """Decodes a single element of a BSON document (see iter_bson_elements)
+    wrapping it in a document"""
+    key = name.encode('utf-8') + b'\x00'
+    value = bytes(buf[value_start:value_end])
+    doc = struct.pack('<i', 4 + 1 + len(key) + len(value) + 1) + \
+        bytes([el_type]) + key + value + b'\x00'
+    return bson.loads(doc)[name]
+
+
+def bson_array_to_npy(buf, start, path, block_size=4096):
+    """Converts a numeric BSON array (1D) or array of arrays (2D, e.g., the
+    signal of a biosignal) to a .npy file, in blocks of block_size items.
+    Rows of doubles with the same layout are gathered with numpy without
+    decoding each value.
+
+    Parameters
+    ----------
+    buf: mmap.mmap or bytes
+        Buffer with the BSON data
+    start: int
+        Position of the array in buf
+    path: str
+        Path of the .npy file
+    block_size: int
+        Number of items converted at once
+    """
+    n = sum(1 for _ in iter_bson_elements(buf, start))
+    items = iter_bson_elements(buf, start)
+    first = next(iter_bson_elements(buf, start), None)
+    if first is None or first[0] != 0x04:
+        # 1D array
+        data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+                                         shape=(n,))
+        for i, (el_type, name, s, e) in enumerate(items):
+            data[i] = struct.unpack_from(BSON_NUMBER_FORMATS[el_type],
+                                         buf, s)[0]
+        data.flush()
+        del data
+        return
+    # 2D array. Layout of the values of the first row
+    row_size = struct.unpack_from('<i', buf, first[2])[0]
+    row = list(iter_bson_elements(buf, first[2]))
+    n_cha = len(row)
+    gather = None
+    if all(el[0] == 0x01 for el in row):
+        offsets = np.array([el[2] - first[2] for el in row])
+        gather = (offsets[:, np.newaxis] + np.arange(8)).ravel()
+    data = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+                                     shape=(n, n_cha))
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    try:
+        i = 0
+        while i < n:
+            starts = list()
+            for el_type, name, s, e in items:
+                starts.append(s)
+                if len(starts) == block_size:
+                    break
+            starts = np.array(starts)
+            sizes = [struct.unpack_from('<i', buf, s)[0] for s in starts]
+            if gather is not None and all(s == row_size for s in sizes):
+                block = raw[starts[:, np.newaxis] + gather]
+                data[i:i + len(starts)] = \
+                    block.view('<f8').reshape(len(starts), n_cha)
+            else:
+                for j, s in enumerate(starts):
+                    values = bson.loads(bytes(buf[s:s + sizes[j]]))
+                    data[i + j] = list(values.values())
+            i += len(starts)
+    finally:
+        # Release the view of the buffer so it can be closed
+        del raw
+    data.flush()
+    del data
+
+
+def null_to_none(obj):
+    """Restores the None objects replaced by 'null' strings when the
+    recordings are saved in mat format"""
+    if isinstance(obj, dict):
+        return {k: null_to_none(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [null_to_none(v) for v in obj]
+    if isinstance(obj, str) and obj == 'null':
+        return None
+    return obj
+
+
+def mat_to_list(obj):
+    """Converts the arrays loaded from mat files (with simplify_cells) to
+    lists with python values"""
+    if isinstance(obj, np.ndarray):
+        return [mat_to_list(v) for v in np.atleast_1d(obj).tolist()]
+    if isinstance(obj, dict):
+        return {k: mat_to_list(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [mat_to_list(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+class RecordingReader:
+    """Reads the biosignals of a MEDUSA recording for replay. The times and
+    signal of each biosignal are converted to .npy files, which are
+    memory-mapped. If a cache directory is given, the converted files are
+    kept there and reused while the recording is not modified, so they are
+    only converted once. Otherwise, they are saved in a temporary directory
+    that is deleted by close.
+
+    Attribute biosignals is a dict with the following keys for each
+    biosignal of the recording:
+
+        - class_name: class of the biosignal (e.g., EEG)
+        - lsl_stream_info: serializable dict of the LSLStreamWrapper of the
+          stream (see LSLStreamWrapper.to_serializable_obj)
+        - times: memory-mapped array with the timestamps of the samples
+        - signal: memory-mapped array with the samples, in physical units
+    """
+
+    def __init__(self, file_path, cache_dir=None, block_size=4096):
+        """Class constructor
+
+        Parameters
+        ----------
+        file_path: str
+            Path of the recording (bson, json or mat)
+        cache_dir: str or None
+            Directory to keep the converted signals. If None, they are
+            converted to a temporary directory.
+        block_size: int
+            Number of samples converted at once from bson files
+        """
+        self.file_path = file_path
+        self.format = file_path.split('.')[-1].lower()
+        if self.format not in RECORDING_FORMATS:
+            raise ValueError('Format %s cannot be replayed. Available '
+                             'formats: %s' % (self.format,
+                                              str(RECORDING_FORMATS)))
+        self.block_size = block_size
+        self.temp_dir = cache_dir is None
+        self.cache_dir = tempfile.mkdtemp(prefix='medusa_replay_') \
+            if cache_dir is None else cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.file_name = os.path.splitext(os.path.basename(file_path))[0]
+        self.index_path = os.path.join(self.cache_dir,
+                                       '%s.replay.json' % self.file_name)
+        self.biosignals = dict()
+        self.load()
+
+    def get_array_path(self, key, field):
+        return os.path.join(self.cache_dir, '%s.%s.%s.npy' %
+                            (self.file_name, key, field))
+
+    def load(self):
+        """Loads the index of the converted signals, converting the
+        recording if the cache is not valid, and memory-maps the signals"""
+        stat = os.stat(self.file_path)
+        index = None
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index['size'] != stat.st_size or \
+                    index['mtime'] != stat.st_mtime:
+                index = None
+        if index is None:
+            if self.format == 'bson':
+                biosignals = self.__convert_bson()
+            elif self.format == 'json':
+                biosignals = self.__convert_json()
+            else:
+                biosignals = self.__convert_mat()
+            index = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                     'biosignals': biosignals}
+            with open(self.index_path, 'w') as f:
+                json.dump(index, f)
+        for key, info in index['biosignals'].items():
+            self.biosignals[key] = {
+                'class_name': info['class_name'],
+                'lsl_stream_info': info['lsl_stream_info'],
+                'times': np.load(self.get_array_path(key, 'times'),
+                                 mmap_mode='r'),
+                'signal': np.load(self.get_array_path(key, 'signal'),
+                                  mmap_mode='r')
+            }
+
+    def __check_biosignal(self, key, class_name, biosignal):
+        if biosignal.get('lsl_stream_info', None) is None:
+            raise ValueError('Biosignal %s has no lsl_stream_info. Only '
+                             'recordings saved by MEDUSA Platform can be '
+                             'replayed.' % key)
+        return {'class_name': class_name,
+                'lsl_stream_info': biosignal['lsl_stream_info']}
+
+    def __convert_bson(self):
+        biosignals = dict()
+        with open(self.file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            elements = {name: (el_type, s, e) for el_type, name, s, e
+                        in iter_bson_elements(buf, 0)}
+            if 'biosignals' not in elements:
+                raise ValueError('The recording has no biosignals')
+            el_type, s, e = elements['biosignals']
+            rec_biosignals = decode_bson_element(buf, el_type, 'biosignals',
+                                                 s, e)
+            for key, biosignal_info in rec_biosignals.items():
+                biosignal = dict()
+                for el_type, name, s, e in iter_bson_elements(
+                        buf, elements[key][1]):
+                    if name in ('times', 'signal'):
+                        bson_array_to_npy(buf, s,
+                                          self.get_array_path(key, name),
+                                          self.block_size)
+                    else:
+                        biosignal[name] = decode_bson_element(
+                            buf, el_type, name, s, e)
+                biosignals[key] = self.__check_biosignal(
+                    key, biosignal_info['class_name'], biosignal)
+        return biosignals
+
+    def __convert_json(self):
+        with open(self.file_path, 'r') as f:
+            rec_dict = json.load(f)
+        biosignals = dict()
+        for key, biosignal_info in rec_dict['biosignals'].items():
+            biosignal = rec_dict[key]
+            biosignals[key] = self.__check_biosignal(
+                key, biosignal_info['class_name'], biosignal)
+            for field in ('times', 'signal'):
+                np.save(self.get_array_path(key, field),
+                        np.array(biosignal[field], dtype=np.float64))
+        return biosignals
+
+    def __convert_mat(self):
+        # Each biosignal is a variable of the file, so they are read one by
+        # one to avoid loading the whole file
+        rec_biosignals = scipy.io.loadmat(
+            self.file_path, variable_names=['biosignals'], squeeze_me=True,
+            simplify_cells=True)['biosignals']
+        biosignals = dict()
+        for key, biosignal_info in rec_biosignals.items():
+            biosignal = scipy.io.loadmat(
+                self.file_path, variable_names=[key], squeeze_me=True,
+                simplify_cells=True)[key]
+            times = np.atleast_1d(biosignal.pop('times'))
+            signal = np.asarray(biosignal.pop('signal'))
+            signal = signal.reshape(len(times), -1)
+            np.save(self.get_array_path(key, 'times'), times)
+            np.save(self.get_array_path(key, 'signal'), signal)
+            del times, signal
+            biosignal = null_to_none(mat_to_list(biosignal))
+            info = biosignal.get('lsl_stream_info', None)
+            if info is not None:
+                # Lists of a single element are squeezed in mat files
+                for field in ('cha_info', 'selected_channels_idx', 'l_cha'):
+                    if info[field] is not None and \
+                            not isinstance(info[field], list):
+                        info[field] = [info[field]]
+            biosignals[key] = self.__check_biosignal(
+                key, biosignal_info['class_name'], biosignal)
+        return biosignals
+
+    def close(self):
+        """Releases the memory-mapped signals, deleting the converted files
+        if they were saved in a temporary directory"""
+        self.biosignals = dict()
+        if self.temp_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+class ReplayStream:
+    """LSL outlet that republishes a biosignal read by RecordingReader with
+    the parameters and description of the original stream"""
+
+    def __init__(self, biosignal, name_suffix='', only_recorded_channels=False,
+                 max_buffered=360):
+        """Class constructor
+
+        Parameters
+        ----------
+        biosignal: dict
+            Biosignal of RecordingReader.biosignals
+        name_suffix: str
+            Suffix added to the name and source id of the stream, e.g., to
+            replay several recordings of the same device simultaneously
+        only_recorded_channels: bool
+            If False, the stream has all the channels of the original stream,
+            and the channels that were not selected in the recording are
+            zeros, so the saved channel selection applies to the replayed
+            stream. If True, only the recorded channels are published.
+        max_buffered: float
+            Max seconds of data buffered by the outlet for each inlet
+        """
+        self.lsl_stream = lsl_utils.LSLStreamWrapper.from_serializable_obj(
+            biosignal['lsl_stream_info'], connect=False)
+        self.times = biosignal['times']
+        self.signal = biosignal['signal']
+        self.selected_channels_idx = \
+            list(self.lsl_stream.selected_channels_idx)
+        self.stream_name = self.lsl_stream.lsl_name + name_suffix
+        channel_format = self.lsl_stream.lsl_cha_format
+        dtype = lsl_utils.get_lsl_channel_format_dtype(channel_format)
+        if dtype is None:
+            # String streams cannot be recorded as biosignals
+            channel_format, dtype = pylsl.cf_double64, np.float64
+        self.dtype = np.dtype(dtype)
+        # Inverse of the scaling applied to the samples of integer streams
+        self.gain, self.offset = self.lsl_stream.get_cha_scaling()
+        # Original description, keeping only the recorded channels if
+        # required
+        desc = et.fromstring(self.lsl_stream.lsl_stream_info_xml).find(
+            'desc')
+        channels_field = self.lsl_stream.desc_channels_field
+        if only_recorded_channels:
+            self.n_cha = len(self.selected_channels_idx)
+            if desc is not None and channels_field is not None and \
+                    desc.find(channels_field) is not None:
+                channels = desc.find(channels_field)
+                elements = list(channels)
+                for element in elements:
+                    channels.remove(element)
+                for i in self.selected_channels_idx:
+                    channels.append(elements[i])
+        else:
+            self.n_cha = self.lsl_stream.lsl_n_cha
+        info = pylsl.StreamInfo(
+            name=self.stream_name, type=self.lsl_stream.lsl_type,
+            channel_count=self.n_cha, nominal_srate=self.lsl_stream.lsl_fs,
+            channel_format=channel_format,
+            source_id=self.lsl_stream.lsl_source_id + name_suffix)
+        if desc is not None:
+            self.__copy_desc(desc, info.desc())
+        self.outlet = pylsl.StreamOutlet(info, max_buffered=max_buffered)
+        self.only_recorded_channels = only_recorded_channels
+        self.n_pushed = 0
+
+    def __copy_desc(self, element, lsl_element):
+        for child in element:
+            if len(child) == 0:
+                lsl_element.append_child_value(
+                    child.tag, child.text if child.text is not None else '')
+            else:
+                self.__copy_desc(child, lsl_element.append_child(child.tag))
+
+    def push(self, start, stop, time_offset):
+        """Pushes the samples in [start, stop), with their original
+        timestamps shifted by time_offset"""
+        if stop <= start:
+            return
+        chunk = np.asarray(self.signal[start:stop])
+        if np.issubdtype(self.dtype, np.integer):
+            if self.offset is not None:
+                chunk = chunk - self.offset
+            if self.gain is not None:
+                chunk = chunk / self.gain
+            chunk = np.round(chunk)
+        if self.only_recorded_channels:
+            chunk = np.ascontiguousarray(chunk, dtype=self.dtype)
+        else:
+            samples = np.zeros((stop - start, self.n_cha), dtype=self.dtype)
+            samples[:, self.selected_channels_idx] = chunk
+            chunk = samples
+        timestamps = self.times[start:stop] + time_offset
+        self.outlet.push_chunk(chunk, timestamps.tolist())
+        self.n_pushed += stop - start
+
+
+class RecordingReplay(th.Thread):
+    """Republishes the biosignals of a MEDUSA recording as LSL outlets (see
+    ReplayStream). The streams of the recording are pushed together, so
+    they keep their original alignment.
+
+    The timestamps keep the original intervals between samples at any
+    speed, shifted so that the first sample of the recording is stamped
+    with the start of the replay. Thus, at speed 1 they match the LSL clock
+    at which the samples are pushed, and in accelerated replays the
+    streams have their nominal sample rate, but the samples are pushed
+    ahead of their timestamps.
+    """
+
+    def __init__(self, file_path, speed=1.0, loop=False, chunk_time=0.01,
+                 name_suffix='', only_recorded_channels=False,
+                 biosignals=None, cache_dir=None, max_buffered=360):
+        """Class constructor
+
+        Parameters
+        ----------
+        file_path: str
+            Path of the recording (bson, json or mat)
+        speed: float or None
+            Replay speed relative to the original pace (e.g., 1 for real
+            time, 10 for 10x). If None or 0, the samples are pushed as fast
+            as possible; in this case, inlets that do not keep up lose the
+            samples that exceed max_buffered.
+        loop: bool
+            If True, the recording is replayed in a loop until stop is
+            called. The timestamps keep increasing between loops.
+        chunk_time: float
+            Time in seconds of the recording pushed at each chunk
+        name_suffix: str
+            Suffix of the names and source ids of the streams
+        only_recorded_channels: bool
+            If True, only the recorded channels are published (see
+            ReplayStream)
+        biosignals: list of str or None
+            Keys of the biosignals to replay. If None, all of them.
+        cache_dir: str or None
+            Directory to keep the converted signals (see RecordingReader)
+        max_buffered: float
+            Max seconds of data buffered by the outlets for each inlet
+        """
+        super().__init__(name='RecordingReplay', daemon=True)
+        self.file_path = file_path
+        self.speed = speed if speed else None
+        self.loop = loop
+        self.chunk_time = chunk_time
+        self.reader = RecordingReader(file_path, cache_dir=cache_dir)
+        keys = biosignals if biosignals is not None \
+            else list(self.reader.biosignals)
+        self.streams = list()
+        for key in keys:
+            if key not in self.reader.biosignals:
+                raise ValueError('Biosignal %s not found in %s' %
+                                 (key, file_path))
+            if len(self.reader.biosignals[key]['times']) == 0:
+                continue
+            self.streams.append(ReplayStream(
+                self.reader.biosignals[key], name_suffix=name_suffix,
+                only_recorded_channels=only_recorded_channels,
+                max_buffered=max_buffered))
+        if len(self.streams) == 0:
+            raise ValueError('The recording %s has no samples to replay' %
+                             file_path)
+        # Time of the first sample of the recording and duration of each
+        # loop, including one sample period so that loops do not overlap
+        self.rec_start = min(float(s.times[0]) for s in self.streams)
+        self.rec_duration = max(
+            float(s.times[-1]) + 1 / s.lsl_stream.lsl_fs
+            if s.lsl_stream.lsl_fs > 0 else float(s.times[-1])
+            for s in self.streams) - self.rec_start
+        # LSL time of the start of the replay. It can be set before start
+        # to synchronize several replays.
+        self.start_time = None
+        self.position = 0.0
+        self.n_loops = 0
+        self.stop_event = th.Event()
+
+    def run(self):
+        if self.start_time is None:
+            self.start_time = pylsl.local_clock()
+        self.stop_event.wait(max(self.start_time - pylsl.local_clock(), 0))
+        # Next sample of each stream
+        cursors = [0] * len(self.streams)
+        while not self.stop_event.is_set():
+            if self.speed is None:
+                self.position += self.chunk_time
+            else:
+                self.position = (pylsl.local_clock() - self.start_time) \
+                    * self.speed - self.n_loops * self.rec_duration
+            time_offset = self.start_time - self.rec_start + \
+                self.n_loops * self.rec_duration
+            for i, stream in enumerate(self.streams):
+                stop = int(np.searchsorted(
+                    stream.times, self.rec_start + self.position,
+                    side='right'))
+                stream.push(cursors[i], stop, time_offset)
+                cursors[i] = stop
+            if self.position >= self.rec_duration:
+                if not self.loop:
+                    break
+                self.n_loops += 1
+                cursors = [0] * len(self.streams)
+                if self.speed is None:
+                    self.position -= self.rec_duration
+                continue
+            if self.speed is not None:
+                self.stop_event.wait(self.chunk_time / self.speed)
+            else:
+                # Yield to the other threads
+                time.sleep(0)
+
+    def stop(self):
+        """Stops the replay and closes the outlets and the recording. The
+        outlets are kept until this call when the replay finishes, so the
+        inlets can read the buffered samples."""
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.streams = list()
+        self.reader.close()
+
+    def get_stats(self):
+        """Returns a dict with the position of the replay in the recording
+        in seconds, the number of completed loops and the samples pushed
+        by each stream"""
+        return {
+            'file_path': self.file_path,
+            'position': min(self.position, self.rec_duration),
+            'duration': self.rec_duration,
+            'n_loops': self.n_loops,
+            'n_pushed': {s.stream_name: s.n_pushed for s in self.streams}
+        }
+
+
+class ReplayEngine:
+    """Replays several recordings simultaneously (see RecordingReplay), with
+    a common start time. Use it as a context manager to stop the replays
+    automatically::
+
+        with ReplayEngine(['rec_1.bson', 'rec_2.bson'], speed=2) as engine:
+            engine.wait()
+    """
+
+    def __init__(self, file_paths, **replay_kwargs):
+        """Class constructor
+
+        Parameters
+        ----------
+        file_paths: list of str
+            Paths of the recordings
+        replay_kwargs: key-value arguments
+            Arguments of RecordingReplay. Values given as lists are
+            assigned to the recordings in order, repeating the last value
+            if the list is shorter than file_paths.
+        """
+        self.replays = list()
+        try:
+            for i, file_path in enumerate(file_paths):
+                kwargs = {key: value[min(i, len(value) - 1)]
+                          if isinstance(value, list) and key != 'biosignals'
+                          else value for key, value in replay_kwargs.items()}
+                self.replays.append(RecordingReplay(file_path, **kwargs))
+        except Exception:
+            self.stop()
+            raise
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self, delay=0.1):
+        """Starts the replays after delay seconds, so all of them start at
+        the same LSL time"""
+        start_time = pylsl.local_clock() + delay
+        for replay in self.replays:
+            replay.start_time = start_time
+            replay.start()
+
+    def wait(self, timeout=None):
+        """Waits until the replays finish (never for looped replays, unless
+        timeout is given). Returns True if all of them have finished."""
+        t_end = time.time() + timeout if timeout is not None else None
+        for replay in self.replays:
+            replay.join(None if t_end is None else max(t_end - time.time(), 0))
+        return not any(replay.is_alive() for replay in self.replays)
+
+    def stop(self):
+        for replay in self.replays:
+            replay.stop_event.set()
+        for replay in self.replays:
+            replay.stop()
+
+    def get_stats(self):
+        """Returns the stats of each replay (see RecordingReplay.get_stats)"""
+        return [replay.get_stats() for replay in self.replays]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Replays MEDUSA recordings as LSL streams')
+    parser.add_argument('file_paths', nargs='+',
+                        help='recordings in bson, json or mat format')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed (0 for max speed)')
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--name-suffix', default='',
+                        help='suffix of the stream names. Use {i} to add '
+                             'the index of each file')
+    parser.add_argument('--only-recorded-channels', action='store_true',
+                        help='publish only the recorded channels')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory to keep the converted signals')
+    parser.add_argument('--stats-interval', type=float, default=5,
+                        help='time between stats prints in s')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = ReplayEngine(
+        args.file_paths, speed=args.speed, loop=args.loop,
+        name_suffix=[args.name_suffix.format(i=i)
+                     for i in range(len(args.file_paths))],
+        only_recorded_channels=args.only_recorded_channels,
+        cache_dir=args.cache_dir)
+    print('Replaying %i recordings. Press Ctrl+C to finish...' %
+          len(args.file_paths))
+    try:
+        with engine:
+            while not engine.wait(args.stats_interval):
+                for stats in engine.get_stats():
+                    print('%s: %.1f / %.1f s, %i loops' % (
+                        stats['file_path'], stats['position'],
+                        stats['duration'], stats['n_loops']))
+    except KeyboardInterrupt:
+        pass
+    print('Replay finished')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+# BUILT-IN MODULES
+import threading as th
+import time
+from multiprocessing import shared_memory
+
+# EXTERNAL MODULES
+import numpy as np
+
+# MEDUSA MODULES
+import exceptions
+from acquisition import lsl_utils, buffers
+
+
+class SharedRingBuffer:
+    """Ring buffer allocated in shared memory that stores the samples, local
+    timestamps and LSL timestamps of a stream. There must be only one writer,
+    but any number of readers can access the buffer from the same or other
+    processes. Each reader keeps its own cursor, which is the absolute index
+    of the next sample to read.
+
+    The memory block is organized as follows:
+        - Header: int64 values. The first one is the total number of samples
+          written since the creation of the buffer. The second one holds the
+          bits of the LSL clock offset (float64) applied by the writer to
+          the last chunk, NaN until the first chunk is written.
+        - Local timestamps: float64 array with shape [capacity]
+        - LSL timestamps: float64 array with shape [capacity]
+        - Samples: array with shape [capacity x n_cha]
+    """
+
+    HEADER_LEN = 8
+
+    def __init__(self, n_cha, capacity, dtype=float, name=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        n_cha: int
+            Number of channels
+        capacity: int
+            Number of samples that the buffer can hold before overwriting the
+            oldest ones
+        dtype: numpy.dtype or type
+            Data type of the samples
+        name: str or None
+            Name of the shared memory block. If None, a new block is created.
+            Otherwise, the buffer is attached to an existing block.
+        """
+        self.n_cha = int(n_cha)
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        header_size = self.HEADER_LEN * 8
+        times_size = self.capacity * 8
+        data_size = self.capacity * self.n_cha * self.dtype.itemsize
+        size = header_size + 2 * times_size + data_size
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        # Views of the shared block
+        self.header = np.ndarray((self.HEADER_LEN,), dtype=np.int64,
+                                 buffer=self.shm.buf, offset=0)
+        self.times = np.ndarray((self.capacity,), dtype=np.float64,
+                                buffer=self.shm.buf, offset=header_size)
+        self.lsl_times = np.ndarray((self.capacity,), dtype=np.float64,
+                                    buffer=self.shm.buf,
+                                    offset=header_size + times_size)
+        self.data = np.ndarray((self.capacity, self.n_cha), dtype=self.dtype,
+                               buffer=self.shm.buf,
+                               offset=header_size + 2 * times_size)
+        if self.owner:
+            self.header[:] = 0
+            self.header[1:2].view(np.float64)[0] = np.nan
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        """Attaches to an existing buffer given its descriptor, as returned
+        by get_descriptor. Use this method to access the buffer from other
+        processes.
+        """
+        return cls(n_cha=descriptor['n_cha'],
+                   capacity=descriptor['capacity'],
+                   dtype=descriptor['dtype'],
+                   name=descriptor['name'])
+
+    def get_descriptor(self):
+        """Returns a picklable dict with the information needed to attach to
+        this buffer from other processes"""
+        return {
+            'name': self.name,
+            'n_cha': self.n_cha,
+            'capacity': self.capacity,
+            'dtype': self.dtype.str
+        }
+
+    @property
+    def n_written(self):
+        return int(self.header[0])
+
+    @property
+    def lsl_clock_offset(self):
+        """LSL clock offset applied by the writer to the last chunk"""
+        return float(self.header[1:2].view(np.float64)[0])
+
+    def write(self, data, times, lsl_times, lsl_clock_offset=np.nan):
+        """Writes a chunk of samples. Only one writer is allowed. The LSL
+        clock offset applied to the chunk, if known, is published for the
+        telemetry of the readers.
+        """
+        n = len(times)
+        if n == 0:
+            return
+        self.header[1:2].view(np.float64)[0] = lsl_clock_offset
+        if n > self.capacity:
+            data = data[-self.capacity:]
+            times = times[-self.capacity:]
+            lsl_times = lsl_times[-self.capacity:]
+            head = self.n_written + n - self.capacity
+            n = self.capacity
+        else:
+            head = self.n_written
+        # Copy data (in 2 steps if the chunk wraps around the end)
+        start = head % self.capacity
+        n1 = min(n, self.capacity - start)
+        self.data[start:start + n1] = data[:n1]
+        self.times[start:start + n1] = times[:n1]
+        self.lsl_times[start:start + n1] = lsl_times[:n1]
+        if n1 < n:
+            self.data[:n - n1] = data[n1:]
+            self.times[:n - n1] = times[n1:]
+            self.lsl_times[:n - n1] = lsl_times[n1:]
+        # Publish the new samples once they have been copied
+        self.header[0] = head + n
+
+    def read(self, cursor, max_samples=None):
+        """Reads the samples written after cursor.
+
+        Parameters
+        ----------
+        cursor: int
+            Absolute index of the first sample to read
+        max_samples: int or None
+            Maximum number of samples to read. If None, all the available
+            samples are returned.
+
+        Returns
+        -------
+        data: np.ndarray
+            Copy of the samples with shape [n_samples x n_cha]
+        times: np.ndarray
+            Copy of the local timestamps
+        lsl_times: np.ndarray
+            Copy of the LSL timestamps
+        cursor: int
+            Updated cursor
+        n_lost: int
+            Number of samples that were overwritten before being read
+        """
+        head = self.n_written
+        n_lost = max(head - self.capacity - cursor, 0)
+        cursor += n_lost
+        n = head - cursor
+        if max_samples is not None:
+            n = min(n, max_samples)
+        idx = np.arange(cursor, cursor + n) % self.capacity
+        data = self.data[idx]
+        times = self.times[idx]
+        lsl_times = self.lsl_times[idx]
+        # Discard the samples that were overwritten while copying
+        overwritten = max(self.n_written - self.capacity - cursor, 0)
+        if overwritten > 0:
+            overwritten = min(overwritten, n)
+            data = data[overwritten:]
+            times = times[overwritten:]
+            lsl_times = lsl_times[overwritten:]
+            n_lost += overwritten
+        return data, times, lsl_times, cursor + n, n_lost
+
+    def close(self):
+        """Releases the views and closes the access to the shared block. The
+        owner also destroys the block."""
+        self.header = None
+        self.times = None
+        self.lsl_times = None
+        self.data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class StreamHubReader:
+    """Reads the samples of a stream from the shared ring buffer of a
+    StreamHub. It implements the same interface as LSLStreamReceiver (i.e.,
+    get_chunk and flush_stream), so it can be used by LSLStreamAppWorker and
+    RealTimePlotWorker without changes. Each reader keeps its own cursor, so
+    several readers of the same stream do not interfere with each other.
+    """
+
+    def __init__(self, ring_descriptor, lsl_stream_mds, min_chunk_size=None,
+                 max_chunk_size=None, timeout=None, telemetry_capacity=4096,
+                 deadline=None, medusa_interface=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        ring_descriptor: dict
+            Descriptor of the shared ring buffer (see
+            SharedRingBuffer.get_descriptor)
+        lsl_stream_mds: LSLStreamWrapper
+            Medusa representation of the LSL stream. The inlet is not
+            needed, since the data is received by the hub.
+        min_chunk_size: int or None
+            Min chunk size to receive. If None, it will be set automatically.
+        max_chunk_size: int or None
+            Max chunk size to receive. If None, it will be set automatically.
+        timeout: int or None
+            Timeout in seconds.If None, it will be set automatically.
+        telemetry_capacity: int
+            Number of chunks kept in the synchronization telemetry ring (see
+            buffers.TelemetryRing)
+        deadline: float or None
+            Low-latency mode (see LSLStreamReceiver). If not None, max time
+            in seconds that the available samples wait for the rest of
+            min_chunk_size.
+        medusa_interface: resources.MedusaInterface or None
+            If not None, a warning is logged the first time the reader falls
+            behind the ring buffer and samples are lost
+        """
+        self.TAG = '[StreamHubReader] '
+        self.ring = SharedRingBuffer.from_descriptor(ring_descriptor)
+        self.lsl_stream = lsl_stream_mds
+        # Copy some attributes from lsl stream info for direct access
+        self.name = self.lsl_stream.medusa_uid
+        self.fs = self.lsl_stream.fs
+        self.n_cha = self.lsl_stream.n_cha
+        self.l_cha = self.lsl_stream.l_cha
+        self.info_cha = self.lsl_stream.cha_info
+        self.idx_cha = self.lsl_stream.selected_channels_idx
+        # Same default values as LSLStreamReceiver
+        if min_chunk_size is None:
+            min_chunk_size = max(int(0.01 * self.fs), 1)
+        self.min_chunk_size = min_chunk_size
+        if max_chunk_size is None:
+            max_chunk_size = max(int(2 * self.min_chunk_size), int(self.fs))
+        self.max_chunk_size = max_chunk_size
+        if timeout is None:
+            timeout = 1.5 * self.max_chunk_size / self.fs \
+                if self.fs > 0 else np.inf
+        self.timeout = timeout
+        # Polling interval while waiting for new samples
+        self.poll_interval = min(max(
+            0.25 * self.min_chunk_size / self.fs, 0.0005), 0.01) \
+            if self.fs > 0 else 0.01
+        self.deadline = deadline
+        self.medusa_interface = medusa_interface
+        if deadline is not None:
+            self.poll_interval = min(self.poll_interval,
+                                     max(deadline / 2, 0.0005))
+        # Reader state
+        self.cursor = self.ring.n_written
+        self.chunk_counter = 0
+        self.sample_counter = 0
+        self.lost_samples = 0
+        self.telemetry = buffers.TelemetryRing(telemetry_capacity)
+
+    def get_chunk(self):
+        """Get signal chunk. Throws an error if the reception time exceeds
+        the timeout
+        """
+        start = time.time()
+        t_first = None
+        while True:
+            n_available = self.ring.n_written - self.cursor
+            if n_available >= self.min_chunk_size:
+                break
+            now = time.time()
+            if self.deadline is not None and n_available > 0:
+                # The samples may have been written during the last sleep
+                if t_first is None:
+                    t_first = now - self.poll_interval
+                if now - t_first >= self.deadline:
+                    break
+            if now - start > self.timeout:
+                raise exceptions.LSLStreamTimeout()
+            time.sleep(self.poll_interval)
+        data, times, lsl_times, self.cursor, n_lost = \
+            self.ring.read(self.cursor)
+        if n_lost > 0:
+            if self.lost_samples == 0 and self.medusa_interface is not None:
+                self.medusa_interface.log(
+                    msg='%s: the reader fell behind the stream hub and %i '
+                        'samples were overwritten before being read. '
+                        'Further losses are only counted.' %
+                        (self.name, n_lost),
+                    style='warning')
+            self.lost_samples += n_lost
+        self.chunk_counter += 1
+        self.sample_counter += len(times)
+        # Synchronization telemetry. The LSL clock offset has already been
+        # applied by the receiver of the hub, which publishes it in the ring
+        if len(times) > 0:
+            self.telemetry.append(time.time(), times[-1] - lsl_times[-1],
+                                  self.ring.lsl_clock_offset, len(times))
+        return data, times, lsl_times
+
+    def flush_stream(self):
+        """Discards the samples that have not been read yet"""
+        self.cursor = self.ring.n_written
+
+    def get_historic_offsets(self):
+        """Returns the Unix and LSL clock offsets of the last chunks. The
+        LSL clock offsets are the ones applied by the receiver of the hub to
+        the last chunk written in the ring when each chunk is read."""
+        records = self.telemetry.get_records()
+        return records['unix_clock_offset'], records['lsl_clock_offset']
+
+    def get_telemetry(self):
+        """Returns the synchronization telemetry of the last received
+        chunks as a dict of lists (see buffers.TelemetryRing)"""
+        return self.telemetry.to_dict()
+
+    def close(self):
+        self.ring.close()
+
+
+class StreamHubWorker(th.Thread):
+    """Thread of the StreamHub that receives the samples of one LSL stream and
+    writes them in the shared ring buffer"""
+
+    def __init__(self, receiver, ring, medusa_interface=None):
+        super().__init__(name='StreamHubWorker-%s' % receiver.name,
+                         daemon=True)
+        self.receiver = receiver
+        self.ring = ring
+        self.medusa_interface = medusa_interface
+        self.stop = False
+
+    def handle_exception(self, ex):
+        if self.medusa_interface is not None:
+            self.medusa_interface.error(ex)
+
+    @exceptions.error_handler(def_importance='important', scope='acquisition')
+    def run(self):
+        self.receiver.flush_stream()
+        while not self.stop:
+            try:
+                chunk_data, chunk_times, chunk_lsl_times = \
+                    self.receiver.get_chunk()
+            except exceptions.LSLStreamTimeout:
+                continue
+            self.ring.write(chunk_data, chunk_times, chunk_lsl_times,
+                            self.receiver.lsl_clock_offset)
+
+
+class StreamHub:
+    """Owns one LSL inlet per working stream and fans out the received
+    samples to any number of readers (e.g., real time plots and apps) through
+    shared ring buffers. This avoids opening a new inlet for each consumer of
+    the same stream.
+
+    The hub receives data only while it has users. Call acquire before
+    starting to read and release when finished.
+    """
+
+    def __init__(self, lsl_streams, buffer_time=30, medusa_interface=None):
+        """Class constructor
+
+        Parameters
+        ----------
+        lsl_streams: list of LSLStreamWrapper
+            Working LSL streams with the inlet and medusa params initialized
+        buffer_time: float
+            Time in seconds stored in each ring buffer. Readers that fall
+            behind more than this time will lose samples.
+        medusa_interface: resources.MedusaInterface or None
+            Interface to the main gui of medusa
+        """
+        self.lsl_streams = dict()
+        self.rings = dict()
+        self.workers = dict()
+        self.buffer_time = buffer_time
+        self.medusa_interface = medusa_interface
+        self.n_users = 0
+        self.lock = th.Lock()
+        for lsl_stream in lsl_streams:
+            dtype = lsl_utils.get_lsl_channel_format_dtype(
+                lsl_stream.lsl_cha_format)
+            if dtype is None:
+                # String streams are not supported
+                continue
+            capacity = max(int(buffer_time * lsl_stream.fs), 4096)
+            self.lsl_streams[lsl_stream.medusa_uid] = lsl_stream
+            self.rings[lsl_stream.medusa_uid] = SharedRingBuffer(
+                n_cha=lsl_stream.n_cha, capacity=capacity, dtype=dtype)
+
+    def has_stream(self, medusa_uid):
+        return medusa_uid in self.rings
+
+    def is_running(self):
+        return len(self.workers) > 0
+
+    def acquire(self):
+        """Registers a new user of the hub, starting the reception if
+        needed"""
+        with self.lock:
+            self.n_users += 1
+            if not self.is_running():
+                self.__start()
+
+    def release(self):
+        """Unregisters a user of the hub, stopping the reception if there are
+        no users left"""
+        with self.lock:
+            self.n_users = max(self.n_users - 1, 0)
+            if self.n_users == 0 and self.is_running():
+                self.__stop()
+
+    def open_reader(self, medusa_uid, **kwargs):
+        """Returns a new StreamHubReader for the stream medusa_uid in this
+        process. Additional keyword arguments are passed to the reader
+        constructor.
+        """
+        return StreamHubReader(self.get_ring_descriptor(medusa_uid),
+                               self.lsl_streams[medusa_uid], **kwargs)
+
+    def get_ring_descriptor(self, medusa_uid):
+        """Returns the descriptor of the ring buffer of a stream. Pass it to
+        other processes to create a StreamHubReader there.
+        """
+        return self.rings[medusa_uid].get_descriptor()
+
+    def close(self):
+        """Stops the reception and destroys the ring buffers"""
+        with self.lock:
+            if self.is_running():
+                self.__stop()
+            self.n_users = 0
+            for ring in self.rings.values():
+                ring.close()
+            self.rings = dict()
+
+    def __start(self):
+        for medusa_uid, lsl_stream in self.lsl_streams.items():
+            receiver = lsl_utils.LSLStreamReceiver(lsl_stream)
+            worker = StreamHubWorker(receiver, self.rings[medusa_uid],
+                                     self.medusa_interface)
+            worker.start()
+            self.workers[medusa_uid] = worker
+
+    def __stop(self):
+        for worker in self.workers.values():
+            worker.stop = True
+        for worker in self.workers.values():
+            worker.join()
+        self.workers = dict()
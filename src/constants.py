@@ -50,6 +50,8 @@ APPS_CONFIG_FILE = 'apps_config.json'
 GUI_CONFIG_FILE = 'gui_config.json'
 STUDIES_CONFIG_FILE = 'studies_config.json'
 ACCOUNTS_DIR = 'accounts'
+# Spill files of long recordings (see resources.AppSkeleton)
+RECORDING_SPILL_DIR = 'recordings_spill'
 
 # Images folder
 IMG_FOLDER = 'gui/images'
@@ -33,13 +33,15 @@ class AppsPanelWidget(QWidget, ui_plots_panel_widget):
 
     def __init__(self, apps_manager, working_lsl_streams, app_state, run_state,
                  medusa_interface, apps_folder, study_mode, dev_mode,
-                 theme_colors):
+                 theme_colors, stream_hub=None):
         super().__init__()
         self.setupUi(self)
         # Attributes
         self.screen_size = self.screen().geometry().size()
         self.apps_manager = apps_manager
         self.working_lsl_streams = working_lsl_streams
+        self.stream_hub = stream_hub
+        self.stream_hub_acquired = False
         self.app_state = app_state
         self.run_state = run_state
         self.medusa_interface = medusa_interface
@@ -276,8 +278,18 @@ class AppsPanelWidget(QWidget, ui_plots_panel_widget):
             self.apps_panel_grid_widget.width())
 
     @exceptions.error_handler(scope='general')
-    def update_working_lsl_streams(self, working_lsl_streams):
+    def update_working_lsl_streams(self, working_lsl_streams,
+                                   stream_hub=None):
         self.working_lsl_streams = working_lsl_streams
+        self.stream_hub = stream_hub
+        self.stream_hub_acquired = False
+
+    @exceptions.error_handler(scope='general')
+    def release_stream_hub(self):
+        """Releases the stream hub when the app is closed"""
+        if self.stream_hub is not None and self.stream_hub_acquired:
+            self.stream_hub.release()
+        self.stream_hub_acquired = False
 
     @exceptions.error_handler(scope='general')
     def resizeEvent(self, event):
@@ -332,9 +344,20 @@ class AppsPanelWidget(QWidget, ui_plots_panel_widget):
             # Get app settings
             if self.app_settings is None or not same_sett_type:
                 self.app_settings = app_settings_mdl.Settings()
-            # Serialize working_lsl_streams
-            ser_lsl_streams = [lsl_str.to_serializable_obj() for
-                               lsl_str in self.working_lsl_streams]
+            # Serialize working_lsl_streams. The streams available in the
+            # stream hub are read from its shared buffers
+            ser_lsl_streams = list()
+            for lsl_str in self.working_lsl_streams:
+                ser_lsl_str = lsl_str.to_serializable_obj()
+                if self.stream_hub is not None and \
+                        self.stream_hub.has_stream(lsl_str.medusa_uid):
+                    ser_lsl_str['stream_hub_ring'] = \
+                        self.stream_hub.get_ring_descriptor(
+                            lsl_str.medusa_uid)
+                ser_lsl_streams.append(ser_lsl_str)
+            if self.stream_hub is not None and not self.stream_hub_acquired:
+                self.stream_hub.acquire()
+                self.stream_hub_acquired = True
             # Get app manager
             self.app_process = app_process_mdl.App(
                 app_info=self.apps_manager.apps_dict[current_app_key],
@@ -1,10 +1,12 @@
 # Built-in imports
 import copy
 import sys, os, json, traceback, math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 # External imports
 from PySide6.QtUiTools import loadUiType
 from PySide6 import QtGui, QtWidgets
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QObject, Signal
 import pylsl
 # Medusa imports
 from gui import gui_utils as gu
@@ -69,6 +71,7 @@ class LSLConfigDialog(QtWidgets.QDialog, ui_main_dialog):
             # First search
             self.lsl_config = lsl_config
             self.available_streams = []
+            self.inlet_opener = None
             self.init_listwidget_working_streams()
             self.lsl_search(first_search=True)
             self.lsl_config_file_path = lsl_config_file_path
@@ -130,38 +133,44 @@ class LSLConfigDialog(QtWidgets.QDialog, ui_main_dialog):
             self.handle_exception(e)
 
     def lsl_search(self, first_search=False):
-        """This function searches for available LSL streams.
+        """This function searches for available LSL streams. The inlets are
+        opened concurrently in the background, and each stream is added to
+        the table as soon as it is ready.
         """
         try:
+            # Cancel the previous search
+            self.cancel_lsl_search()
             # Clear listWidget
             self.tableWidget_available_streams.setRowCount(0)
+            self.available_streams = []
             # Search streams
             streams = lsl_utils.get_lsl_streams()
-            # There are streams available
-            self.available_streams = []
-            for s, lsl_stream in enumerate(streams):
-                try:
-                    lsl_stream_wrapper = lsl_utils.LSLStreamWrapper(lsl_stream)
-                    lsl_stream_wrapper.set_inlet(
-                        proc_clocksync=False, proc_dejitter=False,
-                        proc_monotonize=False, proc_threadsafe=True)
-                    self.insert_available_stream_in_table(lsl_stream_wrapper)
-                    self.available_streams.append(lsl_stream_wrapper)
-                except pylsl.util.TimeoutError:
-                    ex = exceptions.LSLStreamTimeout(
-                        "An LSL stream outlet was detected, but the stream "
-                        "information could not be retrieved. Possible causes "
-                        "include incorrect network configuration, a missing or "
-                        "inactive stream source, or firewall restrictions. "
-                        "Please check your network settings and ensure the "
-                        "stream source is active.")
-                    self.handle_exception(ex)
+            # Open the inlets in the background
+            self.inlet_opener = LSLInletOpener()
+            self.inlet_opener.stream_ready.connect(
+                self.on_available_stream_ready)
+            self.inlet_opener.stream_error.connect(self.handle_exception)
+            self.inlet_opener.start(streams)
         except exceptions.LSLStreamNotFound as e:
             if not first_search:
                 self.handle_exception(e)
         except Exception as e:
             self.handle_exception(e)
 
+    def cancel_lsl_search(self):
+        """Discards the streams of the current search that are not ready
+        yet"""
+        if self.inlet_opener is not None:
+            self.inlet_opener.cancel()
+            self.inlet_opener = None
+
+    def on_available_stream_ready(self, lsl_stream_wrapper):
+        try:
+            self.insert_available_stream_in_table(lsl_stream_wrapper)
+            self.available_streams.append(lsl_stream_wrapper)
+        except Exception as e:
+            self.handle_exception(e)
+
     def add_lsl_stream(self):
         try:
             sel_item_row = self.get_selected_available_stream()
@@ -300,6 +309,7 @@ class LSLConfigDialog(QtWidgets.QDialog, ui_main_dialog):
         """ This function updates the lsl_streams.json file and saves it
         """
         try:
+            self.cancel_lsl_search()
             super().accept()
             lsl_config = dict(self.lsl_config)
             with open(self.lsl_config_file_path, 'w') as f:
@@ -313,6 +323,7 @@ class LSLConfigDialog(QtWidgets.QDialog, ui_main_dialog):
     def reject(self):
         """ This function cancels the configuration"""
         try:
+            self.cancel_lsl_search()
             super().reject()
         except Exception as e:
             self.handle_exception(e)
@@ -322,6 +333,70 @@ class LSLConfigDialog(QtWidgets.QDialog, ui_main_dialog):
         dialogs.error_dialog(str(ex), ex.__class__.__name__, self.theme_colors)
 
 
+class LSLInletOpener(QObject):
+    """Opens the inlets of several LSL streams concurrently in a thread pool,
+    so the GUI thread is not blocked and a slow stream does not delay the
+    others. The signals are emitted from the pool threads as each stream
+    finishes, and Qt delivers them in the thread of the receiver (i.e.,
+    the GUI thread).
+    """
+    stream_ready = Signal(object)
+    stream_error = Signal(object)
+
+    def __init__(self, timeout=2.0, max_workers=16):
+        """Class constructor
+
+        Parameters
+        ----------
+        timeout: float
+            Timeout in seconds to retrieve the information of each stream
+        max_workers: int
+            Max number of inlets opened at the same time
+        """
+        super().__init__()
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cancel_event = threading.Event()
+
+    def start(self, lsl_streams):
+        """Starts opening the inlets of the given pylsl.StreamInfo objects.
+        The method returns immediately."""
+        if len(lsl_streams) == 0:
+            return
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(lsl_streams), self.max_workers),
+            thread_name_prefix='LSLInletOpener')
+        for lsl_stream in lsl_streams:
+            executor.submit(self.__open_inlet, lsl_stream)
+        # The pool threads finish when all the inlets are opened
+        executor.shutdown(wait=False)
+
+    def cancel(self):
+        """The streams that are not ready yet will not be emitted"""
+        self.cancel_event.set()
+
+    def __open_inlet(self, lsl_stream):
+        try:
+            lsl_stream_wrapper = lsl_utils.LSLStreamWrapper(lsl_stream)
+            lsl_stream_wrapper.set_inlet(
+                proc_clocksync=False, proc_dejitter=False,
+                proc_monotonize=False, proc_threadsafe=True,
+                timeout=self.timeout)
+            signal, arg = self.stream_ready, lsl_stream_wrapper
+        except pylsl.util.TimeoutError:
+            signal, arg = self.stream_error, exceptions.LSLStreamTimeout(
+                "An LSL stream outlet was detected, but the stream "
+                "information could not be retrieved. Possible causes "
+                "include incorrect network configuration, a missing or "
+                "inactive stream source, or firewall restrictions. "
+                "Please check your network settings and ensure the "
+                "stream source is active.")
+        except Exception as e:
+            signal, arg = self.stream_error, e
+        if not self.cancel_event.is_set():
+            signal.emit(arg)
+
+
 class EditStreamDialog(QtWidgets.QDialog, ui_stream_config_dialog):
 
     def __init__(self, lsl_stream_info, working_lsl_streams, editing=False,
@@ -15,7 +15,7 @@ import resources, exceptions, accounts_manager, app_manager
 import updates_manager
 import utils
 from gui import gui_utils as gu
-from acquisition import lsl_utils
+from acquisition import lsl_utils, lsl_resolver, stream_hub
 from gui.plots_panel import plots_panel
 from gui.lsl_config import lsl_config
 from gui.create_app import create_app
@@ -86,8 +86,13 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
         self.build_layout()
         self.set_theme()
 
+        # Start resolving LSL streams in the background, so the streams are
+        # already indexed when the LSL config is loaded
+        lsl_resolver.get_resolver()
+
         # Reset panels
         self.lsl_config = None
+        self.stream_hub = None
         self.box_studies_panel = None
         self.studies_panel_widget = None
         self.apps_manager = None
@@ -485,6 +490,18 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
             self.lsl_config['working_streams'] = list()
         # Update menu action
         self.update_menu_action_lsl_search_mode()
+        # Stream hub shared by plots and apps
+        self.set_up_stream_hub()
+
+    @exceptions.error_handler(scope='general')
+    def set_up_stream_hub(self):
+        """Creates the stream hub that receives the working LSL streams and
+        shares them with the plots and apps, closing the previous one"""
+        if self.stream_hub is not None:
+            self.stream_hub.close()
+        self.stream_hub = stream_hub.StreamHub(
+            self.lsl_config['working_streams'],
+            medusa_interface=self.medusa_interface)
 
     @exceptions.error_handler(scope='general')
     def set_up_apps_panel(self):
@@ -497,7 +514,8 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
             self.accounts_manager.wrap_path('apps'),
             self.gui_config['study_mode'],
             self.gui_config['dev_mode'],
-            self.theme_colors)
+            self.theme_colors,
+            stream_hub=self.stream_hub)
         # Connect signals
         self.apps_panel_widget.error_signal.connect(
             self.handle_exception)
@@ -521,7 +539,8 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
             self.plot_state,
             self.medusa_interface,
             self.accounts_manager.wrap_path(constants.PLOTS_CONFIG_FILE),
-            self.theme_colors)
+            self.theme_colors,
+            stream_hub=self.stream_hub)
         # Clear layout
         while self.box_plots_panel.layout().count():
             child = self.box_plots_panel.layout().takeAt(0)
@@ -797,11 +816,12 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
     def set_lsl_streams(self):
         # Set working streamsicon.png
         self.lsl_config = self.lsl_config_window.lsl_config
+        self.set_up_stream_hub()
         # Update the working streams within the panels
         self.plots_panel_widget.update_lsl_config(
-            self.lsl_config)
+            self.lsl_config, self.stream_hub)
         self.apps_panel_widget.update_working_lsl_streams(
-            self.lsl_config['working_streams'])
+            self.lsl_config['working_streams'], self.stream_hub)
         # Print log info
         for lsl_stream_info in self.lsl_config['working_streams']:
             self.print_log('Connected to LSL stream: %s' %
@@ -1025,6 +1045,7 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
             self.apps_panel_widget.reset_tool_bar_app_buttons()
             self.on_run_state_changed(constants.RUN_STATE_READY)
             self.set_status('Ready')
+            self.apps_panel_widget.release_stream_hub()
             print('[GUiMain.on_app_state_changed]: APP_STATE_OFF')
         elif app_state_value == constants.APP_STATE_POWERING_ON:
             self.app_state.value = app_state_value
@@ -1212,6 +1233,11 @@ class GuiMainClass(QMainWindow, gui_main_user_interface):
             # Close log panel
             if self.log_panel_widget.undocked:
                 self.log_panel_window.close()
+            # Close stream hub
+            if self.stream_hub is not None:
+                self.stream_hub.close()
+            # Stop the background LSL resolver
+            lsl_resolver.stop_resolver()
             # Close medusa interface queue
             self.medusa_interface_listener.terminate()
             self.interface_queue.close()
@@ -14,7 +14,7 @@ from medusa.settings_schema import *
 from gui.plots_panel import plots_panel_config, real_time_plots
 import constants, exceptions
 from gui.qt_widgets import dialogs
-from acquisition import lsl_utils
+from acquisition import lsl_utils, latency
 from gui import gui_utils as gu
 
 
@@ -22,11 +22,13 @@ class PlotsPanelWidget(QWidget):
     """ This widget implements the logic behind the plots panel.
     """
     def __init__(self, lsl_config, plot_state, medusa_interface,
-                 plots_config_file_path, theme_colors):
+                 plots_config_file_path, theme_colors, stream_hub=None):
         super().__init__()
 
         # Attributes
         self.lsl_config = lsl_config
+        self.stream_hub = stream_hub
+        self.stream_hub_acquired = False
         self.plot_state = plot_state
         self.medusa_interface = medusa_interface
         self.theme_colors = theme_colors
@@ -38,10 +40,14 @@ class PlotsPanelWidget(QWidget):
         self.toolButton_plot_start = QToolButton()
         self.toolButton_plot_config = QToolButton()
         self.toolButton_plot_undock = QToolButton()
+        self.toolButton_plot_latency = QToolButton()
+        self.label_plot_latency = QLabel()
         toolbar_layout.addWidget(self.toolButton_plot_start)
         toolbar_layout.addWidget(self.toolButton_plot_config)
         toolbar_layout.addItem(QSpacerItem(
             0, 0, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        toolbar_layout.addWidget(self.label_plot_latency)
+        toolbar_layout.addWidget(self.toolButton_plot_latency)
         toolbar_layout.addWidget(self.toolButton_plot_undock)
         main_layout.addLayout(toolbar_layout)
         # Grid layout
@@ -49,6 +55,10 @@ class PlotsPanelWidget(QWidget):
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
         main_layout.addWidget(self.tab_widget)
         self.setLayout(main_layout)
+        # Timer to refresh the glass-to-glass latency of the plots
+        self.latency_timer = QTimer(self)
+        self.latency_timer.setInterval(1000)
+        self.latency_timer.timeout.connect(self.update_latency_label)
         # Set up
         self.set_up_tool_bar_plot()
         # Initial configuration
@@ -107,6 +117,10 @@ class PlotsPanelWidget(QWidget):
         self.toolButton_plot_config.setIcon(
             gu.get_icon("settings.svg", self.theme_colors))
         self.toolButton_plot_config.setToolTip('Configure plots')
+        self.toolButton_plot_latency.setIcon(
+            gu.get_icon("download.svg", self.theme_colors))
+        self.toolButton_plot_latency.setToolTip(
+            'Export latency histograms')
         if self.undocked:
             self.toolButton_plot_undock.setIcon(
                 gu.get_icon("open_in_new_down.svg", self.theme_colors))
@@ -125,10 +139,13 @@ class PlotsPanelWidget(QWidget):
         # Connect signals
         self.toolButton_plot_start.clicked.connect(self.plot_start)
         self.toolButton_plot_config.clicked.connect(self.open_plots_panel_config_dialog)
+        self.toolButton_plot_latency.clicked.connect(self.export_latency)
 
     @exceptions.error_handler(scope='plots')
-    def update_lsl_config(self, lsl_config):
+    def update_lsl_config(self, lsl_config, stream_hub=None):
         self.lsl_config = lsl_config
+        self.stream_hub = stream_hub
+        self.stream_hub_acquired = False
         self.update_plots_panel()
 
     @exceptions.error_handler(scope='plots')
@@ -224,20 +241,29 @@ class PlotsPanelWidget(QWidget):
                                 channel_count=dict_data['lsl_n_cha'],
                                 nominal_srate=dict_data['fs']
                             )
-                        # New instance to avoid pulling data from the same stream
-                        # for several plots
-                        lsl_stream = lsl_utils.LSLStreamWrapper(
-                            working_lsl_stream.lsl_stream)
-                        lsl_stream.set_inlet(
-                            proc_clocksync=working_lsl_stream.lsl_proc_clocksync,
-                            proc_dejitter=working_lsl_stream.lsl_proc_dejitter,
-                            proc_monotonize=working_lsl_stream.lsl_proc_monotonize,
-                            proc_threadsafe=working_lsl_stream.lsl_proc_threadsafe)
-                        lsl_stream.update_medusa_parameters_from_lslwrapper(
-                                        working_lsl_stream)
-                        # Set receiver
-                        tab_plots_handlers[plot_uid].set_lsl_worker(
-                            lsl_stream)
+                        if self.stream_hub is not None and \
+                                self.stream_hub.has_stream(
+                                    working_lsl_stream.medusa_uid):
+                            # The plot reads the stream from the hub,
+                            # which shares the inlet with other plots and apps
+                            tab_plots_handlers[plot_uid].set_lsl_worker(
+                                working_lsl_stream,
+                                stream_hub=self.stream_hub)
+                        else:
+                            # New instance to avoid pulling data from the
+                            # same stream for several plots
+                            lsl_stream = lsl_utils.LSLStreamWrapper(
+                                working_lsl_stream.lsl_stream)
+                            lsl_stream.set_inlet(
+                                proc_clocksync=working_lsl_stream.lsl_proc_clocksync,
+                                proc_dejitter=working_lsl_stream.lsl_proc_dejitter,
+                                proc_monotonize=working_lsl_stream.lsl_proc_monotonize,
+                                proc_threadsafe=working_lsl_stream.lsl_proc_threadsafe)
+                            lsl_stream.update_medusa_parameters_from_lslwrapper(
+                                            working_lsl_stream)
+                            # Set receiver
+                            tab_plots_handlers[plot_uid].set_lsl_worker(
+                                lsl_stream)
                         # Init plot
                         tab_plots_handlers[plot_uid].init_plot_common()
                         tab_plots_handlers[plot_uid].set_ready()
@@ -306,6 +332,8 @@ class PlotsPanelWidget(QWidget):
                 tab.deleteLater()
         # Reset plot handlers
         self.plots_handlers.clear()
+        self.label_plot_latency.setText('')
+        self.label_plot_latency.setToolTip('')
 
     @exceptions.error_handler(scope='plots')
     def plot_start(self, checked=None):
@@ -316,7 +344,12 @@ class PlotsPanelWidget(QWidget):
             # Update plot state. This will notify the action directly if
             # the plots are undocked
             self.plot_state.value = constants.PLOT_STATE_ON
+            # Start receiving the streams shared through the hub
+            if self.stream_hub is not None and not self.stream_hub_acquired:
+                self.stream_hub.acquire()
+                self.stream_hub_acquired = True
             # Start plot
+            self.latency_timer.start()
             n_ready_plots = 0
             for tab_plots_handlers in self.plots_handlers:
                 for uid, plot_handler in tab_plots_handlers.items():
@@ -346,6 +379,11 @@ class PlotsPanelWidget(QWidget):
                 # The change of state will notify the action directly
                 # if the plots are undocked
                 self.plot_state.value = constants.PLOT_STATE_OFF
+                self.latency_timer.stop()
+                self.update_latency_label()
+                if self.stream_hub is not None and self.stream_hub_acquired:
+                    self.stream_hub.release()
+                    self.stream_hub_acquired = False
                 # self.reset_plots()
                 # Update gui
                 icon_dock = "open_in_new.svg" if self.undocked else "close.svg"
@@ -358,6 +396,87 @@ class PlotsPanelWidget(QWidget):
                 self.toolButton_plot_start.setIcon(
                     gu.get_icon("visibility.svg", self.theme_colors))
 
+    def get_ready_plots(self):
+        """Returns the ready plot handlers of all tabs"""
+        plots = list()
+        for tab_plots_handlers in self.plots_handlers:
+            for uid, plot_handler in tab_plots_handlers.items():
+                if plot_handler.ready and plot_handler not in plots:
+                    plots.append(plot_handler)
+        return plots
+
+    @exceptions.error_handler(scope='plots')
+    def update_latency_label(self):
+        """Shows the glass-to-glass latency (from the timestamp of the
+        samples to the blit of the plot) of the slowest plot, and the
+        latency of each plot and stage in the tooltip"""
+        worst_stats = None
+        tooltip = list()
+        for plot_handler in self.get_ready_plots():
+            stats = plot_handler.get_latency_stats()
+            g2g_stats = stats[latency.PLOT_LATENCY_STAGES[-1]]
+            if g2g_stats['n'] == 0:
+                continue
+            if worst_stats is None or g2g_stats['p95'] > worst_stats['p95']:
+                worst_stats = g2g_stats
+            tooltip.append('Plot %i (%s)' % (
+                plot_handler.uid,
+                plot_handler.lsl_stream_info.lsl_stream.name()))
+            for stage, stage_stats in stats.items():
+                if stage_stats['n'] == 0:
+                    continue
+                tooltip.append('    %s: %s' % (
+                    stage, self.format_latency(stage_stats)))
+        if worst_stats is None:
+            self.label_plot_latency.setText('')
+            self.label_plot_latency.setToolTip('')
+            return
+        self.label_plot_latency.setText(
+            'Latency %s' % self.format_latency(worst_stats))
+        self.label_plot_latency.setToolTip(
+            'Latency from the timestamps of the samples (p50 / p95 / p99)'
+            '\n\n' + '\n'.join(tooltip))
+
+    @staticmethod
+    def format_latency(stats):
+        return '%.1f / %.1f / %.1f ms' % (
+            1000 * stats['p50'], 1000 * stats['p95'], 1000 * stats['p99'])
+
+    @exceptions.error_handler(scope='plots')
+    def export_latency(self, checked=None):
+        """Saves the latency histograms of each stage of all plots in a
+        json file"""
+        plots = self.get_ready_plots()
+        if len(plots) == 0:
+            dialogs.error_dialog('There are no plots running. Please, '
+                                 'start plotting before exporting the '
+                                 'latency', 'No plots')
+            return
+        file_path = QFileDialog.getSaveFileName(
+            caption='Export latency histograms', dir='../data',
+            filter='JSON (*.json)')[0]
+        if file_path == '':
+            return
+        latency_dict = {
+            'export_time': time.time(),
+            'stages': list(latency.PLOT_LATENCY_STAGES),
+            'plots': list()
+        }
+        for plot_handler in plots:
+            plot_dict = plot_handler.pipeline_latency.to_dict()
+            plot_dict.update({
+                'uid': plot_handler.uid,
+                'plot_type': type(plot_handler).__name__,
+                'lsl_stream_name':
+                    plot_handler.lsl_stream_info.lsl_stream.name(),
+                'fs': float(plot_handler.fs)
+            })
+            latency_dict['plots'].append(plot_dict)
+        with open(file_path, 'w') as f:
+            json.dump(latency_dict, f, indent=4)
+        self.medusa_interface.log('Latency histograms saved in %s' %
+                                  file_path)
+
     # @exceptions.error_handler(scope='plots')
     # def reset_plots(self):
     #     # Reset the plots
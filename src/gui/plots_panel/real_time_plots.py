@@ -15,7 +15,7 @@ from matplotlib.cm import get_cmap
 from matplotlib import transforms as mtransforms
 
 # MEDUSA-PLATFORM MODULES
-from acquisition import lsl_utils
+from acquisition import lsl_utils, latency
 from gui import gui_utils
 import constants, exceptions
 
@@ -418,6 +418,9 @@ class RealTimePlot(ABC):
         # Blitting
         self._bg_cache = None
         self._cached_elements = None
+        # Latency from the timestamps of the samples to the screen
+        self.pipeline_latency = latency.PipelineLatency(
+            latency.PLOT_LATENCY_STAGES)
         # Init widget
         self.init_widget()
 
@@ -432,13 +435,16 @@ class RealTimePlot(ABC):
         self.signal_settings = signal_settings
         self.visualization_settings = plot_settings
 
-    def set_lsl_worker(self, lsl_stream_info):
+    def set_lsl_worker(self, lsl_stream_info, stream_hub=None):
         """Create a new lsl worker for each plot
 
         Parameters
         ----------
         lsl_stream_info: lsl_utils.LSLStreamWrapper
             LSL stream (medusa wrapper)
+        stream_hub: stream_hub.StreamHub or None
+            If not None, the worker reads the stream from the hub instead
+            of pulling it from the inlet of lsl_stream_info
         """
         # Check signal
         self.check_signal(lsl_stream_info)
@@ -449,7 +455,8 @@ class RealTimePlot(ABC):
             self.plot_state,
             self.lsl_stream_info,
             self.signal_settings,
-            self.medusa_interface)
+            self.medusa_interface,
+            stream_hub=stream_hub)
         self.worker.update.connect(self.update_plot_common,
                                    type=Qt.BlockingQueuedConnection)
         self.worker.error.connect(self.handle_exception)
@@ -460,8 +467,15 @@ class RealTimePlot(ABC):
         return self.widget
 
     def start(self):
+        self.pipeline_latency.reset()
         self.worker.start()
 
+    def get_latency_stats(self):
+        """Returns the latency stats of each stage of the pipeline (see
+        latency.PLOT_LATENCY_STAGES). The stats of the last stage (blit)
+        are the glass-to-glass latency of the plot"""
+        return self.pipeline_latency.get_stats()
+
     def destroy_plot(self):
         # self.worker.wait()
         self.init_time = None
@@ -510,12 +524,14 @@ class RealTimePlot(ABC):
         self.n_cha = len(self.l_cha)
         self.cha_idx = [i for i, label in enumerate(
             self.lsl_stream_info.l_cha) if label in self.l_cha]
-        # Buffers
+        # Buffers. The samples are received in physical units (see
+        # RealTimePlotWorker), so float32 streams are kept in float32
+        dtype = self.lsl_stream_info.get_physical_dtype()
         self.times_buffer = np.zeros([0])
-        self.data_buffer = np.zeros([0, self.n_cha])
+        self.data_buffer = np.zeros([0, self.n_cha], dtype=dtype)
         # Plot data
         self.x_in_graph = np.zeros([0])
-        self.y_in_graph = np.zeros([0, self.n_cha])
+        self.y_in_graph = np.zeros([0, self.n_cha], dtype=dtype)
         # Set title
         self.set_title()
         # Set axis labels
@@ -615,6 +631,10 @@ class RealTimePlot(ABC):
         self.data_buffer = self.data_buffer[idx_to_keep, :]
 
     def update_plot_common(self, chunk_times, chunk_signal):
+        # Latency stamps of the worker. It is blocked until this function
+        # returns, so they correspond to this chunk
+        sample_time, stamps = self.worker.latency_stamps
+        stamps['emit'] = time.time()
         # Initial setup at first call
         if self.init_time is None:
             self.init_time = chunk_times[0]
@@ -622,9 +642,11 @@ class RealTimePlot(ABC):
         self.update_plot_buffers(chunk_times, chunk_signal)
         # Return if not visible to save resources
         if not self.widget.isVisible():
+            self.pipeline_latency.update(sample_time, stamps)
             return
         # Update plot data
         self.update_plot_data(chunk_times, chunk_signal)
+        stamps['data_update'] = time.time()
         # Restore static elements from cache if possible
         if self.check_if_redraw_needed():
             self.draw()
@@ -634,6 +656,8 @@ class RealTimePlot(ABC):
             self.widget.restore_region(self._bg_cache)
         # Draw animated elements
         self.update_plot_draw_animated_elements()
+        stamps['blit'] = time.time()
+        self.pipeline_latency.update(sample_time, stamps)
 
     def clear_plot(self):
         self.ax.clear()
@@ -2690,7 +2714,7 @@ class RealTimePlotWorker(QThread):
     error = Signal(Exception)
 
     def __init__(self, plot_state, lsl_stream_info, signal_settings,
-                 medusa_interface):
+                 medusa_interface, stream_hub=None):
         super().__init__()
         self.plot_state = plot_state
         self.lsl_stream_info = lsl_stream_info
@@ -2703,15 +2727,26 @@ class RealTimePlotWorker(QThread):
         min_chunk_size = int(self.update_rate * self.fs)
         min_chunk_size = max(min_chunk_size, 1)
         # Set receiver
-        self.receiver = lsl_utils.LSLStreamReceiver(
-            self.lsl_stream_info,
-            min_chunk_size=min_chunk_size)
+        if stream_hub is not None:
+            self.receiver = stream_hub.open_reader(
+                self.lsl_stream_info.medusa_uid,
+                min_chunk_size=min_chunk_size)
+        else:
+            self.receiver = lsl_utils.LSLStreamReceiver(
+                self.lsl_stream_info,
+                min_chunk_size=min_chunk_size)
+        # Scaling of the raw samples of integer streams
+        self.cha_gain, self.cha_offset = \
+            self.lsl_stream_info.get_cha_scaling()
         # Set real time preprocessor
         self.preprocessor = PlotsRealTimePreprocessor(self.signal_settings)
         self.preprocessor.fit(self.receiver.fs,
                               self.receiver.n_cha,
                               self.receiver.l_cha,
                               self.receiver.min_chunk_size)
+        # Timestamp of the newest sample and times at which the last chunk
+        # left each stage of the worker (see latency.PLOT_LATENCY_STAGES)
+        self.latency_stamps = None
 
     def handle_exception(self, ex):
         self.medusa_interface.error(ex)
@@ -2745,13 +2780,19 @@ class RealTimePlotWorker(QThread):
                             '%s. Trying to reconnect.' % self.receiver.name,
                         style='warning')
                     continue
+            pull_time = time.time()
+            sample_time = chunk_times[-1]
+            chunk_data = lsl_utils.to_physical_units(
+                chunk_data, self.cha_gain, self.cha_offset)
             chunk_times, chunk_data = self.preprocessor.transform(
                 chunk_times, chunk_data)
+            stamps = {'pull': pull_time, 'preprocess': time.time()}
             # print('Chunk received at: %.6f' % time.time())
             # Check if the plot is ready to receive data (sometimes get
             # chunk takes a while and the user presses the button in
             # between)
             if self.plot_state.value == constants.PLOT_STATE_ON:
+                self.latency_stamps = (sample_time, stamps)
                 self.update.emit(chunk_times, chunk_data)
 
 class PlotsRealTimePreprocessor:
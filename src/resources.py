@@ -2,7 +2,9 @@
 from abc import abstractmethod, ABC
 import multiprocessing as mp
 import threading as th
+import queue
 import os, time, json, math, re
+import shutil
 # EXTERNAL MODULES
 from PySide6.QtCore import *
 from PySide6.QtGui import *
@@ -13,7 +15,13 @@ from medusa import components
 from medusa import meeg, emg, nirs, ecg
 # MEDUSA-PLATFORM MODULES
 import constants, exceptions
-from acquisition import lsl_utils
+from acquisition import lsl_utils, buffers, stream_hub, gap_detection
+# The recording utilities and the acquisition process are imported here
+# for backward compatibility
+from acquisition.recording import get_biosignal_data_class, \
+    get_event_data_class, recover_recording, RecordingWriter
+from acquisition.acquisition_process import LSLAcquisitionProcess, \
+    LSLAcquisitionClient, LSLStreamAppWorkerProxy, LSLEventWorkerProxy
 from gui.qt_widgets import dialogs
 from gui import gui_utils
 
@@ -30,6 +38,8 @@ class AppSkeleton(mp.Process):
         2 - LSL workers. Each worker is a thread that receives and stores new
         samples of each LSL stream configured in medusa. This recordings are
         accessible from the manager thread to provide biodfeedback in real-time.
+        Optionally, the workers run in a separate acquisition process (see
+        lsl_acquisition_process).
         3 - Main process. Is the parent of the manager and lsl-workers,
         and executes the app gui.
     """
@@ -88,6 +98,27 @@ class AppSkeleton(mp.Process):
         self.check_lsl_config(working_lsl_streams_info)
         self.lsl_streams_info = working_lsl_streams_info
         self.lsl_workers = dict()
+        # Set to a directory (e.g., constants.RECORDING_SPILL_DIR) in the
+        # constructor of the app to spill the recorded samples to disk. The
+        # files are deleted when the app finishes normally. After a crash,
+        # they can be recovered with function recover_recording.
+        self.recording_spill_dir = None
+        self.recording_tail_time = 60
+        self.recording_spill_session_dir = None
+        # Set to a time in seconds in the constructor of the app to receive
+        # the samples in low-latency mode, e.g., for closed-loop apps (see
+        # the deadline of LSLStreamReceiver and LSLStreamAppWorker.subscribe).
+        # In this mode, the streams are received with their own inlets
+        # instead of the StreamHub (see use_stream_hub_ring).
+        self.lsl_deadline = None
+        # Set to True in the constructor of the app to receive the LSL
+        # streams in a separate process that writes the samples in shared
+        # memory, so the reception does not compete for the GIL with the
+        # manager thread and the app gui (see LSLAcquisitionProcess). The
+        # workers are replaced by proxies with the same API.
+        self.lsl_acquisition_process = False
+        self.lsl_acquisition_client = None
+        self.recording_writers = list()
         # ----------------------------- MANAGER ------------------------------ #
         # Data receiver
         self.manager_thread = None
@@ -105,6 +136,12 @@ class AppSkeleton(mp.Process):
         # Join the working threads
         self.lsl_workers_join()
         self.manager_thread.join()
+        # Wait for the recordings that are being saved. The spill files are
+        # kept if a recording could not be saved.
+        for writer in self.recording_writers:
+            writer.join()
+        self.lsl_workers_close(delete_spill_files=all(
+            w.success for w in self.recording_writers))
 
     def setup_lsl_workers(self):
         """Creates and starts the working threads that receive the LSL streams.
@@ -114,30 +151,111 @@ class AppSkeleton(mp.Process):
         that need to be updated when each sample is received). Override this
         method and use custom LSL workers in those cases.
         """
-        # Data receiver
+        if self.lsl_acquisition_process:
+            self.setup_lsl_acquisition_process()
+            return
+        # Data receiver. Streams that are shared by the StreamHub of the
+        # main process are read from its ring buffers instead of opening a
+        # new inlet, unless the app needs the low-latency mode, which the
+        # hub does not apply upstream (see use_stream_hub_ring).
+        ser_lsl_streams = self.lsl_streams_info
         self.lsl_streams_info = [
             lsl_utils.LSLStreamWrapper.from_serializable_obj(
-                ser_lsl_str)
-            for ser_lsl_str in self.lsl_streams_info
+                ser_lsl_str,
+                connect=not use_stream_hub_ring(ser_lsl_str,
+                                                self.lsl_deadline))
+            for ser_lsl_str in ser_lsl_streams
         ]
-        for info in self.lsl_streams_info:
+        spill_dir = None
+        if self.recording_spill_dir is not None:
+            spill_dir = os.path.join(
+                self.recording_spill_dir, '%s_%s' % (
+                    self.app_info['id'], time.strftime('%Y%m%d-%H%M%S')))
+            self.recording_spill_session_dir = spill_dir
+        for info, ser_info in zip(self.lsl_streams_info, ser_lsl_streams):
             if info.lsl_uid in self.lsl_workers:
                 raise ValueError('Duplicated lsl stream uid %s' %
                                  info.lsl_uid)
             # Set receiver
-            receiver = lsl_utils.LSLStreamReceiver(info)
-            # receiver = lsl_utils.LSLStreamReceiver(info)
+            if use_stream_hub_ring(ser_info, self.lsl_deadline):
+                receiver = stream_hub.StreamHubReader(
+                    ser_info['stream_hub_ring'], info,
+                    deadline=self.lsl_deadline,
+                    medusa_interface=self.medusa_interface)
+            else:
+                receiver = lsl_utils.LSLStreamReceiver(
+                    info, deadline=self.lsl_deadline)
             self.lsl_workers[info.medusa_uid] = \
                 LSLStreamAppWorker(receiver, self.app_state,
                                    self.run_state,
                                    self.medusa_interface,
-                                   preprocessor=None)
+                                   preprocessor=None,
+                                   spill_dir=os.path.join(
+                                       spill_dir, info.medusa_uid)
+                                   if spill_dir is not None else None,
+                                   tail_time=self.recording_tail_time)
             self.lsl_workers[info.medusa_uid].start()
 
+    def setup_lsl_acquisition_process(self):
+        """Starts an LSLAcquisitionProcess that receives the LSL streams,
+        and fills lsl_workers with the proxies of its workers (see
+        LSLStreamAppWorkerProxy)
+        """
+        if self.recording_spill_dir is not None:
+            raise ValueError('The recordings cannot be spilled to disk if '
+                             'lsl_acquisition_process is True')
+        ser_lsl_streams = self.lsl_streams_info
+        self.lsl_acquisition_client = LSLAcquisitionClient(
+            ser_lsl_streams, self.app_state, self.run_state,
+            self.medusa_interface, deadline=self.lsl_deadline)
+        self.lsl_streams_info = self.lsl_acquisition_client.lsl_streams
+        self.lsl_acquisition_client.start()
+        self.lsl_workers = self.lsl_acquisition_client.get_proxies()
+
     def lsl_workers_join(self):
         for worker in self.lsl_workers.values():
             worker.join()
 
+    def lsl_workers_close(self, delete_spill_files=True):
+        """Closes the buffers of the workers, deleting the spill files if
+        delete_spill_files is True"""
+        for worker in self.lsl_workers.values():
+            worker.close(delete_spill_files=delete_spill_files)
+        if self.lsl_acquisition_client is not None:
+            self.lsl_acquisition_client.shutdown()
+        if delete_spill_files and \
+                self.recording_spill_session_dir is not None:
+            shutil.rmtree(self.recording_spill_session_dir,
+                          ignore_errors=True)
+
+    def save_recording_async(self, rec, file_path, rec_streams):
+        """Saves a recording in the background with a RecordingWriter, so
+        the app can report APP_STATE_OFF while the file is written. The
+        progress is reported through medusa_interface. The app process
+        waits for the writer before finishing.
+
+        Parameters
+        ----------
+        rec: components.Recording
+            Recording with the experiment data, without the streams
+        file_path: str
+            Path of the file
+        rec_streams: dict
+            Dict with the attribute key of each stream in the recording as
+            keys and the LSLStreamAppWorker as values. The workers must be
+            stopped.
+
+        Returns
+        -------
+        writer: RecordingWriter
+            Writer thread (already started)
+        """
+        writer = RecordingWriter(rec, file_path, rec_streams,
+                                 self.medusa_interface)
+        writer.start()
+        self.recording_writers.append(writer)
+        return writer
+
     def lsl_workers_stop(self):
         for worker in self.lsl_workers.values():
             worker.stop = True
@@ -345,20 +463,96 @@ class AppSkeleton(mp.Process):
         print("Override this method!! Event: " + str(event))
 
 
+def use_stream_hub_ring(ser_lsl_stream, deadline=None):
+    """Checks if an app must read a stream from the ring buffer of the
+    StreamHub of the main process (key stream_hub_ring of the serialized
+    stream) instead of opening its own inlet. The hub receives the streams
+    with the default chunk size of LSLStreamReceiver, so the ring is not
+    used in low-latency mode (deadline is not None), which would add that
+    accumulation upstream of the deadline.
+    """
+    return 'stream_hub_ring' in ser_lsl_stream and deadline is None
+
+
+class LatencyCounter:
+    """Accumulates the latencies of a processing stage (e.g., the time
+    spent on each chunk) to report the number of chunks and the last,
+    mean and max latency. Updates have a constant cost.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def reset(self):
+        self.__init__()
+
+    def update(self, latency):
+        self.n += 1
+        self.total += latency
+        self.last = latency
+        if latency > self.max:
+            self.max = latency
+
+    def get_stats(self):
+        """Returns a dict with the number of updates and the last, mean and
+        max latencies in ms"""
+        return {
+            'n_chunks': self.n,
+            'last_ms': 1000 * self.last,
+            'mean_ms': 1000 * self.total / self.n if self.n > 0 else 0.0,
+            'max_ms': 1000 * self.max
+        }
+
+
 class LSLStreamAppWorker(th.Thread):
     """Thread that receives samples from an LSL stream and saves them.
 
     To read and process the data in a thread-safe way, use function get_data.
+    To process the data incrementally or in windows without copying the
+    whole recording, use functions get_data_since and get_last_seconds.
+
+    In pipelined mode, receiving, preprocessing and storing run in separate
+    threads joined by bounded queues, so a slow preprocessor does not delay
+    the reception of the next chunk. In both modes, the lock only covers
+    the append to the buffer, so get_data callers are not blocked by the
+    preprocessing. The latency of each stage can be checked with
+    get_stage_latencies.
+
+    Closed-loop applications can react to each stored chunk without
+    polling, registering a callback with subscribe or blocking the manager
+    thread in wait_for_data. Use them with a receiver in low-latency mode
+    (see the deadline of LSLStreamReceiver), which delivers the samples
+    without waiting for min_chunk_size. The latency since the timestamp of
+    the samples until they are delivered is reported by
+    get_delivery_latencies.
+
+    Marker streams (see lsl_utils.LSLStreamWrapper.is_marker_stream) are
+    stored as events in a buffers.EventBuffer, with interned labels. Their
+    samples are arrays of labels with dtype object, and the events in a
+    time window can be found with get_events and get_event_times.
     """
 
+    # Stages of the pipeline
+    STAGES = ('receive', 'preprocess', 'store')
+
     def __init__(self, receiver, app_state, run_state,
-                 medusa_interface, preprocessor=None):
+                 medusa_interface, preprocessor=None, pipelined=False,
+                 queue_size=64, spill_dir=None, tail_time=60,
+                 compact_timestamps=False, timestamps_tolerance=0,
+                 detect_gaps=True, gap_warning_time=0.1,
+                 gap_warning_lost_ratio=0.01, buffer=None,
+                 event_store=None):
         """Class constructor for LSLStreamAppWorker
 
         Parameters
         ----------
-        receiver: LSLStreamReceiver
+        receiver: LSLStreamReceiver or StreamHubReader
             LSL stream receiver with the LSL inlet initialized, ready to go!
+            A StreamHubReader can be used to read the stream from the
+            StreamHub of the main process.
         app_state: mp.Value
             Medusa app state
         run_state: mp.Value
@@ -370,10 +564,62 @@ class LSLStreamAppWorker(th.Thread):
             algorithm applied in real time to the signal. For most
             applications set to None in order to save raw data. The
             preprocessing can be done when processing app events.
+        pipelined: bool
+            If True, the preprocessing and storing stages run in their own
+            threads, joined by bounded queues. If a stage fails, its error
+            is raised in the thread of the worker, which finishes.
+        queue_size: int
+            Max number of chunks in each queue of the pipeline. If a queue
+            is full, the previous stage waits, so the samples are kept in
+            the buffer of the receiver.
+        spill_dir: str or None
+            If not None, the samples are spilled to files in this directory
+            (see buffers.SpillingSampleBuffer), so long recordings do not
+            exhaust the memory and can be recovered after a crash (see
+            recover_recording). Otherwise, the samples are kept in memory.
+        tail_time: float
+            Seconds of signal kept in memory if spill_dir is not None
+        compact_timestamps: bool
+            If True and spill_dir is None, the timestamps are encoded as
+            regular runs plus exceptions (see buffers.CompactSampleBuffer),
+            which saves most of their memory for regular-rate streams.
+        timestamps_tolerance: float or None
+            Max error in seconds of the decoded timestamps if
+            compact_timestamps is True. With 0 (default), the exact
+            timestamps are kept, so get_data_class is lossless. If None, 1%
+            of the sample period.
+        detect_gaps: bool
+            If True, the timestamps of each received chunk are checked to
+            detect sample loss, gaps and bursts (see
+            gap_detection.GapDetector). The gaps are saved in the data
+            class of the stream (see get_data_class).
+        gap_warning_time: float or None
+            A warning is logged for gaps longer than this time in seconds.
+            If None, these warnings are disabled.
+        gap_warning_lost_ratio: float or None
+            A warning is logged if the ratio of lost samples exceeds this
+            value. If None, these warnings are disabled.
+        buffer: object or None
+            Sample buffer with the interface of buffers.SampleBuffer and
+            the dtype of the stream (float if there is a preprocessor),
+            e.g., a buffers.SharedSampleBuffer to read the samples from
+            other processes (see LSLAcquisitionProcess). If not None,
+            spill_dir and compact_timestamps are ignored.
+        event_store: bool or None
+            If True, the samples are stored as events in a
+            buffers.EventBuffer. If None, it is True for marker streams
+            (see lsl_utils.LSLStreamWrapper.is_marker_stream). Events are
+            always kept in memory, so spill_dir and compact_timestamps are
+            ignored, and they cannot be preprocessed. String streams must
+            be stored as events. Numeric streams (e.g., irregular trigger
+            codes) can be stored as events to use get_events and
+            get_event_times, and their recordings keep the original codes
+            (see get_event_data_class).
         """
         super().__init__()
         # Check errors
-        if receiver.lsl_stream.lsl_stream_inlet is None:
+        if isinstance(receiver, lsl_utils.LSLStreamReceiver) and \
+                receiver.lsl_stream.lsl_stream_inlet is None:
             raise ValueError('Call function init_lsl_inlet of class '
                              'LSLStreamReceiver first!')
         # Init
@@ -384,9 +630,94 @@ class LSLStreamAppWorker(th.Thread):
         self.medusa_interface = medusa_interface
         self.stop = False
         self.lock = th.Lock()
-        self.data = np.zeros((0, self.receiver.n_cha))
-        self.timestamps = np.zeros((0,))
-        self.lsl_timestamps = np.zeros((0,))
+        # The samples are stored in the native dtype of the stream, and
+        # converted to physical units only when needed (see to_physical).
+        # Preprocessed samples are stored in physical units.
+        lsl_stream = self.receiver.lsl_stream
+        self.event_store = lsl_stream.is_marker_stream() \
+            if event_store is None else event_store
+        if self.event_store and preprocessor is not None:
+            raise ValueError('Marker streams cannot be preprocessed')
+        if not self.event_store and lsl_utils.get_lsl_channel_format_dtype(
+                lsl_stream.lsl_cha_format) is None:
+            raise ValueError('String streams must be stored as events')
+        if self.event_store:
+            self.dtype = np.dtype(object)
+        else:
+            self.dtype = lsl_stream.get_dtype() if preprocessor is None \
+                else np.dtype(float)
+        self.cha_gain, self.cha_offset = lsl_stream.get_cha_scaling()
+        if buffer is not None:
+            if buffer.dtype != self.dtype or buffer.n_cha != \
+                    self.receiver.n_cha:
+                raise ValueError('The buffer must have %i channels of '
+                                 'type %s' % (self.receiver.n_cha,
+                                              self.dtype))
+            self.buffer = buffer
+        elif self.event_store:
+            self.buffer = buffers.EventBuffer(n_cha=self.receiver.n_cha)
+        elif spill_dir is not None:
+            fs = self.receiver.fs
+            self.buffer = buffers.SpillingSampleBuffer(
+                n_cha=self.receiver.n_cha, spill_dir=spill_dir,
+                dtype=self.dtype,
+                tail_capacity=int(tail_time * fs) if fs > 0 else None,
+                fs=fs, metadata={'lsl_stream_info':
+                                 lsl_stream.to_serializable_obj()})
+        elif compact_timestamps:
+            self.buffer = buffers.CompactSampleBuffer(
+                n_cha=self.receiver.n_cha, dtype=self.dtype,
+                fs=self.receiver.fs, tolerance=timestamps_tolerance)
+        else:
+            self.buffer = buffers.SampleBuffer(n_cha=self.receiver.n_cha,
+                                               dtype=self.dtype,
+                                               fs=self.receiver.fs)
+        # Gap detection
+        self.gap_detector = gap_detection.GapDetector(
+            fs=self.receiver.fs, chunk_size=self.receiver.min_chunk_size,
+            warn_gap_time=gap_warning_time,
+            warn_lost_ratio=gap_warning_lost_ratio) if detect_gaps else None
+        # Pipeline
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.preprocess_queue = None
+        self.store_queue = None
+        self.stage_threads = list()
+        self.stage_error = None
+        # Latency counters. For each stage, the processing time of each
+        # chunk. In pipelined mode, also the time since the chunk was
+        # received until it is stored (end-to-end).
+        self.latency_counters = {stage: LatencyCounter()
+                                 for stage in self.STAGES}
+        self.latency_counters['end_to_end'] = LatencyCounter()
+        # Delivery of the stored chunks (see subscribe and wait_for_data)
+        self.subscribers = list()
+        self.data_condition = th.Condition()
+        self.delivery_latency_counters = {'newest_sample': LatencyCounter(),
+                                          'oldest_sample': LatencyCounter()}
+
+    @property
+    def data(self):
+        """Stored samples in physical units as a float64 array, as in
+        previous versions. Use get_data(raw=True) to get the samples in the
+        native dtype of the stream."""
+        with self.lock:
+            data = self.buffer.data
+            if self.event_store:
+                return data
+            return lsl_utils.to_float64_physical_units(
+                data, self.cha_gain, self.cha_offset)
+
+    @property
+    def timestamps(self):
+        with self.lock:
+            timestamps = self.buffer.timestamps
+        return timestamps if timestamps.flags.writeable \
+            else timestamps.copy()
+
+    @property
+    def lsl_timestamps(self):
+        return self.buffer.lsl_timestamps
 
     def handle_exception(self, ex):
         self.medusa_interface.error(ex)
@@ -397,135 +728,474 @@ class LSLStreamAppWorker(th.Thread):
         receives and stores samples from a lsl receiver. The attribute
         stop controls when the thread must finish.
         """
+        if self.pipelined:
+            self.__start_pipeline()
         error_counter = 0
         self.receiver.flush_stream()
-        while not self.stop:
-            # Get data
-            try:
-                chunk_data, chunk_times, chunk_lsl_times = \
-                    self.receiver.get_chunk()
-            except exceptions.LSLStreamTimeout as e:
-                error_counter += 1
-                if error_counter > 5:
-                    raise exceptions.MedusaException(
-                        e, importance='important',
-                        msg='LSLStreamAppWorker is not receiving signal from '
-                            '%s. Is the device connected?' % self.receiver.name,
-                        scope='app', origin='LSLStreamAppWorker.run')
-                else:
-                    self.medusa_interface.log(
-                        msg='LSLStreamAppWorker is not receiving signal from '
-                            '%s. Trying to reconnect.' % self.receiver.name,
-                        style='warning')
+        try:
+            while not self.stop:
+                # Get data
+                try:
+                    t0 = time.perf_counter()
+                    chunk_data, chunk_times, chunk_lsl_times = \
+                        self.receiver.get_chunk()
+                    t_received = time.perf_counter()
+                    self.latency_counters['receive'].update(t_received - t0)
+                except exceptions.LSLStreamTimeout as e:
+                    error_counter += 1
+                    if error_counter > 5:
+                        raise exceptions.MedusaException(
+                            e, importance='important',
+                            msg='LSLStreamAppWorker is not receiving signal '
+                                'from %s. Is the device connected?' %
+                                self.receiver.name,
+                            scope='app', origin='LSLStreamAppWorker.run')
+                    else:
+                        self.medusa_interface.log(
+                            msg='LSLStreamAppWorker is not receiving signal '
+                                'from %s. Trying to reconnect.' %
+                                self.receiver.name,
+                            style='warning')
+                        continue
+                # Check the timestamps even if the data is not stored, so
+                # the pauses are not detected as gaps
+                if self.gap_detector is not None:
+                    # The chunk size may be tuned at runtime by the receiver
+                    self.gap_detector.chunk_size = \
+                        max(self.receiver.min_chunk_size, 1)
+                    for msg in self.gap_detector.update(chunk_lsl_times,
+                                                        chunk_times):
+                        self.medusa_interface.log(
+                            msg='%s: %s' % (self.receiver.name, msg),
+                            style='warning')
+                # If the app is ON and the run is running, stack data
+                if self.app_state.value != constants.APP_STATE_ON or \
+                        self.run_state.value != constants.RUN_STATE_RUNNING:
+                    continue
+                # Irregular streams return empty chunks while there are no
+                # new samples
+                if len(chunk_times) == 0:
                     continue
-            # If the app is ON and the run is running, stack data
-            if self.app_state.value == constants.APP_STATE_ON:
-                if self.run_state.value == constants.RUN_STATE_RUNNING:
-                    with self.lock:
-                        if self.preprocessor is not None:
-                            chunk_data = \
-                                self.preprocessor.transform(chunk_data)
-                        self.data = np.vstack((self.data, chunk_data))
-                        self.timestamps = np.append(self.timestamps,
-                                                    chunk_times)
-                        self.lsl_timestamps = np.append(self.lsl_timestamps,
-                                                        chunk_lsl_times)
-
-    def get_data(self):
+                if self.pipelined:
+                    # Some receivers return views of internal buffers
+                    chunk = (np.array(chunk_data), chunk_times,
+                             chunk_lsl_times, t_received)
+                    self.__put(self.preprocess_queue
+                               if self.preprocess_queue is not None
+                               else self.store_queue, chunk)
+                else:
+                    chunk_data = self.__preprocess(chunk_data)
+                    self.__store(chunk_data, chunk_times, chunk_lsl_times,
+                                 t_received)
+        finally:
+            if self.pipelined:
+                self.__stop_pipeline()
+            # Wake up the threads waiting for data
+            with self.data_condition:
+                self.data_condition.notify_all()
+
+    def __preprocess(self, chunk_data):
+        if self.preprocessor is None:
+            return chunk_data
+        t0 = time.perf_counter()
+        chunk_data = self.preprocessor.transform(self.to_physical(chunk_data))
+        self.latency_counters['preprocess'].update(time.perf_counter() - t0)
+        return chunk_data
+
+    def __store(self, chunk_data, chunk_times, chunk_lsl_times, t_received):
+        t0 = time.perf_counter()
         with self.lock:
-            timestamps = self.timestamps.copy()
-            data = self.data.copy()
+            self.buffer.append(chunk_data, chunk_times, chunk_lsl_times)
+        t1 = time.perf_counter()
+        self.latency_counters['store'].update(t1 - t0)
+        self.latency_counters['end_to_end'].update(t1 - t_received)
+        self.__deliver(chunk_data, chunk_times)
+
+    def __deliver(self, chunk_data, chunk_times):
+        """Wakes up the threads waiting for data and calls the subscribers
+        with the stored chunk"""
+        if len(chunk_times) > 0:
+            now = time.time()
+            self.delivery_latency_counters['newest_sample'].update(
+                float(now - chunk_times[-1]))
+            self.delivery_latency_counters['oldest_sample'].update(
+                float(now - chunk_times[0]))
+        with self.data_condition:
+            self.data_condition.notify_all()
+        for callback in self.subscribers:
+            callback(chunk_times, chunk_data)
+
+    def subscribe(self, callback):
+        """Registers a function that is called with the timestamps and
+        samples of each stored chunk, right after it is stored, as
+        callback(times, data). The samples are in the dtype of the buffer
+        (see to_physical). The callback runs in the thread of the worker
+        (the store thread in pipelined mode), so it must return quickly,
+        and the arrays may be reused after it returns, so they must be
+        copied to keep them."""
+        # The list is replaced, so it can be iterated without a lock
+        self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        """Removes a function registered with subscribe"""
+        self.subscribers = [c for c in self.subscribers if c is not callback]
+
+    def wait_for_data(self, cursor=0, timeout=None):
+        """Blocks until there are samples after a cursor, and returns them
+        (see get_data_since). It returns immediately if the data has been
+        reset or the worker has been stopped, and after timeout seconds if
+        it is not None, in these cases with the samples available, if any.
+        Example::
+
+            cursor = 0
+            while running:
+                times, data, cursor = lsl_worker.wait_for_data(cursor, 1)
+        """
+        with self.data_condition:
+            self.data_condition.wait_for(
+                lambda: buffers.has_new_data(cursor,
+                                             self.buffer.get_cursor()) or
+                self.stop or not self.is_alive(), timeout)
+        return self.get_data_since(cursor)
+
+    def get_delivery_latencies(self):
+        """Returns the latency counters (see LatencyCounter.get_stats) of
+        the time since the timestamp of the newest and the oldest sample of
+        each chunk until it is delivered to the subscribers and to the
+        threads waiting in wait_for_data. The timestamps are converted to
+        the local clock, so the latency includes the transmission from the
+        outlet."""
+        return {key: counter.get_stats() for key, counter in
+                self.delivery_latency_counters.items()}
+
+    def __put(self, stage_queue, item):
+        """Puts an item in a queue of the pipeline, waiting while the queue
+        is full. If a stage thread has finished due to an error, the error
+        is raised in the calling thread, so it reaches the error handler of
+        the worker instead of discarding the chunks silently."""
+        while True:
+            if self.stage_error is not None:
+                raise self.stage_error
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not all(t.is_alive() for t in self.stage_threads):
+                    raise self.stage_error if self.stage_error is not None \
+                        else RuntimeError('A stage thread of %s has '
+                                          'finished' % self.name)
+
+    def __get(self, stage_queue):
+        """Gets an item from a queue of the pipeline. It returns None, the
+        end of the stream, if a stage thread has finished due to an error,
+        so the other stages finish too."""
+        while self.stage_error is None:
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def __start_pipeline(self):
+        self.stage_error = None
+        self.store_queue = queue.Queue(maxsize=self.queue_size)
+        self.stage_threads = [th.Thread(
+            target=self.__store_stage, name='%s-store' % self.name,
+            daemon=True)]
+        if self.preprocessor is not None:
+            self.preprocess_queue = queue.Queue(maxsize=self.queue_size)
+            self.stage_threads.append(th.Thread(
+                target=self.__preprocess_stage,
+                name='%s-preprocess' % self.name, daemon=True))
+        for thread in self.stage_threads:
+            thread.start()
+
+    def __stop_pipeline(self):
+        """Sends the end of the stream through the pipeline, so the queued
+        chunks are processed, and waits for the stage threads. The error of
+        a stage thread, if any, is raised afterwards (see __put)."""
+        try:
+            self.__put(self.preprocess_queue
+                       if self.preprocess_queue is not None
+                       else self.store_queue, None)
+        finally:
+            for thread in self.stage_threads:
+                thread.join()
+
+    def __preprocess_stage(self):
+        try:
+            while True:
+                chunk = self.__get(self.preprocess_queue)
+                if chunk is None:
+                    break
+                chunk_data, chunk_times, chunk_lsl_times, t_received = chunk
+                chunk_data = self.__preprocess(chunk_data)
+                self.__put(self.store_queue, (chunk_data, chunk_times,
+                                              chunk_lsl_times, t_received))
+            self.__put(self.store_queue, None)
+        except Exception as ex:
+            # Raised in the worker thread by __put
+            if self.stage_error is None:
+                self.stage_error = ex
+
+    def __store_stage(self):
+        try:
+            while True:
+                chunk = self.__get(self.store_queue)
+                if chunk is None:
+                    break
+                self.__store(*chunk)
+        except Exception as ex:
+            # Raised in the worker thread by __put
+            if self.stage_error is None:
+                self.stage_error = ex
+
+    def get_stage_latencies(self):
+        """Returns the latency counters of each stage of the worker (see
+        LatencyCounter.get_stats): receive is the time spent waiting for
+        each chunk, preprocess and store the time spent processing it, and
+        end_to_end the time since the chunk is received until it is
+        stored. In pipelined mode, the number of chunks waiting in each
+        queue is also returned."""
+        latencies = {stage: counter.get_stats()
+                     for stage, counter in self.latency_counters.items()}
+        if self.preprocess_queue is not None:
+            latencies['preprocess']['queued'] = self.preprocess_queue.qsize()
+        if self.store_queue is not None:
+            latencies['store']['queued'] = self.store_queue.qsize()
+        return latencies
+
+    def get_data(self, raw=False):
+        """Returns a copy of the timestamps and samples. The samples of
+        integer streams are converted to physical units (see to_physical),
+        unless raw is True."""
+        with self.lock:
+            timestamps, data = self.buffer.get_data()
+        if not raw:
+            data = self.to_physical(data)
         return timestamps, data
 
+    def to_physical(self, data):
+        """Converts raw samples of the stream (e.g., the views returned by
+        get_data_since and get_last_seconds) to physical units, applying
+        the gain and offset of each channel. Samples of float streams are
+        returned without changes.
+        """
+        return lsl_utils.to_physical_units(data, self.cha_gain,
+                                           self.cha_offset)
+
     def get_lsl_timestamps(self):
         with self.lock:
-            lsl_timestamps = self.lsl_timestamps.copy()
+            lsl_timestamps = self.buffer.get_lsl_timestamps()
         return lsl_timestamps
 
+    def get_n_samples(self):
+        """Returns the number of stored samples without copying them"""
+        return len(self.buffer)
+
+    def get_cursor(self):
+        """Returns the cursor of the stored samples, so get_data_since
+        only returns the samples stored after this call"""
+        with self.lock:
+            return self.buffer.get_cursor()
+
+    def get_data_since(self, cursor=0):
+        """Returns the samples stored after a cursor held by the caller, so
+        the data can be processed incrementally. The cost does not depend
+        on the recording length. Example::
+
+            cursor = 0
+            while running:
+                times, data, cursor = lsl_worker.get_data_since(cursor)
+
+        Parameters
+        ----------
+        cursor: tuple or int
+            Use 0 to read from the start, and the cursor returned by the
+            previous call afterwards. The cursor holds the number of
+            samples already read and the generation of the buffer, which is
+            increased by reset_data, so the read starts from the first
+            sample if the data has been reset meanwhile (see
+            buffers.get_read_start).
+
+        Returns
+        -------
+        timestamps: np.ndarray
+            Read-only view of the timestamps of the new samples
+        data: np.ndarray
+            Read-only view of the new samples, in the dtype of the buffer
+            (see to_physical)
+        cursor: tuple
+            Cursor for the next call, (generation, n_samples)
+        """
+        with self.lock:
+            buffer_cursor = self.buffer.get_cursor()
+            start = buffers.get_read_start(cursor, buffer_cursor)
+            timestamps, data, _ = self.buffer.get_views(start,
+                                                        buffer_cursor[1])
+        return timestamps, data, buffer_cursor
+
+    def get_last_seconds(self, seconds):
+        """Returns the samples stored in the last seconds, according to the
+        timestamps. The cost does not depend on the recording length.
+
+        Returns
+        -------
+        timestamps: np.ndarray
+            Read-only view of the timestamps of the samples
+        data: np.ndarray
+            Read-only view of the samples, in the dtype of the buffer (see
+            to_physical)
+        """
+        with self.lock:
+            n_samples = len(self.buffer)
+            if n_samples == 0:
+                timestamps, data, _ = self.buffer.get_views()
+                return timestamps, data
+            t_last = self.buffer.get_views(n_samples - 1)[0][0]
+            start = self.buffer.get_time_index(t_last - seconds)
+            timestamps, data, _ = self.buffer.get_views(start, n_samples)
+        return timestamps, data
+
+    def get_window(self, t_start, t_stop, margin=0):
+        """Returns the samples with timestamps in [t_start, t_stop), found
+        with binary searches, so the cost depends on the window size rather
+        than on the recording length.
+
+        Parameters
+        ----------
+        t_start: float
+            Start time of the window
+        t_stop: float
+            Stop time of the window
+        margin: int
+            Number of extra samples returned before and after the window
+            (e.g., to interpolate at its edges)
+
+        Returns
+        -------
+        timestamps: np.ndarray
+            Read-only view of the timestamps of the samples
+        data: np.ndarray
+            Read-only view of the samples, in the dtype of the buffer (see
+            to_physical)
+        """
+        with self.lock:
+            n_samples = len(self.buffer)
+            start = max(self.buffer.get_time_index(t_start) - margin, 0)
+            stop = min(self.buffer.get_time_index(t_stop) + margin,
+                       n_samples)
+            timestamps, data, _ = self.buffer.get_views(start, stop)
+        return timestamps, data
+
+    def get_last_timestamp(self):
+        """Returns the timestamp of the last stored sample, or None if the
+        buffer is empty"""
+        with self.lock:
+            n_samples = len(self.buffer)
+            if n_samples == 0:
+                return None
+            return float(self.buffer.get_views(n_samples - 1)[0][0])
+
+    def get_events(self, t_start, t_stop):
+        """Returns the timestamps and labels of the events in [t_start,
+        t_stop), found with binary searches (see
+        buffers.EventBuffer.get_events). Only for event streams."""
+        self.__check_event_store()
+        with self.lock:
+            return self.buffer.get_events(t_start, t_stop)
+
+    def get_event_times(self, label, t_start=-np.inf, t_stop=np.inf,
+                        cha=0):
+        """Returns the timestamps of the events with a label within
+        [t_start, t_stop) (see buffers.EventBuffer.get_event_times). Only
+        for event streams."""
+        self.__check_event_store()
+        with self.lock:
+            return self.buffer.get_event_times(label, t_start, t_stop, cha)
+
+    def __check_event_store(self):
+        if not isinstance(self.buffer, buffers.EventBuffer):
+            raise ValueError('The samples of %s are not stored as events' %
+                             self.receiver.name)
+
+    def get_timestamps_stats(self):
+        """Returns the encoding stats of the timestamps if
+        compact_timestamps is True (see
+        buffers.CompactSampleBuffer.get_timestamps_stats), or None
+        otherwise"""
+        if not isinstance(self.buffer, buffers.CompactSampleBuffer):
+            return None
+        with self.lock:
+            stats = self.buffer.get_timestamps_stats()
+            stats['compression_ratio'] = self.buffer.get_compression_ratio()
+        return stats
+
+    def get_gap_stats(self):
+        """Returns the counters of the gap detector (see
+        gap_detection.GapDetector.get_stats), or None if detect_gaps is
+        False. If the receiver is a StreamHubReader, overrun_samples is the
+        number of samples that were overwritten in the ring buffer before
+        the reader could read them"""
+        if self.gap_detector is None:
+            return None
+        stats = self.gap_detector.get_stats()
+        if isinstance(self.receiver, stream_hub.StreamHubReader):
+            stats['overrun_samples'] = self.receiver.lost_samples
+        return stats
+
     def get_historic_offsets(self):
         return self.receiver.get_historic_offsets()
 
+    def get_telemetry(self):
+        return self.receiver.get_telemetry()
+
     def reset_data(self):
         with self.lock:
-            self.data = np.zeros((0, self.receiver.n_cha))
-            self.timestamps = np.zeros((0,))
+            self.buffer.reset()
+        if self.gap_detector is not None:
+            self.gap_detector.reset()
+        with self.data_condition:
+            self.data_condition.notify_all()
 
-    def get_data_class(self):
+    def get_data_class(self, copy=True):
         """
         Retrieves and constructs a data class corresponding to the biosignal type
-        of the current LSL stream in MEDUSA Kernel.
-
-        Returns
-        -------
-        object
-            An instance of the corresponding data class:
-            - `medusa.meeg.EEG` for EEG signals
-            - `medusa.ecg.ECG` for ECG signals
-            - `medusa.emg.EMG` for EMG signals
-            - `medusa.nirs.NIRS` for NIRS signals
-            - `medusa.components.CustomBiosignalData` for custom biosignal data
-
-        Raises
-        ------
-        ValueError
-            If the type of the LSL stream is unknown
+        of the current LSL stream in MEDUSA Kernel (see get_biosignal_data_class).
+        The synchronization telemetry of the receiver is saved in attribute
+        sync_telemetry, and the gaps detected in the stream, if detect_gaps
+        is True, in attribute gaps (see gap_detection.GapDetector.to_dict).
+        Event streams are saved in their compact form (see
+        get_event_data_class).
+
+        If copy is False, the data class is built from read-only views of the
+        buffer, saving a full copy of the recording. Use it only when the
+        worker has been stopped.
         """
-        # Get lsl steam info
-        lsl_stream = self.receiver.lsl_stream
-        # Create data class
-        if lsl_stream.medusa_type == 'EEG':
-            times, signal = self.get_data()
-            channel_set = (
-                lsl_utils.lsl_channel_info_to_eeg_channel_set(
-                self.receiver.info_cha))
-            stream_data = meeg.EEG(
-                times=times,
-                signal=signal,
-                fs=self.receiver.fs,
-                channel_set=channel_set,
-                lsl_stream_info=lsl_stream.to_serializable_obj())
-        elif lsl_stream.medusa_type == 'ECG':
-            times, signal = self.get_data()
-            channel_set = ecg.ECGChannelSet()
-            [channel_set.add_channel(label=l) for l in self.receiver.l_cha]
-            stream_data = ecg.ECG(
-                times=times,
-                signal=signal,
-                fs=self.receiver.fs,
-                channel_set=channel_set,
-                lsl_stream_info=lsl_stream.to_serializable_obj())
-        elif lsl_stream.medusa_type == 'EMG':
-            times, signal = self.get_data()
-            channel_set = lsl_stream.cha_info
-            stream_data = emg.EMG(
-                times=times,
-                signal=signal,
-                fs=self.receiver.fs,
-                channel_set=channel_set,
-                lsl_stream_info=lsl_stream.to_serializable_obj())
-        elif lsl_stream.medusa_type == 'NIRS':
-            times, signal = self.get_data()
-            channel_set = lsl_stream.cha_info
-            stream_data = nirs.NIRS(
-                times=times,
-                signal=signal,
-                fs=self.receiver.fs,
-                channel_set=channel_set,
-                lsl_stream_info=lsl_stream.to_serializable_obj())
-        elif lsl_stream.medusa_type == 'CustomBiosignalData':
-            times, signal = self.get_data()
-            channel_set = lsl_stream.cha_info
-            fs = self.receiver.fs
-            stream_data = components.CustomBiosignalData(
-                times=times,
-                signal=signal,
-                fs=fs,
-                channel_set=channel_set,
-                lsl_stream_info=lsl_stream.to_serializable_obj())
+        kwargs = dict()
+        if self.gap_detector is not None:
+            kwargs['gaps'] = self.gap_detector.to_dict()
+        if isinstance(self.buffer, buffers.EventBuffer):
+            with self.lock:
+                events = self.buffer.to_dict()
+            return get_event_data_class(
+                self.receiver.lsl_stream, events['timestamps'],
+                events['codes'], events['labels'],
+                sync_telemetry=self.get_telemetry(), **kwargs)
+        if copy:
+            times, signal = self.get_data(raw=True)
         else:
-            raise ValueError('Unknown stream type %s!' %
-                             lsl_stream.medusa_type)
-        return stream_data
+            with self.lock:
+                times, signal, _ = self.buffer.get_views()
+        return get_biosignal_data_class(
+            self.receiver.lsl_stream, times, signal,
+            sync_telemetry=self.get_telemetry(), **kwargs)
+
+    def close(self, delete_spill_files=True):
+        """Closes the spill files of the buffer, if any. Call this function
+        once the data is not needed anymore (e.g., after saving it)."""
+        if isinstance(self.buffer, buffers.SpillingSampleBuffer):
+            self.buffer.close(delete_files=delete_spill_files)
 
 
 class Preprocessor(ABC):
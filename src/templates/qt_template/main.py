@@ -101,7 +101,7 @@ class App(resources.AppSkeleton):
             lsl_worker = self.get_lsl_worker()
             self.queue_to_gui.put({
                 'event_type': 'update_response',
-                'data': lsl_worker.data.shape[0]
+                'data': lsl_worker.get_n_samples()
             })
         elif event['event_type'] == 'error':
             print('event_type')
@@ -135,16 +135,12 @@ class App(resources.AppSkeleton):
             **self.app_settings.to_serializable_obj())
         rec.add_experiment_data(exp_data, 'exp_data')
         # Streams data
+        rec_streams = dict()
         for lsl_stream in self.lsl_streams_info:
             if not rec_streams_info[lsl_stream.medusa_uid]['enabled']:
                 continue
-            # Get stream data class
-            lsl_worker = self.lsl_workers[lsl_stream.medusa_uid]
-            stream_data = lsl_worker.get_data_class()
-            # Save stream
             att_key = rec_streams_info[lsl_stream.medusa_uid]['att-name']
-            rec.add_biosignal(stream_data, att_key)
-        # Save recording
-        rec.save(file_path)
-        # Print a message
-        self.medusa_interface.log('Recording saved successfully')
+            rec_streams[att_key] = self.lsl_workers[lsl_stream.medusa_uid]
+        # Save recording in the background. The streams are added by the
+        # writer, which reports the progress to medusa
+        self.save_recording_async(rec, file_path, rec_streams)
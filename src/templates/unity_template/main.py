@@ -180,7 +180,7 @@ class App(resources.AppSkeleton):
             # Get the current number of samples of the first LSL stream
             # and send it to Unity again
             lsl_worker = self.get_lsl_worker()
-            no_samples = lsl_worker.data.shape[0]
+            no_samples = lsl_worker.get_n_samples()
             self.app_controller.send_command({"event_type": "samplesUpdate",
                                               "no_samples": no_samples})
 
@@ -207,17 +207,13 @@ class App(resources.AppSkeleton):
             **self.app_settings.to_serializable_obj())
         rec.add_experiment_data(exp_data, 'exp_data')
         # Streams data
+        rec_streams = dict()
         for lsl_stream in self.lsl_streams_info:
             if not rec_streams_info[lsl_stream.medusa_uid]['enabled']:
                 continue
-            # Get stream data class
-            lsl_worker = self.lsl_workers[lsl_stream.medusa_uid]
-            stream_data = lsl_worker.get_data_class()
-            # Save stream
             att_key = rec_streams_info[lsl_stream.medusa_uid]['att-name']
-            rec.add_biosignal(stream_data, att_key)
-        # Save recording
-        rec.save(file_path)
-        # Print a message
-        self.medusa_interface.log('Recording saved successfully')
+            rec_streams[att_key] = self.lsl_workers[lsl_stream.medusa_uid]
+        # Save recording in the background. The streams are added by the
+        # writer, which reports the progress to medusa
+        self.save_recording_async(rec, file_path, rec_streams)
 
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules of medusa are imported from the src directory (e.g.,
+# from acquisition import buffers)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
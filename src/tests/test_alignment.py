@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from acquisition.alignment import align_samples
+
+TIMES = np.array([0.0, 1.0, 2.0, 4.0])
+DATA = np.array([[0.0, 10.0], [1.0, 20.0], [2.0, 30.0], [4.0, 50.0]])
+
+
+def test_nearest():
+    timeline = np.array([-0.1, 0.0, 0.4, 0.6, 2.0, 2.9, 3.1, 4.0, 4.1])
+    aligned = align_samples(TIMES, DATA, timeline, method='nearest')
+    assert np.all(np.isnan(aligned[[0, -1]]))
+    assert np.array_equal(aligned[1:-1, 0], [0, 0, 1, 2, 2, 4, 4])
+
+
+def test_nearest_tie_takes_previous_sample():
+    aligned = align_samples(TIMES, DATA, np.array([0.5, 3.0]),
+                            method='nearest')
+    assert np.array_equal(aligned[:, 0], [0, 2])
+
+
+def test_linear():
+    timeline = np.array([-0.1, 0.0, 0.25, 1.0, 3.0, 4.0, 4.1])
+    aligned = align_samples(TIMES, DATA, timeline, method='linear')
+    assert np.all(np.isnan(aligned[[0, -1]]))
+    assert np.allclose(aligned[1:-1, 0], [0, 0.25, 1, 3, 4])
+    assert np.allclose(aligned[1:-1, 1], [10, 12.5, 20, 40, 50])
+
+
+def test_linear_single_sample():
+    aligned = align_samples(TIMES[:1], DATA[:1], np.array([-1, 0.0, 1]),
+                            method='linear')
+    assert np.isnan(aligned[0, 0]) and np.isnan(aligned[2, 0])
+    assert np.array_equal(aligned[1], DATA[0])
+
+
+def test_linear_repeated_timestamps():
+    times = np.array([0.0, 1.0, 1.0, 2.0])
+    aligned = align_samples(times, DATA, np.array([1.0, 1.5]),
+                            method='linear')
+    assert not np.any(np.isnan(aligned))
+    assert np.allclose(aligned[1], (DATA[2] + DATA[3]) / 2)
+
+
+def test_zoh():
+    timeline = np.array([-0.1, 0.0, 0.9, 1.0, 3.9, 4.0, 10.0])
+    aligned = align_samples(TIMES, DATA, timeline, method='zoh')
+    assert np.all(np.isnan(aligned[0]))
+    # The last sample is held after the end of the stream
+    assert np.array_equal(aligned[1:, 0], [0, 0, 1, 2, 4, 4])
+
+
+def test_empty_inputs():
+    aligned = align_samples(np.array([]), np.empty((0, 2)),
+                            np.array([0.0, 1.0]))
+    assert aligned.shape == (2, 2) and np.all(np.isnan(aligned))
+    aligned = align_samples(TIMES, DATA, np.array([]))
+    assert aligned.shape == (0, 2)
+
+
+def test_integer_samples_are_promoted_to_float():
+    aligned = align_samples(TIMES, DATA.astype(np.int16), np.array([0.5]))
+    assert aligned.dtype == np.float32
+    assert np.allclose(aligned, [[0.5, 15]])
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        align_samples(TIMES, DATA, TIMES, method='cubic')
@@ -0,0 +1,194 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from acquisition.buffers import CompactSampleBuffer, CompactTimestamps, \
+    EventBuffer, SampleBuffer, SharedSampleBuffer, get_read_start, \
+    has_new_data
+
+FS = 500
+
+
+def encode(timestamps, chunk_size=32, **kwargs):
+    encoder = CompactTimestamps(**kwargs)
+    for i in range(0, len(timestamps), chunk_size):
+        encoder.append(timestamps[i:i + chunk_size])
+    return encoder
+
+
+def encode_traced(timestamps, **kwargs):
+    """Encodes the timestamps and returns the encoder and the memory that
+    it allocated, measured with tracemalloc"""
+    tracemalloc.start()
+    try:
+        encoder = encode(timestamps, **kwargs)
+        n_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return encoder, n_bytes
+
+
+def jittery_timestamps(n=10000, seed=0, jitter=1e-4):
+    # Regular timestamps with jitter, a gap and a change of rate
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / FS + rng.normal(0, jitter, n)
+    t[n // 2:] += 0.3
+    t[3 * n // 4:] = t[3 * n // 4] + \
+        np.arange(n - 3 * n // 4) / (1.001 * FS)
+    return t
+
+
+@pytest.fixture
+def no_fallback(monkeypatch):
+    monkeypatch.setattr(CompactTimestamps, 'MIN_FALLBACK_SAMPLES', 10 ** 9)
+
+
+def test_regular_timestamps_are_encoded_in_one_segment():
+    # The period is a power of 2, so the timestamps are exactly affine
+    t = 100 + np.arange(100000) / 512
+    encoder, n_bytes = encode_traced(t)
+    stats = encoder.get_stats()
+    assert stats['n_samples'] == 100000
+    assert stats['n_segments'] == 1
+    assert stats['n_exceptions'] == 0
+    assert not stats['raw']
+    assert n_bytes < 0.01 * t.nbytes
+    assert np.array_equal(encoder.get_array(), t)
+
+
+@pytest.mark.parametrize('fallback', [True, False])
+def test_exact_round_trip_with_tolerance_0(fallback, monkeypatch):
+    if not fallback:
+        monkeypatch.setattr(CompactTimestamps, 'MIN_FALLBACK_SAMPLES',
+                            10 ** 9)
+    t = jittery_timestamps()
+    encoder = encode(t, tolerance=0)
+    assert encoder.is_raw == fallback
+    assert np.array_equal(encoder.get_array(), t)
+    # Partial decoding and single values
+    assert np.array_equal(encoder.get_array(1234, 7777), t[1234:7777])
+    for idx in (0, 1, 4999, 5000, 5001, 7500, 9999):
+        assert encoder.get_value(idx) == t[idx]
+
+
+def test_jittery_timestamps_do_not_take_more_memory_than_float64():
+    t = jittery_timestamps(100000, jitter=5e-6)
+    encoder, n_bytes = encode_traced(t, tolerance=0)
+    assert encoder.is_raw
+    assert np.array_equal(encoder.get_array(), t)
+    # Unused capacity of the growable array
+    assert n_bytes <= 1.25 * t.nbytes + 4096
+    assert encoder.get_n_bytes() <= n_bytes
+
+
+def test_round_trip_within_tolerance():
+    t = jittery_timestamps(100000)
+    tolerance = 0.5 / FS
+    encoder, n_bytes = encode_traced(t, tolerance=tolerance)
+    assert np.abs(encoder.get_array() - t).max() <= tolerance
+    assert not encoder.is_raw
+    assert n_bytes < 0.2 * t.nbytes
+    assert encoder.get_n_bytes() <= n_bytes
+
+
+def test_encoding_does_not_depend_on_the_chunks(no_fallback):
+    t = jittery_timestamps(3000, jitter=2e-5)
+    for max_exception_run in (1, 4):
+        encoders = [encode(t, chunk_size=chunk_size, tolerance=1e-5,
+                           max_exception_run=max_exception_run)
+                    for chunk_size in (1, 7, 3000)]
+        for encoder in encoders:
+            assert np.abs(encoder.get_array() - t).max() <= 1e-5
+            assert encoder.get_stats() == encoders[0].get_stats()
+
+
+def test_get_time_index_matches_searchsorted(no_fallback):
+    t = np.sort(jittery_timestamps())
+    encoder = encode(t, tolerance=0)
+    queries = np.concatenate([
+        [t[0] - 1, t[0], t[-1], t[-1] + 1],
+        t[::997], t[::997] + 0.5 / FS,
+        np.linspace(t[0], t[-1], 101)])
+    for q in queries:
+        assert encoder.get_time_index(q) == np.searchsorted(t, q)
+
+
+def test_empty_encoder():
+    encoder = CompactTimestamps()
+    encoder.append([])
+    assert len(encoder) == 0
+    assert len(encoder.get_array()) == 0
+    assert encoder.get_time_index(0) == 0
+    assert encoder.get_compression_ratio() == 1.0
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        CompactTimestamps(tolerance=-1)
+    with pytest.raises(ValueError):
+        CompactTimestamps(max_exception_run=0)
+
+
+def test_compact_sample_buffer_keeps_exact_timestamps():
+    t = jittery_timestamps(2000)
+    data = np.arange(2 * len(t), dtype=float).reshape(-1, 2)
+    buffer = CompactSampleBuffer(2, fs=FS)
+    for i in range(0, len(t), 50):
+        buffer.append(data[i:i + 50], t[i:i + 50], t[i:i + 50])
+    timestamps, samples = buffer.get_data()
+    assert np.array_equal(samples, data)
+    assert np.array_equal(timestamps, t)
+    assert np.array_equal(buffer.get_lsl_timestamps(), t)
+
+
+def read_since(buffer, cursor):
+    buffer_cursor = buffer.get_cursor()
+    start = get_read_start(cursor, buffer_cursor)
+    return buffer.get_views(start, buffer_cursor[1])[0], buffer_cursor
+
+
+def append_samples(buffer, n, t0=0.0):
+    t = t0 + np.arange(n, dtype=float)
+    buffer.append(np.zeros((n, buffer.n_cha)), t, t)
+
+
+@pytest.mark.parametrize('buffer_class', [SampleBuffer, CompactSampleBuffer,
+                                          SharedSampleBuffer])
+def test_cursor_detects_resets(buffer_class):
+    buffer = buffer_class(1, fs=FS)
+    try:
+        append_samples(buffer, 10)
+        times, cursor = read_since(buffer, 0)
+        assert len(times) == 10 and cursor[1] == 10
+        assert not has_new_data(cursor, buffer.get_cursor())
+        # After a reset, the buffer holds more samples than the cursor, so
+        # only the generation reveals that they are new
+        buffer.reset()
+        append_samples(buffer, 15, t0=100)
+        assert has_new_data(cursor, buffer.get_cursor())
+        times, cursor = read_since(buffer, cursor)
+        assert len(times) == 15 and times[0] == 100
+        # An empty buffer after a reset is also new data
+        buffer.reset()
+        assert has_new_data(cursor, buffer.get_cursor())
+        times, cursor = read_since(buffer, cursor)
+        assert len(times) == 0 and cursor[1] == 0
+    finally:
+        if isinstance(buffer, SharedSampleBuffer):
+            buffer.close()
+
+
+def test_event_buffer_cursor_detects_resets():
+    buffer = EventBuffer()
+    buffer.append([['a'], ['b']], [0.0, 1.0], [0.0, 1.0])
+    cursor = buffer.get_cursor()
+    buffer.reset()
+    buffer.append([['c']] * 3, [2.0, 3.0, 4.0], [2.0, 3.0, 4.0])
+    assert get_read_start(cursor, buffer.get_cursor()) == 0
+
+
+def test_integer_cursors_are_accepted():
+    assert get_read_start(5, (3, 10)) == 5
+    assert get_read_start(12, (3, 10)) == 0
+    assert has_new_data(5, (3, 10)) and not has_new_data(10, (3, 10))
@@ -0,0 +1,149 @@
+import pytest
+
+from acquisition import chunk_control
+from acquisition.chunk_control import ChunkController
+
+FS = 1000
+
+
+class FakeClock:
+    """Replaces the time module of chunk_control, so the wall and CPU times
+    seen by the controller are set by the test"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.cpu = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def thread_time(self):
+        return self.cpu
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(chunk_control, 'time', clock)
+    return clock
+
+
+def run_interval(controller, clock, chunk_size, cpu_per_chunk=0.0,
+                 backlog=0, duration=0.5):
+    """Feeds the controller with the chunks of one adaptation interval and
+    returns the last params that were not None"""
+    n_chunks = max(int(duration * FS / chunk_size), 2)
+    params = None
+    for _ in range(n_chunks):
+        clock.now += duration / n_chunks
+        clock.cpu += cpu_per_chunk
+        new_params = controller.update(chunk_size, backlog,
+                                       chunk_size / FS)
+        if new_params is not None:
+            params = new_params
+    return params
+
+
+def test_latency_target(clock):
+    controller = ChunkController(target='latency')
+    min_chunk_size, max_chunk_size, timeout = \
+        controller.reset(FS, 10, 1000, 1.5)
+    assert min_chunk_size == 1
+    assert max_chunk_size == 1000
+    assert controller.get_decisions()[0]['reason'] == 'init'
+    for _ in range(3):
+        run_interval(controller, clock, 1)
+    assert controller.min_chunk_size == 1
+
+
+def test_rate_target(clock):
+    controller = ChunkController(target='rate', update_rate=20)
+    min_chunk_size, max_chunk_size, _ = controller.reset(FS, 10, 50, 1.5)
+    assert min_chunk_size == 50
+    assert max_chunk_size == 100
+    run_interval(controller, clock, 50)
+    assert controller.min_chunk_size == 50
+
+
+def test_cpu_target_grows_chunks_over_budget(clock):
+    controller = ChunkController(target='cpu', cpu_budget=0.05)
+    controller.reset(FS, 10, 1000, 1.5)
+    # 50 chunks of 4 ms of CPU in 0.5 s: 40% of a core
+    params = run_interval(controller, clock, 10, cpu_per_chunk=0.004)
+    assert params is not None
+    decision = controller.get_decisions()[-1]
+    assert 'cpu' in decision['reason']
+    assert decision['cpu_usage'] > 0.05
+    # At most x4 per adaptation
+    assert controller.min_chunk_size == 40
+
+
+def test_cpu_target_shrinks_chunks_well_below_budget(clock):
+    controller = ChunkController(target='cpu', cpu_budget=0.5)
+    controller.reset(FS, 100, 1000, 1.5)
+    run_interval(controller, clock, 100, cpu_per_chunk=0.0001)
+    # At most x2 smaller per adaptation
+    assert controller.min_chunk_size == 50
+
+
+def test_cpu_target_keeps_chunks_within_budget(clock):
+    controller = ChunkController(target='cpu', cpu_budget=0.05)
+    controller.reset(FS, 100, 1000, 1.5)
+    # 5 chunks in 0.5 s. The CPU time is measured between chunks, so 4
+    # of them are counted: 20 ms, 4% of a core
+    run_interval(controller, clock, 100, cpu_per_chunk=0.005)
+    assert controller.min_chunk_size == 100
+
+
+def test_cpu_budget_limits_the_update_rate_of_other_targets(clock):
+    controller = ChunkController(target='latency', cpu_budget=0.05)
+    controller.reset(FS, 1, 1000, 1.5)
+    run_interval(controller, clock, 1, cpu_per_chunk=0.001)
+    assert controller.min_chunk_size > 1
+
+
+def test_backlog_grows_max_chunk_size_immediately(clock):
+    controller = ChunkController(target='latency')
+    controller.reset(FS, 1, 100, 0.5)
+    clock.now += 0.01
+    params = controller.update(100, 800, 0.01)
+    assert params is not None
+    min_chunk_size, max_chunk_size, timeout = params
+    assert max_chunk_size == 800
+    assert timeout >= 1.5 * 800 / FS
+    assert controller.get_decisions()[-1]['reason'] == 'backlog'
+
+
+def test_max_chunk_size_shrinks_gradually_after_backlog(clock):
+    controller = ChunkController(target='latency')
+    controller.reset(FS, 1, 100, 0.5)
+    clock.now += 0.01
+    controller.update(100, 1600, 0.01)
+    # The first adaptation drains the backlog of its interval, and the next
+    # ones halve the max chunk size down to 2 * min_chunk_size
+    for _ in range(12):
+        run_interval(controller, clock, 1, duration=0.6)
+    sizes = [d['max_chunk_size'] for d in controller.get_decisions()[2:]]
+    assert sizes[:5] == [int(1.5 * 1600) + 1, 1200, 600, 300, 150]
+    assert sizes[-1] == 2 * controller.min_chunk_size
+    assert 'shrink' in controller.get_decisions()[-1]['reason']
+
+
+def test_no_adaptation_for_irregular_streams(clock):
+    controller = ChunkController(target='latency')
+    assert controller.reset(0, 1, 1, 1.0) == (1, 1, 1.0)
+    clock.now += 1
+    assert controller.update(10, 100, 0.1) is None
+    assert controller.get_decisions() == []
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        ChunkController(target='throughput')
+    with pytest.raises(ValueError):
+        ChunkController(target='cpu')
+    with pytest.raises(ValueError):
+        ChunkController(target='rate', update_rate=0)
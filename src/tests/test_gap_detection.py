@@ -0,0 +1,67 @@
+import numpy as np
+
+from acquisition.gap_detection import GapDetector
+
+FS = 1000
+
+
+def feed(detector, lsl_times, chunk_size=10):
+    for i in range(0, len(lsl_times), chunk_size):
+        detector.update(lsl_times[i:i + chunk_size])
+
+
+def test_regular_stream_has_no_gaps():
+    detector = GapDetector(FS, chunk_size=10)
+    feed(detector, np.arange(5000) / FS)
+    stats = detector.get_stats()
+    assert stats['n_samples'] == 5000
+    assert stats['lost_samples'] == 0
+    assert stats['n_gaps'] == 0
+
+
+def test_jittery_lossless_stream_has_no_lost_samples():
+    # Timestamps assigned when each chunk is pushed: the intervals at the
+    # chunk boundaries reach 1.8 periods, followed by short ones
+    rng = np.random.default_rng(0)
+    n, chunk_size = 20000, 10
+    offsets = rng.uniform(-0.4, 0.4, n // chunk_size) / FS
+    lsl_times = np.arange(n) / FS + np.repeat(offsets, chunk_size)
+    assert np.diff(lsl_times).max() > 1.5 / FS
+    detector = GapDetector(FS, chunk_size=chunk_size)
+    feed(detector, lsl_times, chunk_size)
+    assert detector.lost_samples == 0
+    assert detector.n_gaps == 0
+    assert detector.to_dict()['onset'] == []
+
+
+def test_lost_samples_are_counted_once_per_gap():
+    lsl_times = np.arange(3000) / FS
+    # Drop 5 samples at index 1000 and 20 samples at index 2000
+    keep = np.ones(3000, dtype=bool)
+    keep[1000:1005] = False
+    keep[2000:2020] = False
+    detector = GapDetector(FS, chunk_size=10, warn_gap_time=None,
+                           warn_lost_ratio=None)
+    feed(detector, lsl_times[keep])
+    gaps = detector.to_dict()
+    assert gaps['lost_samples'] == 25
+    assert gaps['n_gaps'] == 2
+    assert gaps['n_lost'] == [5, 20]
+    assert np.allclose(gaps['onset'], [999 / FS, 1999 / FS])
+
+
+def test_gap_with_jitter():
+    rng = np.random.default_rng(1)
+    lsl_times = np.arange(2000) / FS + rng.uniform(-0.3, 0.3, 2000) / FS
+    lsl_times = np.delete(lsl_times, np.arange(500, 503))
+    detector = GapDetector(FS, chunk_size=10)
+    feed(detector, lsl_times)
+    assert detector.lost_samples == 3
+    assert detector.n_gaps == 1
+    assert detector.gap_lost_samples == [3]
+
+
+def test_irregular_stream_is_disabled():
+    detector = GapDetector(0)
+    assert detector.update(np.array([0.0, 1.0, 5.0])) == []
+    assert detector.get_stats()['n_gaps'] == 0
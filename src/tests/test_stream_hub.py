@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pylsl')
+from acquisition.stream_hub import SharedRingBuffer, StreamHubReader
+
+FS = 100
+CAPACITY = 50
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer(n_cha=2, capacity=CAPACITY)
+    yield ring
+    ring.close()
+
+
+def open_reader(ring):
+    lsl_stream = SimpleNamespace(medusa_uid='test', fs=FS, n_cha=2,
+                                 l_cha=['A', 'B'], cha_info=None,
+                                 selected_channels_idx=[0, 1])
+    return StreamHubReader(ring.get_descriptor(), lsl_stream,
+                           min_chunk_size=1, timeout=0.1)
+
+
+def write_samples(ring, start, n, lsl_clock_offset):
+    times = (start + np.arange(n)) / FS
+    ring.write(np.zeros((n, 2)), times + 1000, times, lsl_clock_offset)
+
+
+def test_lapped_reader_counts_lost_samples(ring):
+    reader = open_reader(ring)
+    try:
+        write_samples(ring, 0, 3 * CAPACITY, 0.25)
+        data, times, lsl_times = reader.get_chunk()
+        assert reader.lost_samples == 2 * CAPACITY
+        assert len(times) == CAPACITY
+        assert np.allclose(lsl_times, np.arange(2 * CAPACITY,
+                                                3 * CAPACITY) / FS)
+    finally:
+        reader.close()
+
+
+def test_lapped_reader_records_the_lsl_clock_offset_of_the_hub(ring):
+    reader = open_reader(ring)
+    try:
+        write_samples(ring, 0, 10, 0.25)
+        reader.get_chunk()
+        write_samples(ring, 10, 2 * CAPACITY, 0.5)
+        reader.get_chunk()
+        unix_offsets, lsl_offsets = reader.get_historic_offsets()
+        assert not np.any(np.isnan(unix_offsets))
+        assert not np.any(np.isnan(lsl_offsets))
+        assert np.array_equal(lsl_offsets, [0.25, 0.5])
+        assert np.allclose(unix_offsets, 1000)
+    finally:
+        reader.close()